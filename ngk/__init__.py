@@ -0,0 +1 @@
+from .loop import run
@@ -0,0 +1,281 @@
+"""Keyframe animation sampling into packed poses"""
+import array
+import bisect
+from . import mat4, quat
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Channels and their number of floats
+TRANSLATION = 'T'
+ROTATION = 'R'
+SCALE = 'S'
+CHANNEL_SIZE = {TRANSLATION: 3, ROTATION: 4, SCALE: 3}
+
+
+class Pose:
+    """Local transforms of `num_bones` bones in packed arrays"""
+
+    def __init__(self, num_bones):
+        n = self.num_bones = int(num_bones)
+        #: Translations (3 floats per bone)
+        self.translation = array.array('f', bytes(12 * n))
+        #: Rotation quats (4 floats per bone)
+        self.rotation = array.array('f', (0, 0, 0, 1) * n)
+        #: Scales (3 floats per bone)
+        self.scale = array.array('f', (1, 1, 1) * n)
+
+    def channel(self, name):
+        """Returns array of channel `name`"""
+        if name == TRANSLATION:
+            return self.translation
+        elif name == ROTATION:
+            return self.rotation
+        elif name == SCALE:
+            return self.scale
+        raise ValueError('Invalid channel {0!r}'.format(name))
+
+    def copy_from(self, other):
+        self.translation[:] = other.translation
+        self.rotation[:] = other.rotation
+        self.scale[:] = other.scale
+
+    def to_mat4s(self, out, parents=None):
+        """Writes one mat4 per bone into `out` (16 floats per bone).
+
+        If `parents` (parent bone index per bone, -1 for roots, parents
+        before children) is given, the matrices are composed with their
+        parents' into model space."""
+        t = self.translation
+        r = self.rotation
+        s = self.scale
+        mv = memoryview(out)
+        try:
+            for i in range(self.num_bones):
+                m = mv[i*16:i*16+16]
+                mat4.from_rotation_translation_scale(m, r[i*4:i*4+4],
+                                                     t[i*3:i*3+3],
+                                                     s[i*3:i*3+3])
+                if parents is not None and parents[i] >= 0:
+                    p = parents[i]
+                    if p >= i:
+                        raise ValueError('parents must come before children')
+                    mat4.multiply(m, mv[p*16:p*16+16], m)
+        finally:
+            mv.release()
+        return out
+
+
+def _nlerp_arrays(out, a, b, t):
+    """Batch lerp of rows of `a` and `b` by per-row `t` (NumPy arrays)"""
+    out[:] = a + (b - a) * t[:, None]
+
+
+def _slerp_arrays(out, a, b, t):
+    """Batch slerp of quat rows of `a` and `b` by per-row `t` (NumPy
+    arrays)"""
+    np = numpy
+    cosom = (a * b).sum(axis=1)
+    b = np.where(cosom[:, None] < 0, -b, b)
+    cosom = np.abs(cosom)
+    close = 1.0 - cosom <= 1e-6
+    omega = np.arccos(np.clip(cosom, -1.0, 1.0))
+    sinom = np.where(close, 1.0, np.sin(omega))
+    scale0 = np.where(close, 1.0 - t, np.sin((1.0 - t) * omega) / sinom)
+    scale1 = np.where(close, t, np.sin(t * omega) / sinom)
+    out[:] = a * scale0[:, None] + b * scale1[:, None]
+
+
+def blend(out, a, b, t):
+    """Blends poses `a` and `b` into `out` by weight `t` (0: a, 1: b).
+
+    Translations and scales are lerped, rotations are slerped."""
+    n = out.num_bones
+    if numpy is not None:
+        np = numpy
+        tt = np.full(n, t, np.float32)
+        for name in (TRANSLATION, SCALE):
+            size = CHANNEL_SIZE[name]
+            _nlerp_arrays(np.frombuffer(out.channel(name), np.float32)
+                          .reshape(n, size),
+                          np.frombuffer(a.channel(name), np.float32)
+                          .reshape(n, size),
+                          np.frombuffer(b.channel(name), np.float32)
+                          .reshape(n, size), tt)
+        _slerp_arrays(np.frombuffer(out.rotation, np.float32).reshape(n, 4),
+                      np.frombuffer(a.rotation, np.float32).reshape(n, 4),
+                      np.frombuffer(b.rotation, np.float32).reshape(n, 4),
+                      tt)
+        return
+    q = quat.create()
+    for i in range(n):
+        I = i * 4
+        quat.slerp(q, a.rotation[I:I+4], b.rotation[I:I+4], t)
+        out.rotation[I:I+4] = q
+    for name in (TRANSLATION, SCALE):
+        dst = out.channel(name)
+        va = a.channel(name)
+        vb = b.channel(name)
+        for i in range(len(dst)):
+            dst[i] = va[i] + (vb[i] - va[i]) * t
+
+
+class Clip:
+    """Keyframe tracks of an animation, stored in packed arrays.
+
+    All key times are in `times` and all key values in `values`. Each track
+    animates one channel of one bone."""
+
+    def __init__(self, num_bones):
+        #: Number of bones animated
+        self.num_bones = int(num_bones)
+        #: Key times of all tracks
+        self.times = array.array('f')
+        #: Key values of all tracks
+        self.values = array.array('f')
+        #: Track bone index
+        self.track_bone = array.array('i')
+        #: Track channel
+        self.track_channel = []
+        #: Track offset into times
+        self.track_start = array.array('i')
+        #: Track number of keys
+        self.track_count = array.array('i')
+        #: Track offset into values
+        self.track_value = array.array('i')
+        #: Duration (time of the last key)
+        self.duration = 0.0
+
+    def __len__(self):
+        return len(self.track_bone)
+
+    def add_track(self, bone, channel, times, values):
+        """Adds track of `channel` of `bone`. `times` must be increasing and
+        `values` has CHANNEL_SIZE[channel] floats per key."""
+        size = CHANNEL_SIZE[channel]
+        times = array.array('f', times)
+        values = array.array('f', values)
+        if not times:
+            raise ValueError('Track has no keys')
+        if len(values) != len(times) * size:
+            raise ValueError('values len does not match times')
+        if any(b < a for a, b in zip(times, times[1:])):
+            raise ValueError('times must be increasing')
+        if not 0 <= bone < self.num_bones:
+            raise ValueError('Invalid bone')
+        self.track_bone.append(bone)
+        self.track_channel.append(channel)
+        self.track_start.append(len(self.times))
+        self.track_count.append(len(times))
+        self.track_value.append(len(self.values))
+        self.times.extend(times)
+        self.values.extend(values)
+        self.duration = max(self.duration, times[-1])
+
+
+class Sampler:
+    """Samples a Clip into Poses.
+
+    Keeps a cursor (last key index) per track, so sampling at steadily
+    increasing times finds keys without searching."""
+
+    def __init__(self, clip):
+        #: Clip
+        self.clip = clip
+        #: Last key index of each track
+        self.cursors = array.array('i', bytes(4 * len(clip)))
+
+    def __find_key(self, track, t):
+        """Returns index k (relative to the track) with
+        times[k] <= t < times[k+1], clamped to the track's keys"""
+        clip = self.clip
+        times = clip.times
+        start = clip.track_start[track]
+        count = clip.track_count[track]
+        k = self.cursors[track]
+        if k == count - 1:
+            if t >= times[start + k]:
+                return k
+        else:
+            # Cached key, or the next one
+            if times[start + k] <= t < times[start + k + 1]:
+                return k
+            if k + 2 < count and \
+                    times[start + k + 1] <= t < times[start + k + 2]:
+                self.cursors[track] = k + 1
+                return k + 1
+        k = bisect.bisect_right(times, t, start, start + count) - start - 1
+        k = min(max(k, 0), count - 1)
+        self.cursors[track] = k
+        return k
+
+    def __keys(self, t):
+        """Returns per-track (k0, k1, alpha)"""
+        clip = self.clip
+        times = clip.times
+        out = []
+        for track in range(len(clip)):
+            k = self.__find_key(track, t)
+            start = clip.track_start[track]
+            if k + 1 >= clip.track_count[track]:
+                out.append((k, k, 0.0))
+                continue
+            t0 = times[start + k]
+            t1 = times[start + k + 1]
+            alpha = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+            out.append((k, k + 1, min(max(alpha, 0.0), 1.0)))
+        return out
+
+    def sample(self, t, pose):
+        """Samples all tracks at time `t` into `pose`"""
+        clip = self.clip
+        if len(self.cursors) < len(clip):
+            # Tracks were added since the last sample
+            self.cursors.extend([0] * (len(clip) - len(self.cursors)))
+        keys = self.__keys(t)
+        values = clip.values
+        if numpy is not None:
+            return self.__sample_numpy(keys, pose)
+        q = quat.create()
+        for track, (k0, k1, alpha) in enumerate(keys):
+            channel = clip.track_channel[track]
+            size = CHANNEL_SIZE[channel]
+            base = clip.track_value[track]
+            a = values[base + k0 * size:base + k0 * size + size]
+            b = values[base + k1 * size:base + k1 * size + size]
+            dst = pose.channel(channel)
+            D = clip.track_bone[track] * size
+            if channel == ROTATION:
+                quat.slerp(q, a, b, alpha)
+                dst[D:D+4] = q
+            else:
+                for j in range(size):
+                    dst[D + j] = a[j] + (b[j] - a[j]) * alpha
+
+    def __sample_numpy(self, keys, pose):
+        np = numpy
+        clip = self.clip
+        values = np.frombuffer(clip.values, np.float32)
+        keys = np.array(keys, np.float64).reshape(-1, 3)
+        channels = np.array(clip.track_channel)
+        bones = np.frombuffer(clip.track_bone, np.int32)
+        bases = np.frombuffer(clip.track_value, np.int32)
+        for channel, size in CHANNEL_SIZE.items():
+            sel = np.flatnonzero(channels == channel)
+            if not len(sel):
+                continue
+            k0 = keys[sel, 0].astype(np.int64)
+            k1 = keys[sel, 1].astype(np.int64)
+            alpha = keys[sel, 2]
+            cols = np.arange(size)
+            a = values[(bases[sel] + k0 * size)[:, None] + cols]
+            b = values[(bases[sel] + k1 * size)[:, None] + cols]
+            res = np.empty_like(a)
+            if channel == ROTATION:
+                _slerp_arrays(res, a, b, alpha)
+            else:
+                _nlerp_arrays(res, a, b, alpha)
+            dst = np.frombuffer(pose.channel(channel), np.float32)
+            dst[(bones[sel] * size)[:, None] + cols] = res
@@ -53,11 +53,12 @@ def sleep(t):
     return itertools.repeat(None, int(t))
 
 
-def interval(it, interval=1.0/60):
-    """Iterates `it` at `interval`"""
-    last_step_time = time.monotonic()
+def interval(it, interval=1.0/60, clock=time.monotonic):
+    """Iterates `it` at `interval` seconds of `clock` (e.g. the virtual
+    clock of a replay.ReplayWindow)"""
+    last_step_time = clock()
     while True:
-        now = time.monotonic()
+        now = clock()
         while last_step_time + interval < now:
             next(it)
             last_step_time += interval
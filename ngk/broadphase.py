@@ -0,0 +1,271 @@
+"""Broadphase collision detection over packed AABBs"""
+import array
+import math
+
+
+class _Broadphase:
+    """Packed AABB storage shared by the broadphases, which implement
+    pairs().
+
+    Object ids are slot indices into `boxes` (6 floats per object: min xyz,
+    max xyz). Spheres are stored as their bounding boxes."""
+
+    def __init__(self):
+        #: Packed AABBs
+        self.boxes = array.array('f')
+        #: Free ids
+        self._free = []
+
+    def _alloc(self):
+        """Allocates slot for a new object. Returns new id."""
+        if self._free:
+            return self._free.pop()
+        self.boxes.extend((math.inf,) * 6)
+        return len(self.boxes) // 6 - 1
+
+    def add(self, x0, y0, z0, x1, y1, z1):
+        """Adds AABB. Returns new id."""
+        id = self._alloc()
+        self._insert(id, x0, y0, z0, x1, y1, z1)
+        return id
+
+    def add_sphere(self, x, y, z, r):
+        """Adds sphere. Returns new id."""
+        return self.add(x - r, y - r, z - r, x + r, y + r, z + r)
+
+    def set_aabb(self, id, x0, y0, z0, x1, y1, z1):
+        """Moves object `id` to AABB (x0, y0, z0)-(x1, y1, z1)"""
+        self.boxes[id*6:id*6+6] = array.array('f', (x0, y0, z0, x1, y1, z1))
+
+    def set_sphere(self, id, x, y, z, r):
+        """Moves object `id` to sphere at (x, y, z) with radius `r`"""
+        self.set_aabb(id, x - r, y - r, z - r, x + r, y + r, z + r)
+
+    def remove(self, id):
+        self.boxes[id*6:id*6+6] = array.array('f', (math.inf,) * 6)
+        self._free.append(id)
+
+    def _insert(self, id, x0, y0, z0, x1, y1, z1):
+        """Inserts object `id` in the (freshly allocated) slot"""
+        self.set_aabb(id, x0, y0, z0, x1, y1, z1)
+
+    def _overlaps(self, a, b):
+        """Returns True if AABBs of `a` and `b` overlap"""
+        boxes = self.boxes
+        A = a * 6
+        B = b * 6
+        return (boxes[A] <= boxes[B+3] and boxes[B] <= boxes[A+3] and
+                boxes[A+1] <= boxes[B+4] and boxes[B+1] <= boxes[A+4] and
+                boxes[A+2] <= boxes[B+5] and boxes[B+2] <= boxes[A+5])
+
+
+class SweepAndPrune(_Broadphase):
+    """Incremental sweep-and-prune along one axis.
+
+    Endpoints stay sorted along `axis` with insertion sort, and the set of
+    pairs overlapping on that axis is updated on every endpoint swap. Moving
+    an object costs about the number of endpoints it passes, so frame to
+    frame updates are proportional to the number of objects that moved."""
+
+    def __init__(self, axis=0):
+        super().__init__()
+        #: Sort axis (0: x, 1: y, 2: z)
+        self.axis = int(axis)
+        #: Endpoints sorted along axis (id * 2 for min, id * 2 + 1 for max)
+        self.__ends = []
+        #: Position of each endpoint in self.__ends
+        self.__pos = []
+        #: Pairs (a, b), a < b, overlapping along axis
+        self.__pairs = set()
+
+    def __value(self, e):
+        return self.boxes[(e >> 1) * 6 + self.axis + 3 * (e & 1)]
+
+    def __move(self, e):
+        """Moves endpoint `e` to its sorted position"""
+        ends = self.__ends
+        pos = self.__pos
+        pairs = self.__pairs
+        boxes = self.boxes
+        axis = self.axis
+        v = self.__value(e)
+        is_max = e & 1
+        id = e >> 1
+        i = pos[e]
+        # Move left. On ties mins sort before maxes, so touching boxes
+        # count as overlapping.
+        while i > 0:
+            f = ends[i - 1]
+            fv = boxes[(f >> 1) * 6 + axis + 3 * (f & 1)]
+            if fv < v or fv == v and f & 1 <= is_max:
+                break
+            other = f >> 1
+            if other != id:
+                if not is_max and f & 1:
+                    # Our min passed their max: now overlapping
+                    pairs.add((id, other) if id < other else (other, id))
+                elif is_max and not f & 1:
+                    # Our max passed their min: no longer overlapping
+                    pairs.discard((id, other) if id < other else (other, id))
+            ends[i] = f
+            pos[f] = i
+            i -= 1
+        # Move right
+        n = len(ends)
+        while i < n - 1:
+            f = ends[i + 1]
+            fv = boxes[(f >> 1) * 6 + axis + 3 * (f & 1)]
+            if fv > v or fv == v and f & 1 >= is_max:
+                break
+            other = f >> 1
+            if other != id:
+                if is_max and not f & 1:
+                    # Our max passed their min: now overlapping
+                    pairs.add((id, other) if id < other else (other, id))
+                elif not is_max and f & 1:
+                    # Our min passed their max: no longer overlapping
+                    pairs.discard((id, other) if id < other else (other, id))
+            ends[i] = f
+            pos[f] = i
+            i += 1
+        ends[i] = e
+        pos[e] = i
+
+    def _insert(self, id, x0, y0, z0, x1, y1, z1):
+        # Start at +inf (the end of the list), which overlaps nothing
+        self.boxes[id*6:id*6+6] = array.array('f', (math.inf,) * 6)
+        pos = self.__pos
+        if len(pos) < 2 * id + 2:
+            pos.extend((0, 0) * (id + 1 - len(pos) // 2))
+        self.__ends.extend((2 * id, 2 * id + 1))
+        pos[2 * id] = len(self.__ends) - 2
+        pos[2 * id + 1] = len(self.__ends) - 1
+        self.set_aabb(id, x0, y0, z0, x1, y1, z1)
+
+    def set_aabb(self, id, x0, y0, z0, x1, y1, z1):
+        I = id * 6
+        old = self.boxes[I + self.axis]
+        self.boxes[I:I+6] = array.array('f', (x0, y0, z0, x1, y1, z1))
+        # Keep min before max while moving: min leads when moving left,
+        # max leads when moving right
+        if self.boxes[I + self.axis] < old:
+            self.__move(2 * id)
+            self.__move(2 * id + 1)
+        else:
+            self.__move(2 * id + 1)
+            self.__move(2 * id)
+
+    def remove(self, id):
+        # Move to +inf, dropping most pairs. Objects with an infinite max
+        # can still be after our endpoints, so delete our own endpoints
+        # and any pairs left.
+        inf = math.inf
+        self.set_aabb(id, inf, inf, inf, inf, inf, inf)
+        ends = self.__ends
+        pos = self.__pos
+        i = pos[2 * id]
+        j = pos[2 * id + 1]
+        del ends[max(i, j)]
+        del ends[min(i, j)]
+        for k in range(min(i, j), len(ends)):
+            pos[ends[k]] = k
+        pairs = self.__pairs
+        pairs.difference_update([x for x in pairs if id in x])
+        super().remove(id)
+
+    def pairs(self):
+        """Returns candidate pairs whose AABBs overlap.
+
+        Returned as a flat array('i') of (a, b) ids with a < b."""
+        out = array.array('i')
+        overlaps = self._overlaps
+        for a, b in self.__pairs:
+            if overlaps(a, b):
+                out.append(a)
+                out.append(b)
+        return out
+
+
+class SpatialHash(_Broadphase):
+    """Spatial hash broadphase for objects of uniform size.
+
+    Objects are hashed by the cell containing their min corner. `cell_size`
+    must be at least as big as the largest object, so only neighbouring
+    cells need to be checked. Moving an object only touches the hash if it
+    changes cell."""
+
+    def __init__(self, cell_size):
+        super().__init__()
+        #: Cell size
+        self.cell_size = float(cell_size)
+        #: Mapping from cell -> list of ids
+        self.__cells = {}
+        #: Cell of each id (or None if free)
+        self.__cell_of = []
+
+    def __cell(self, x, y, z):
+        s = self.cell_size
+        return (math.floor(x / s), math.floor(y / s), math.floor(z / s))
+
+    def _insert(self, id, x0, y0, z0, x1, y1, z1):
+        if len(self.__cell_of) <= id:
+            self.__cell_of.extend([None] * (id + 1 - len(self.__cell_of)))
+        self.set_aabb(id, x0, y0, z0, x1, y1, z1)
+
+    def set_aabb(self, id, x0, y0, z0, x1, y1, z1):
+        s = self.cell_size
+        if x1 - x0 > s or y1 - y0 > s or z1 - z0 > s:
+            raise ValueError('object is larger than cell_size')
+        self.boxes[id*6:id*6+6] = array.array('f', (x0, y0, z0, x1, y1, z1))
+        cell = self.__cell(x0, y0, z0)
+        old = self.__cell_of[id]
+        if old == cell:
+            return
+        cells = self.__cells
+        if old is not None:
+            self.__unlink(id, old)
+        ids = cells.get(cell)
+        if ids is None:
+            ids = cells[cell] = []
+        ids.append(id)
+        self.__cell_of[id] = cell
+
+    def __unlink(self, id, cell):
+        ids = self.__cells[cell]
+        ids.remove(id)
+        if not ids:
+            del self.__cells[cell]
+
+    def remove(self, id):
+        self.__unlink(id, self.__cell_of[id])
+        self.__cell_of[id] = None
+        super().remove(id)
+
+    def pairs(self):
+        """Returns candidate pairs whose AABBs overlap.
+
+        Returned as a flat array('i') of (a, b) ids with a < b."""
+        out = array.array('i')
+        cells = self.__cells
+        overlaps = self._overlaps
+        for (cx, cy, cz), ids in cells.items():
+            # Pairs within the cell
+            for i, a in enumerate(ids):
+                for b in ids[i+1:]:
+                    if overlaps(a, b):
+                        out.extend((a, b) if a < b else (b, a))
+            # Pairs with the 13 "forward" neighbour cells, so that every
+            # pair of cells is visited once
+            for dx, dy, dz in _FORWARD:
+                others = cells.get((cx + dx, cy + dy, cz + dz))
+                if not others:
+                    continue
+                for a in ids:
+                    for b in others:
+                        if overlaps(a, b):
+                            out.extend((a, b) if a < b else (b, a))
+        return out
+
+
+_FORWARD = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+            for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
@@ -0,0 +1,285 @@
+"""Packed asset bundles.
+
+A bundle is a single file of aligned blobs (vertex data, element data,
+textures) followed by a JSON index. Bundle memory-maps the file and builds
+Geoms and textures whose data are memoryviews into the mapping, so
+loading copies nothing and costs a few Python calls per asset.
+
+Pack files into a bundle with::
+
+    python -m ngk.bundle out.bundle image.png texture.ktx data.bin ...
+
+Layout: header (magic, version, index offset and size), blobs aligned to
+ALIGN bytes, then the index: a JSON object mapping asset name -> entry,
+where blobs are referenced as [offset, size]."""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from . import ktx
+
+
+MAGIC = b'NGKB'
+VERSION = 1
+
+#: Alignment of blobs
+ALIGN = 16
+
+#: magic, version, index offset, index size
+_HEADER = struct.Struct('<4sI2Q')
+
+
+class Packer:
+    """Writes a bundle to binary file object `f`. Call close() (or use
+    it as a context manager) to write the index."""
+
+    def __init__(self, f):
+        self.__f = f
+        #: Mapping from name -> entry
+        self.entries = {}
+        f.write(bytes(_HEADER.size))
+        self.__offset = _HEADER.size
+
+    def __add(self, name, entry):
+        if name in self.entries:
+            raise ValueError('Duplicate asset {0!r}'.format(name))
+        self.entries[name] = entry
+
+    def blob(self, data):
+        """Writes aligned blob `data`. Returns [offset, size]."""
+        f = self.__f
+        pad = -self.__offset % ALIGN
+        f.write(bytes(pad))
+        offset = self.__offset + pad
+        size = memoryview(data).nbytes
+        f.write(data)
+        self.__offset = offset + size
+        return [offset, size]
+
+    def add_blob(self, name, data):
+        self.__add(name, {'type': 'blob', 'data': self.blob(data)})
+
+    def add_geom(self, name, prim, vertdata, vertptrs, elemdata=None):
+        """Adds Geom of `vertdata` with `vertptrs` (mapping from attribute
+        name -> VertAttrPtr or equivalent tuple) and optional 8 or 16-bit
+        `elemdata`"""
+        entry = {'type': 'geom', 'prim': prim,
+                 'vertptrs': {k: list(v) for k, v in vertptrs.items()},
+                 'vertdata': self.blob(vertdata)}
+        if elemdata is not None:
+            itemsize = memoryview(elemdata).itemsize
+            if itemsize not in (1, 2):
+                raise ValueError('Invalid itemsize')
+            entry['elemdata'] = self.blob(elemdata)
+            entry['elemformat'] = 'B' if itemsize == 1 else 'H'
+        self.__add(name, entry)
+
+    def add_tri3(self, name, vertdata, num_floats=8):
+        """Adds Tri3Geom of float `vertdata`"""
+        self.__add(name, {'type': 'tri3', 'num_floats': num_floats,
+                          'vertdata': self.blob(vertdata)})
+
+    def add_texture(self, name, w, h, data):
+        """Adds Texture2 of 8-bit RGB or RGBA `data`"""
+        if memoryview(data).nbytes not in (w * h * 3, w * h * 4):
+            raise ValueError('Invalid data size')
+        self.__add(name, {'type': 'texture', 'w': w, 'h': h,
+                          'data': self.blob(data)})
+
+    def add_compressed_texture(self, name, w, h, internal_format, levels):
+        """Adds CompressedTexture2 of mip `levels` (level 0 first)"""
+        self.__add(name, {'type': 'compressed_texture', 'w': w, 'h': h,
+                          'internal_format': internal_format,
+                          'levels': [self.blob(x) for x in levels]})
+
+    def add_file(self, name, path):
+        """Adds file `path`: KTX and images (loaded with stbi) as textures,
+        anything else as a blob"""
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.ktx':
+            with ktx.load(path) as tex:
+                if not tex.compressed:
+                    raise ValueError('{0}: KTX data is not '
+                                     'compressed'.format(path))
+                self.add_compressed_texture(
+                    name, tex.w, tex.h, tex.internal_format,
+                    [data for w, h, data in tex.levels])
+        elif ext in ('.png', '.jpg', '.jpeg', '.bmp', '.tga'):
+            import stbi
+            w, h, comp, data = stbi.load(path, 0)
+            if comp not in (3, 4):
+                w, h, comp, data = stbi.load(path, 4)
+            self.add_texture(name, w, h, data)
+        else:
+            with open(path, 'rb') as f:
+                self.add_blob(name, f.read())
+
+    def close(self):
+        """Writes the index and header"""
+        f = self.__f
+        index = json.dumps(self.entries, sort_keys=True).encode('utf-8')
+        offset = self.blob(index)[0]
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, offset, len(index)))
+        f.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+
+
+def pack(path, entries):
+    """Writes bundle `path` of `entries` (mapping from name -> file path)"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f, Packer(f) as packer:
+        for name, src in entries.items():
+            packer.add_file(name, src)
+    os.replace(tmp, path)
+
+
+class Bundle:
+    """Memory-mapped bundle `path` (or a buffer of bundle data)"""
+
+    def __init__(self, path):
+        if isinstance(path, str):
+            with open(path, 'rb') as f:
+                self.__mmap = mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            data = self.__mmap
+        else:
+            self.__mmap = None
+            data = path
+        view = memoryview(data).cast('B')
+        try:
+            if len(view) < _HEADER.size:
+                raise ValueError('Not a bundle')
+            magic, version, offset, size = _HEADER.unpack_from(view)
+            if magic != MAGIC:
+                raise ValueError('Not a bundle')
+            if version != VERSION:
+                raise ValueError('Unsupported bundle version {0}'.format(
+                    version))
+            if offset + size > len(view):
+                raise ValueError('Truncated bundle')
+            #: Mapping from name -> entry
+            self.entries = json.loads(bytes(view[offset:offset + size])
+                                      .decode('utf-8'))
+        except Exception:
+            view.release()
+            if self.__mmap is not None:
+                self.__mmap.close()
+            raise
+        self.__view = view
+        #: Views handed out (released by close())
+        self.__views = []
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __entry(self, name, *types):
+        entry = self.entries[name]
+        if entry['type'] not in types:
+            raise ValueError('{0!r} is a {1}'.format(name, entry['type']))
+        return entry
+
+    def view(self, blob, format='B'):
+        """Returns memoryview of `blob` ([offset, size]) cast to
+        `format`"""
+        offset, size = blob
+        if offset < 0 or size < 0 or offset + size > len(self.__view):
+            raise ValueError('Blob {0!r} is out of bounds'.format(blob))
+        v = self.__view[offset:offset + size].cast(format)
+        self.__views.append(v)
+        return v
+
+    def prefetch(self):
+        """Asks the OS to read the whole bundle ahead"""
+        if self.__mmap is not None and hasattr(mmap, 'MADV_WILLNEED'):
+            self.__mmap.madvise(mmap.MADV_WILLNEED)
+
+    def blob(self, name):
+        return self.view(self.__entry(name, 'blob')['data'])
+
+    def geom(self, name):
+        """Returns vid.Geom (or vid.Tri3Geom) of asset `name`"""
+        from . import vid
+        entry = self.__entry(name, 'geom', 'tri3')
+        if entry['type'] == 'tri3':
+            geom = vid.Tri3Geom(entry['num_floats'])
+            geom.vertdata = self.view(entry['vertdata'], 'f')
+            return geom
+        vertptrs = {k: vid.VertAttrPtr(*v)
+                    for k, v in entry['vertptrs'].items()}
+        elemdata = None
+        if 'elemdata' in entry:
+            elemdata = self.view(entry['elemdata'], entry['elemformat'])
+        return vid.Geom(entry['prim'], self.view(entry['vertdata']),
+                        vertptrs, elemdata)
+
+    def texture(self, name, **kwargs):
+        """Returns vid.Texture2 (or vid.CompressedTexture2) of asset
+        `name`. `kwargs` are passed to the constructor."""
+        from . import vid
+        entry = self.__entry(name, 'texture', 'compressed_texture')
+        if entry['type'] == 'compressed_texture':
+            return vid.CompressedTexture2(
+                entry['w'], entry['h'], entry['internal_format'],
+                [self.view(x) for x in entry['levels']], **kwargs)
+        return vid.Texture2(entry['w'], entry['h'],
+                            self.view(entry['data']), **kwargs)
+
+    def close(self):
+        """Releases the views and the mapping. Geoms and textures of the
+        bundle must not be used afterwards."""
+        for v in self.__views:
+            v.release()
+        self.__views.clear()
+        self.__view.release()
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ngk.bundle',
+                                     description='Packs files into a '
+                                     'bundle, or lists a bundle')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='list the assets of the bundle')
+    parser.add_argument('bundle', help='bundle path')
+    parser.add_argument('files', nargs='*',
+                        help='files to pack (named by their file name '
+                        'without extension, or NAME=PATH)')
+    args = parser.parse_args(argv)
+    if args.list:
+        with Bundle(args.bundle) as b:
+            for name, entry in sorted(b.entries.items()):
+                print('{0:30} {1}'.format(name, entry['type']))
+        return 0
+    entries = {}
+    for x in args.files:
+        if '=' in x:
+            name, path = x.split('=', 1)
+        else:
+            path = x
+            name = os.path.splitext(os.path.basename(x))[0]
+        if name in entries:
+            parser.error('duplicate name {0!r}'.format(name))
+        entries[name] = path
+    pack(args.bundle, entries)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
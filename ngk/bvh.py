@@ -0,0 +1,438 @@
+"""Bounding volume hierarchy for ray casting against Tri3Geom"""
+import array
+import collections
+import math
+from . import vec3
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Result of a ray cast: tri index, barycentric coordinates (u, v) of the
+#: hit point (weights of the tri's B and C verts) and distance along the ray
+Hit = collections.namedtuple('Hit', 'index u v t')
+
+
+#: Smallest determinant treated as a hit, rays parallel to a tri miss it
+EPSILON = 1e-9
+
+
+def _surface_area(x0, y0, z0, x1, y1, z1):
+    dx = x1 - x0
+    dy = y1 - y0
+    dz = z1 - z0
+    return dx * dy + dy * dz + dz * dx
+
+
+class BVH:
+    """Binned SAH bounding volume hierarchy over the tris of a Tri3Geom.
+
+    Nodes are stored in flat arrays. Node i has bounds
+    `bounds[6*i:6*i+6]` (min xyz, max xyz). If `count[i]` is 0 it is an
+    inner node with children `first[i]` and `first[i] + 1`, otherwise it is
+    a leaf holding tris `order[first[i]:first[i] + count[i]]`.
+
+    Empty (deleted) tris are left out. Call `refit()` after moving verts
+    with set_tri3(), and `build()` after adding or deleting tris."""
+
+    def __init__(self, geom, leaf_size=4, num_bins=12):
+        #: Tri3Geom
+        self.geom = geom
+        #: Maximum number of tris in a leaf
+        self.leaf_size = int(leaf_size)
+        #: Number of SAH bins per axis
+        self.num_bins = int(num_bins)
+        self.build()
+
+    def __tri_positions(self):
+        """Returns list of (ax, ay, az, bx, by, bz, cx, cy, cz) of all tris"""
+        nf = self.geom.num_floats
+        v = self.geom.vertdata
+        n = len(v) // (3 * nf)
+        out = []
+        for i in range(n):
+            I = i * 3 * nf
+            out.append((v[I], v[I+1], v[I+2],
+                        v[I+nf], v[I+nf+1], v[I+nf+2],
+                        v[I+2*nf], v[I+2*nf+1], v[I+2*nf+2]))
+        return out
+
+    def build(self):
+        """(Re)builds the hierarchy from the geom's current tris"""
+        tris = self.__tri_positions()
+        #: Number of tris in the geom at build time
+        self.num_tris = len(tris)
+        self.__tris = tris
+        # Per-tri bounds and centroids
+        tb = []
+        centroids = []
+        order = []
+        for i, (ax, ay, az, bx, by, bz, cx, cy, cz) in enumerate(tris):
+            if not (ax or ay or az or bx or by or bz or cx or cy or cz):
+                continue  # Empty slot
+            tb.append((min(ax, bx, cx), min(ay, by, cy), min(az, bz, cz),
+                       max(ax, bx, cx), max(ay, by, cy), max(az, bz, cz)))
+            centroids.append(((ax + bx + cx) / 3, (ay + by + cy) / 3,
+                              (az + bz + cz) / 3))
+            order.append(i)
+        # Work on positions into tb/centroids, map back with order at the end
+        local = list(range(len(order)))
+        bounds = []
+        first = []
+        count = []
+
+        def alloc():
+            first.append(0)
+            count.append(0)
+            bounds.extend((0.0,) * 6)
+            return len(first) - 1
+
+        alloc()
+        stack = [(0, 0, len(local))]
+        while stack:
+            node, start, end = stack.pop()
+            n = end - start
+            items = local[start:end]
+            # Node bounds and centroid bounds
+            x0 = y0 = z0 = cx0 = cy0 = cz0 = math.inf
+            x1 = y1 = z1 = cx1 = cy1 = cz1 = -math.inf
+            for j in items:
+                a, b, c, d, e, f = tb[j]
+                x0 = a if a < x0 else x0
+                y0 = b if b < y0 else y0
+                z0 = c if c < z0 else z0
+                x1 = d if d > x1 else x1
+                y1 = e if e > y1 else y1
+                z1 = f if f > z1 else z1
+                p, q, r = centroids[j]
+                cx0 = p if p < cx0 else cx0
+                cy0 = q if q < cy0 else cy0
+                cz0 = r if r < cz0 else cz0
+                cx1 = p if p > cx1 else cx1
+                cy1 = q if q > cy1 else cy1
+                cz1 = r if r > cz1 else cz1
+            if n:
+                bounds[node*6:node*6+6] = (x0, y0, z0, x1, y1, z1)
+            split = None
+            if n > self.leaf_size:
+                split = self.__find_split(items, tb, centroids,
+                                          (cx0, cy0, cz0), (cx1, cy1, cz1),
+                                          _surface_area(x0, y0, z0,
+                                                        x1, y1, z1))
+            if split is None:
+                first[node] = start
+                count[node] = n
+                continue
+            axis, pos = split
+            lo = [j for j in items if centroids[j][axis] < pos]
+            hi = [j for j in items if centroids[j][axis] >= pos]
+            if not lo or not hi:
+                first[node] = start
+                count[node] = n
+                continue
+            local[start:end] = lo + hi
+            mid = start + len(lo)
+            left = alloc()
+            alloc()
+            first[node] = left
+            stack.append((left + 1, mid, end))
+            stack.append((left, start, mid))
+        self.order = array.array('i', (order[j] for j in local))
+        self.first = array.array('i', first)
+        self.count = array.array('i', count)
+        self.bounds = array.array('f', bounds)
+
+    def __find_split(self, items, tb, centroids, cmin, cmax, parent_area):
+        """Returns (axis, position) of the best SAH split or None"""
+        nbins = self.num_bins
+        best_cost = len(items) * parent_area
+        best = None
+        for axis in range(3):
+            lo = cmin[axis]
+            extent = cmax[axis] - lo
+            if extent <= 0:
+                continue
+            scale = nbins / extent
+            bin_count = [0] * nbins
+            bin_bounds = [[math.inf] * 3 + [-math.inf] * 3
+                          for i in range(nbins)]
+            for j in items:
+                k = min(int((centroids[j][axis] - lo) * scale), nbins - 1)
+                bin_count[k] += 1
+                bb = bin_bounds[k]
+                t = tb[j]
+                for m in range(3):
+                    if t[m] < bb[m]:
+                        bb[m] = t[m]
+                    if t[m+3] > bb[m+3]:
+                        bb[m+3] = t[m+3]
+            # Sweep from the right to get areas of the right sides
+            right_area = [0.0] * nbins
+            acc = [math.inf] * 3 + [-math.inf] * 3
+            n = 0
+            right_count = [0] * nbins
+            for k in range(nbins - 1, 0, -1):
+                bb = bin_bounds[k]
+                for m in range(3):
+                    acc[m] = min(acc[m], bb[m])
+                    acc[m+3] = max(acc[m+3], bb[m+3])
+                n += bin_count[k]
+                right_count[k] = n
+                right_area[k] = _surface_area(*acc) if n else 0.0
+            acc = [math.inf] * 3 + [-math.inf] * 3
+            n = 0
+            for k in range(nbins - 1):
+                bb = bin_bounds[k]
+                for m in range(3):
+                    acc[m] = min(acc[m], bb[m])
+                    acc[m+3] = max(acc[m+3], bb[m+3])
+                n += bin_count[k]
+                if not n or not right_count[k+1]:
+                    continue
+                cost = (n * _surface_area(*acc) +
+                        right_count[k+1] * right_area[k+1])
+                if cost < best_cost:
+                    best_cost = cost
+                    best = (axis, lo + (k + 1) / scale)
+        if best is None and len(items) > self.leaf_size:
+            # Splitting does not pay off by SAH, but leaves must stay small:
+            # split at the median of the widest centroid axis
+            axis = max(range(3), key=lambda m: cmax[m] - cmin[m])
+            if cmax[axis] > cmin[axis]:
+                cs = sorted(centroids[j][axis] for j in items)
+                pos = cs[len(cs) // 2]
+                if pos <= cmin[axis]:
+                    pos = math.nextafter(pos, math.inf)
+                best = (axis, pos)
+        return best
+
+    def refit(self):
+        """Recomputes node bounds from the geom's current vert positions.
+
+        Rebuilds instead if the number of tris changed."""
+        nf = self.geom.num_floats
+        if len(self.geom.vertdata) // (3 * nf) != self.num_tris:
+            return self.build()
+        tris = self.__tris = self.__tri_positions()
+        if not len(self.order):
+            return
+        bounds = self.bounds
+        first = self.first
+        count = self.count
+        order = self.order
+        # Children always come after their parent
+        for node in range(len(first) - 1, -1, -1):
+            n = count[node]
+            if n:
+                x0 = y0 = z0 = math.inf
+                x1 = y1 = z1 = -math.inf
+                for i in order[first[node]:first[node] + n]:
+                    ax, ay, az, bx, by, bz, cx, cy, cz = tris[i]
+                    x0 = min(x0, ax, bx, cx)
+                    y0 = min(y0, ay, by, cy)
+                    z0 = min(z0, az, bz, cz)
+                    x1 = max(x1, ax, bx, cx)
+                    y1 = max(y1, ay, by, cy)
+                    z1 = max(z1, az, bz, cz)
+                bounds[node*6:node*6+6] = array.array(
+                    'f', (x0, y0, z0, x1, y1, z1))
+            else:
+                L = first[node] * 6
+                a = bounds[L:L + 12]
+                bounds[node*6:node*6+6] = array.array(
+                    'f', (min(a[0], a[6]), min(a[1], a[7]), min(a[2], a[8]),
+                          max(a[3], a[9]), max(a[4], a[10]),
+                          max(a[5], a[11])))
+
+    def raycast(self, origin, direction, tmax=math.inf):
+        """Returns nearest Hit of the ray along `direction` from `origin`
+        within distance `tmax` (in units of `direction`'s length), or None"""
+        ox, oy, oz = origin
+        dx, dy, dz = direction
+        # Axes with a zero direction component skip the slab test (the ray
+        # is parallel to the slab), as (bound - origin) * inf can be NaN
+        ix = 1.0 / dx if dx else 0.0
+        iy = 1.0 / dy if dy else 0.0
+        iz = 1.0 / dz if dz else 0.0
+        bounds = self.bounds
+        first = self.first
+        count = self.count
+        order = self.order
+        tris = self.__tris
+        best = None
+        if not len(order):
+            return None
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            B = node * 6
+            # Slab test
+            if dx:
+                t0 = (bounds[B] - ox) * ix
+                t1 = (bounds[B+3] - ox) * ix
+                tnear = t0 if t0 < t1 else t1
+                tfar = t1 if t0 < t1 else t0
+            elif bounds[B] <= ox <= bounds[B+3]:
+                tnear = -math.inf
+                tfar = math.inf
+            else:
+                continue
+            if dy:
+                t0 = (bounds[B+1] - oy) * iy
+                t1 = (bounds[B+4] - oy) * iy
+                if t0 > t1:
+                    t0, t1 = t1, t0
+                tnear = t0 if t0 > tnear else tnear
+                tfar = t1 if t1 < tfar else tfar
+            elif not bounds[B+1] <= oy <= bounds[B+4]:
+                continue
+            if dz:
+                t0 = (bounds[B+2] - oz) * iz
+                t1 = (bounds[B+5] - oz) * iz
+                if t0 > t1:
+                    t0, t1 = t1, t0
+                tnear = t0 if t0 > tnear else tnear
+                tfar = t1 if t1 < tfar else tfar
+            elif not bounds[B+2] <= oz <= bounds[B+5]:
+                continue
+            if tnear > tfar or tfar < 0 or tnear > tmax:
+                continue
+            n = count[node]
+            if not n:
+                stack.append(first[node] + 1)
+                stack.append(first[node])
+                continue
+            for i in order[first[node]:first[node] + n]:
+                ax, ay, az, bx, by, bz, cx, cy, cz = tris[i]
+                # Moller-Trumbore
+                e1x, e1y, e1z = bx - ax, by - ay, bz - az
+                e2x, e2y, e2z = cx - ax, cy - ay, cz - az
+                px = dy * e2z - dz * e2y
+                py = dz * e2x - dx * e2z
+                pz = dx * e2y - dy * e2x
+                det = e1x * px + e1y * py + e1z * pz
+                if -EPSILON < det < EPSILON:
+                    continue
+                inv = 1.0 / det
+                sx, sy, sz = ox - ax, oy - ay, oz - az
+                u = (sx * px + sy * py + sz * pz) * inv
+                if u < 0 or u > 1:
+                    continue
+                qx = sy * e1z - sz * e1y
+                qy = sz * e1x - sx * e1z
+                qz = sx * e1y - sy * e1x
+                v = (dx * qx + dy * qy + dz * qz) * inv
+                if v < 0 or u + v > 1:
+                    continue
+                t = (e2x * qx + e2y * qy + e2z * qz) * inv
+                if 0 <= t <= tmax:
+                    tmax = t
+                    best = Hit(i, u, v, t)
+        return best
+
+    def segment_cast(self, a, b):
+        """Returns nearest Hit on the segment from `a` to `b`, or None.
+
+        Hit.t is the distance from `a`."""
+        d = vec3.create()
+        vec3.subtract(d, b, a)
+        length = vec3.length(d)
+        if not length:
+            return None
+        vec3.scale(d, d, 1.0 / length)
+        return self.raycast(a, d, length)
+
+    def raycast_many(self, origins, directions, tmax=math.inf):
+        """Casts a batch of rays given as packed xyz float arrays.
+
+        Returns (index, t, u, v) arrays, index is -1 for rays which missed.
+        Traversal is vectorized over the batch when NumPy is installed."""
+        n = len(origins) // 3
+        if numpy is None:
+            index = array.array('i', [-1] * n)
+            t = array.array('f', [math.inf]) * n
+            u = array.array('f', bytes(4 * n))
+            v = array.array('f', bytes(4 * n))
+            for j in range(n):
+                hit = self.raycast(origins[3*j:3*j+3],
+                                   directions[3*j:3*j+3], tmax)
+                if hit is not None:
+                    index[j], u[j], v[j], t[j] = hit
+            return index, t, u, v
+        return self.__raycast_many_numpy(origins, directions, tmax)
+
+    def __raycast_many_numpy(self, origins, directions, tmax):
+        np = numpy
+        o = np.asarray(origins, np.float64).reshape(-1, 3)
+        d = np.asarray(directions, np.float64).reshape(-1, 3)
+        n = len(o)
+        with np.errstate(divide='ignore'):
+            inv = 1.0 / d
+        best_t = np.full(n, tmax, np.float64)
+        best_i = np.full(n, -1, np.int32)
+        best_u = np.zeros(n, np.float64)
+        best_v = np.zeros(n, np.float64)
+        bounds = np.frombuffer(self.bounds, np.float32).reshape(-1, 6)
+        first = np.frombuffer(self.first, np.int32)
+        count = np.frombuffer(self.count, np.int32)
+        order = np.frombuffer(self.order, np.int32)
+        tris = np.array(self.__tris, np.float64).reshape(-1, 9)
+        # Breadth-first traversal over (ray, node) pairs, one tree level per
+        # iteration
+        pr = np.arange(n) if len(order) else np.arange(0)
+        pn = np.zeros(len(pr), np.int32)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            while len(pr):
+                lo = (bounds[pn, :3] - o[pr]) * inv[pr]
+                hi = (bounds[pn, 3:] - o[pr]) * inv[pr]
+                # 0 * inf is nan for rays in a slab's plane, treat as inside
+                tnear = np.fmax.reduce(np.minimum(lo, hi), axis=1)
+                tfar = np.fmin.reduce(np.maximum(lo, hi), axis=1)
+                keep = (tnear <= tfar) & (tfar >= 0) & (tnear <= best_t[pr])
+                pr = pr[keep]
+                pn = pn[keep]
+                leaf = count[pn] > 0
+                # Test tris of leaves against their rays
+                lr = pr[leaf]
+                if len(lr):
+                    ln = pn[leaf]
+                    c = count[ln]
+                    rr = np.repeat(lr, c)
+                    base = np.repeat(first[ln] - (np.cumsum(c) - c), c)
+                    tri = order[base + np.arange(len(rr))]
+                    ro = o[rr]
+                    rd = d[rr]
+                    a = tris[tri, 0:3]
+                    e1 = tris[tri, 3:6] - a
+                    e2 = tris[tri, 6:9] - a
+                    p = np.cross(rd, e2)
+                    det = (e1 * p).sum(axis=1)
+                    ok = np.abs(det) >= EPSILON
+                    inv_det = np.where(ok, 1.0 / np.where(ok, det, 1.0), 0.0)
+                    s = ro - a
+                    u = (s * p).sum(axis=1) * inv_det
+                    q = np.cross(s, e1)
+                    v = (rd * q).sum(axis=1) * inv_det
+                    t = (e2 * q).sum(axis=1) * inv_det
+                    hit = (ok & (u >= 0) & (u <= 1) & (v >= 0) &
+                           (u + v <= 1) & (t >= 0) & (t <= best_t[rr]))
+                    if hit.any():
+                        rr, tri, t = rr[hit], tri[hit], t[hit]
+                        u, v = u[hit], v[hit]
+                        np.minimum.at(best_t, rr, t)
+                        nearest = t == best_t[rr]
+                        rr = rr[nearest]
+                        best_i[rr] = tri[nearest]
+                        best_u[rr] = u[nearest]
+                        best_v[rr] = v[nearest]
+                # Descend into children of inner nodes
+                ir = pr[~leaf]
+                children = first[pn[~leaf]]
+                pr = np.concatenate((ir, ir))
+                pn = np.concatenate((children, children + 1))
+        best_t[best_i < 0] = np.inf
+        return (array.array('i', best_i.tobytes()),
+                array.array('f', best_t.astype(np.float32).tobytes()),
+                array.array('f', best_u.astype(np.float32).tobytes()),
+                array.array('f', best_v.astype(np.float32).tobytes()))
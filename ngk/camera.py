@@ -0,0 +1,126 @@
+"""Camera with cached view and projection matrices"""
+import weakref
+from . import mat4
+
+
+class Camera:
+    """Perspective or orthographic camera.
+
+    The view, projection, view-projection and inverse matrices are only
+    recomputed when read after the camera changed. `view_version` and
+    `proj_version` count changes, so users can tell whether a matrix
+    changed since they last used it (see apply())."""
+
+    def __init__(self):
+        #: Projection mode ('PERSPECTIVE' or 'ORTHO')
+        self.mode = 'PERSPECTIVE'
+        #: Incremented on every view change
+        self.view_version = 0
+        #: Incremented on every projection change
+        self.proj_version = 0
+        self.__view = mat4.create()
+        self.__proj = mat4.create()
+        self.__viewproj = mat4.create()
+        self.__inverse_view = mat4.create()
+        self.__inverse_viewproj = mat4.create()
+        #: Versions the cached matrices were computed at
+        self.__viewproj_key = (0, 0)
+        self.__inverse_view_key = 0
+        self.__inverse_viewproj_key = (0, 0)
+        #: Mapping from Program -> mapping from uniform name -> version
+        self.__applied = weakref.WeakKeyDictionary()
+
+    version = property(lambda x: (x.view_version, x.proj_version))
+
+    # Projection
+
+    def perspective(self, fovy, aspect, near, far):
+        """Sets perspective projection with vertical field of view `fovy`
+        (radians)"""
+        self.mode = 'PERSPECTIVE'
+        mat4.perspective(self.__proj, fovy, aspect, near, far)
+        self.proj_version += 1
+
+    def ortho(self, left, right, bottom, top, near, far):
+        """Sets orthographic projection"""
+        self.mode = 'ORTHO'
+        mat4.ortho(self.__proj, left, right, bottom, top, near, far)
+        self.proj_version += 1
+
+    # View
+
+    def look_at(self, eye, center, up=(0, 1, 0)):
+        """Places camera at `eye` looking at `center`"""
+        mat4.look_at(self.__view, eye, center, up)
+        self.view_version += 1
+
+    def from_quat(self, q, position):
+        """Places camera at `position` with orientation `q` (the camera
+        looks down its -z axis)"""
+        x, y, z, w = q
+        view = self.__view
+        # Inverse of translate(position) * rotate(q)
+        mat4.from_quat(view, (-x, -y, -z, w))
+        px, py, pz = position
+        mat4.translate(view, view, (-px, -py, -pz))
+        self.view_version += 1
+
+    def set_view(self, m):
+        """Sets view matrix to `m`"""
+        self.__view[:] = m
+        self.view_version += 1
+
+    # Cached matrices
+
+    @property
+    def view(self):
+        return self.__view
+
+    @property
+    def proj(self):
+        return self.__proj
+
+    @property
+    def viewproj(self):
+        """Projection * view"""
+        key = self.version
+        if self.__viewproj_key != key:
+            mat4.multiply(self.__viewproj, self.__proj, self.__view)
+            self.__viewproj_key = key
+        return self.__viewproj
+
+    @property
+    def inverse_view(self):
+        """Inverse of the view matrix (the camera's world transform)"""
+        if self.__inverse_view_key != self.view_version:
+            if mat4.invert(self.__inverse_view, self.__view) is None:
+                raise ValueError('view matrix is not invertible')
+            self.__inverse_view_key = self.view_version
+        return self.__inverse_view
+
+    @property
+    def inverse_viewproj(self):
+        """Inverse of `viewproj`, mapping clip space to world space"""
+        key = self.version
+        if self.__inverse_viewproj_key != key:
+            if mat4.invert(self.__inverse_viewproj, self.viewproj) is None:
+                raise ValueError('view-projection matrix is not invertible')
+            self.__inverse_viewproj_key = key
+        return self.__inverse_viewproj
+
+    def apply(self, prog, name='uViewProj', matrix='viewproj'):
+        """Sets uniform `name` of Program `prog` to `matrix` (the name of
+        one of the matrix properties), unless it was already set to the
+        current version of it"""
+        version = (self.view_version if matrix in ('view', 'inverse_view')
+                   else self.proj_version if matrix == 'proj'
+                   else self.version)
+        applied = self.__applied.get(prog)
+        if applied is None:
+            applied = self.__applied[prog] = {}
+        if applied.get(name) == (matrix, version) and \
+                prog.uniforms.get(name) is getattr(self, matrix):
+            return False
+        prog.set_uniform(name, getattr(self, matrix))
+        applied[name] = (matrix, version)
+        return True
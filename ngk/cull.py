@@ -0,0 +1,221 @@
+"""View-frustum and rectangle culling"""
+import array
+import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def create_planes():
+    """Returns new array for 6 frustum planes (a, b, c, d)"""
+    return array.array('f', bytes(24 * 4))
+
+
+def frustum_planes(out, m):
+    """Extracts normalized frustum planes from projection-view matrix `m`.
+
+    Planes are stored in `out` as left, right, bottom, top, near, far, each
+    as (a, b, c, d) with the normal pointing into the frustum."""
+    (m00, m01, m02, m03, m10, m11, m12, m13, m20, m21, m22, m23, m30, m31,
+     m32, m33) = m
+    planes = (
+        (m03 + m00, m13 + m10, m23 + m20, m33 + m30),  # left
+        (m03 - m00, m13 - m10, m23 - m20, m33 - m30),  # right
+        (m03 + m01, m13 + m11, m23 + m21, m33 + m31),  # bottom
+        (m03 - m01, m13 - m11, m23 - m21, m33 - m31),  # top
+        (m03 + m02, m13 + m12, m23 + m22, m33 + m32),  # near
+        (m03 - m02, m13 - m12, m23 - m22, m33 - m32),  # far
+    )
+    for i, (a, b, c, d) in enumerate(planes):
+        length = math.sqrt(a*a + b*b + c*c)
+        length = 1.0 / length if length else 0.0
+        out[i*4] = a * length
+        out[i*4+1] = b * length
+        out[i*4+2] = c * length
+        out[i*4+3] = d * length
+
+
+def sphere_visible(planes, center, radius):
+    """Returns True if the sphere is (partially) inside the frustum"""
+    x, y, z = center
+    for i in range(0, 24, 4):
+        if (planes[i] * x + planes[i+1] * y + planes[i+2] * z +
+                planes[i+3] < -radius):
+            return False
+    return True
+
+
+def aabb_visible(planes, min, max):
+    """Returns True if the AABB is (partially) inside the frustum"""
+    x0, y0, z0 = min
+    x1, y1, z1 = max
+    for i in range(0, 24, 4):
+        a, b, c, d = planes[i:i+4]
+        # Test the corner furthest along the plane normal
+        if (a * (x1 if a >= 0 else x0) + b * (y1 if b >= 0 else y0) +
+                c * (z1 if c >= 0 else z0) + d < 0):
+            return False
+    return True
+
+
+def rect_visible(view, x0, y0, x1, y1):
+    """Returns True if rect (x0, y0)-(x1, y1) overlaps `view` rect"""
+    return not (x1 < view[0] or x0 > view[2] or
+                y1 < view[1] or y0 > view[3])
+
+
+def _mask_out(out, n):
+    if out is None:
+        return bytearray(n)
+    if len(out) < n:
+        raise ValueError('out is too small')
+    return out
+
+
+def cull_spheres(planes, spheres, out=None):
+    """Tests packed spheres (x, y, z, radius) against the frustum.
+
+    Writes 1 (visible) or 0 (culled) for each sphere into `out` (a new
+    bytearray if not given), and returns it."""
+    n = len(spheres) // 4
+    out = _mask_out(out, n)
+    if numpy is not None:
+        s = numpy.frombuffer(spheres, numpy.float32, n * 4).reshape(n, 4)
+        p = numpy.frombuffer(planes, numpy.float32, 24).reshape(6, 4)
+        dist = s[:, :3] @ p[:, :3].T + p[:, 3]
+        vis = (dist >= -s[:, 3:4]).all(axis=1)
+        numpy.frombuffer(out, numpy.uint8, n)[:] = vis
+        return out
+    for j in range(n):
+        J = j * 4
+        out[j] = sphere_visible(planes, spheres[J:J+3], spheres[J+3])
+    return out
+
+
+def cull_aabbs(planes, boxes, out=None):
+    """Tests packed AABBs (minx, miny, minz, maxx, maxy, maxz) against the
+    frustum.
+
+    Writes 1 (visible) or 0 (culled) for each box into `out` (a new
+    bytearray if not given), and returns it."""
+    n = len(boxes) // 6
+    out = _mask_out(out, n)
+    if numpy is not None:
+        b = numpy.frombuffer(boxes, numpy.float32, n * 6).reshape(n, 6)
+        p = numpy.frombuffer(planes, numpy.float32, 24).reshape(6, 4)
+        # Corner furthest along each plane normal
+        center = (b[:, :3] + b[:, 3:]) * 0.5
+        extent = (b[:, 3:] - b[:, :3]) * 0.5
+        dist = center @ p[:, :3].T + extent @ numpy.abs(p[:, :3]).T + p[:, 3]
+        numpy.frombuffer(out, numpy.uint8, n)[:] = (dist >= 0).all(axis=1)
+        return out
+    for j in range(n):
+        J = j * 6
+        out[j] = aabb_visible(planes, boxes[J:J+3], boxes[J+3:J+6])
+    return out
+
+
+def cull_rects(view, rects, out=None):
+    """Tests packed rects (x0, y0, x1, y1) against `view` rect.
+
+    Writes 1 (visible) or 0 (culled) for each rect into `out` (a new
+    bytearray if not given), and returns it."""
+    n = len(rects) // 4
+    out = _mask_out(out, n)
+    if numpy is not None:
+        r = numpy.frombuffer(rects, numpy.float32, n * 4).reshape(n, 4)
+        vis = ((r[:, 2] >= view[0]) & (r[:, 0] <= view[2]) &
+               (r[:, 3] >= view[1]) & (r[:, 1] <= view[3]))
+        numpy.frombuffer(out, numpy.uint8, n)[:] = vis
+        return out
+    vx0, vy0, vx1, vy1 = view
+    for j in range(n):
+        x0, y0, x1, y1 = rects[j*4:j*4+4]
+        out[j] = not (x1 < vx0 or x0 > vx1 or y1 < vy0 or y0 > vy1)
+    return out
+
+
+def view_rect(m):
+    """Returns (x0, y0, x1, y1) rect visible through orthographic
+    projection-view matrix `m` (e.g. Window.ortho_mat)"""
+    # Invert the 2D part of the matrix for NDC corners (-1, -1), (1, 1)
+    sx, sy, tx, ty = m[0], m[5], m[12], m[13]
+    x0, x1 = (-1 - tx) / sx, (1 - tx) / sx
+    y0, y1 = (-1 - ty) / sy, (1 - ty) / sy
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def quad2_bounds(geom, out=None):
+    """Returns packed rects (x0, y0, x1, y1) of every quad of Quad2Geom"""
+    nf = geom.num_floats
+    vertdata = geom.vertdata
+    n = len(vertdata) // (4 * nf)
+    if out is None:
+        out = array.array('f', bytes(n * 16))
+    if numpy is not None:
+        v = numpy.frombuffer(vertdata, numpy.float32, n * 4 * nf)
+        pos = v.reshape(n, 4, nf)[:, :, :2]
+        r = numpy.frombuffer(out, numpy.float32, n * 4).reshape(n, 2, 2)
+        r[:, 0] = pos.min(axis=1)
+        r[:, 1] = pos.max(axis=1)
+        return out
+    for j in range(n):
+        J = j * 4 * nf
+        xs = vertdata[J:J+4*nf:nf]
+        ys = vertdata[J+1:J+4*nf:nf]
+        out[j*4:j*4+4] = array.array('f', (min(xs), min(ys),
+                                           max(xs), max(ys)))
+    return out
+
+
+def tri3_bounds(geom, out=None):
+    """Returns packed AABBs (minx, miny, minz, maxx, maxy, maxz) of every
+    triangle of Tri3Geom"""
+    nf = geom.num_floats
+    vertdata = geom.vertdata
+    n = len(vertdata) // (3 * nf)
+    if out is None:
+        out = array.array('f', bytes(n * 24))
+    if numpy is not None:
+        v = numpy.frombuffer(vertdata, numpy.float32, n * 3 * nf)
+        pos = v.reshape(n, 3, nf)[:, :, :3]
+        b = numpy.frombuffer(out, numpy.float32, n * 6).reshape(n, 2, 3)
+        b[:, 0] = pos.min(axis=1)
+        b[:, 1] = pos.max(axis=1)
+        return out
+    for j in range(n):
+        J = j * 3 * nf
+        xs = vertdata[J:J+3*nf:nf]
+        ys = vertdata[J+1:J+3*nf:nf]
+        zs = vertdata[J+2:J+3*nf:nf]
+        out[j*6:j*6+6] = array.array('f', (min(xs), min(ys), min(zs),
+                                           max(xs), max(ys), max(zs)))
+    return out
+
+
+def visible_ranges(mask, group_size=1, count=None):
+    """Converts visibility `mask` into a list of (first, count) slot ranges.
+
+    Each mask entry covers `group_size` consecutive slots. Adjacent visible
+    groups are merged into one range. If `count` (total number of slots) is
+    given, the last range is clipped to it. The result can be passed as
+    `ranges` to Tri3Geom.draw() and Quad2Geom.draw()."""
+    ranges = []
+    start = None
+    for i, visible in enumerate(mask):
+        if visible:
+            if start is None:
+                start = i
+        elif start is not None:
+            ranges.append((start * group_size, (i - start) * group_size))
+            start = None
+    if start is not None:
+        ranges.append((start * group_size, (len(mask) - start) * group_size))
+    if count is not None and ranges:
+        first, n = ranges[-1]
+        if first >= count:
+            del ranges[-1]
+        elif first + n > count:
+            ranges[-1] = (first, count - first)
+    return ranges
@@ -0,0 +1,12 @@
+"""Window input events"""
+import collections
+
+
+KeyEvent = collections.namedtuple('KeyEvent', 'type key')
+
+
+ButtonEvent = collections.namedtuple('ButtonEvent', 'type mouse button x y')
+
+
+MotionEvent = collections.namedtuple('MotionEvent', 'type mouse state x y '
+                                                    'relx rely')
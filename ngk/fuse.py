@@ -0,0 +1,401 @@
+"""Fusing chains of mat4/vec3/vec4/quat calls into generated functions.
+
+A chain is a list of steps in the same form as the `out`-parameter API,
+with names instead of arrays::
+
+    f = fuse.fuse([(mat4.translate, 'model', 'model', 'pos'),
+                   (mat4.scale, 'model', 'model', 'size'),
+                   (mat4.multiply, 'mvp', 'viewproj', 'model'),
+                   (vec3.transform_mat4, 'center', 'origin', 'mvp')],
+                  outputs=('mvp', 'center'))
+    f(model, pos, size, viewproj, origin, mvp, center)
+
+Names read before they are written are the inputs, and the generated
+function takes the inputs (in order of first use) followed by the outputs
+that are not also inputs (`f.args` lists them). Every component of every
+temporary is kept in a local variable, and only the outputs are written
+to, once per component. Unlike the step-by-step calls, normalizing a zero
+vector gives a zero vector."""
+import keyword
+import math
+from . import mat4, quat, vec3, vec4
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _is_atom(expr):
+    """Returns True if `expr` is a name or a number literal"""
+    if expr.isidentifier():
+        return True
+    try:
+        float(expr)
+    except ValueError:
+        return False
+    return True
+
+
+def _mul(a, b):
+    """Returns expr of a * b, or None if it is zero"""
+    if a == '0.0' or b == '0.0':
+        return None
+    if a == '1.0':
+        return b
+    if b == '1.0':
+        return a
+    return '{0} * {1}'.format(a, b)
+
+
+def _sum(pos, neg=()):
+    """Returns expr of the sum of `pos` minus the sum of `neg` (None terms
+    are zero)"""
+    pos = [x for x in pos if x is not None and x != '0.0']
+    neg = [x for x in neg if x is not None and x != '0.0']
+    if not pos and not neg:
+        return '0.0'
+    expr = ' + '.join(pos) if pos else '-' + neg.pop(0)
+    for x in neg:
+        expr += ' - ' + x
+    return expr
+
+
+class _Context:
+    """Collects the generated statements of one fused function"""
+
+    def __init__(self, batch):
+        #: True if generating the NumPy batch version
+        self.batch = batch
+        #: List of (name, expr) statements
+        self.lines = []
+
+    def emit(self, expr):
+        """Returns atom holding the value of `expr`"""
+        if _is_atom(expr):
+            return expr
+        name = '_t{0}'.format(len(self.lines))
+        self.lines.append((name, expr))
+        return name
+
+    def nonzero(self, x):
+        """Returns atom holding `x`, or 1.0 where `x` is zero"""
+        if self.batch:
+            return self.emit('_where({0} == 0, 1.0, {0})'.format(x))
+        return self.emit('{0} or 1.0'.format(x))
+
+    def rsqrt0(self, x):
+        """Returns atom holding 1 / sqrt(x), or 0 where `x` is not
+        positive"""
+        if self.batch:
+            return self.emit('_where({0} > 0, 1.0 / _sqrt(_maximum({0}, '
+                             '1e-38)), 0.0)'.format(x))
+        return self.emit('1.0 / _sqrt({0}) if {0} > 0 else 0.0'.format(x))
+
+
+# Rules: functions of (ctx, *component lists) returning the components of
+# the output. Scalar arguments are passed as a single atom.
+
+def _mat4_identity(ctx):
+    return ['1.0' if i % 5 == 0 else '0.0' for i in range(16)]
+
+
+def _mat4_multiply(ctx, a, b):
+    return [ctx.emit(_sum(_mul(a[k * 4 + r], b[c * 4 + k])
+                          for k in range(4)))
+            for c in range(4) for r in range(4)]
+
+
+def _mat4_translate(ctx, a, v):
+    out = list(a[:12])
+    for r in range(4):
+        out.append(ctx.emit(_sum([_mul(a[r], v[0]), _mul(a[4 + r], v[1]),
+                                  _mul(a[8 + r], v[2]), a[12 + r]])))
+    return out
+
+
+def _mat4_scale(ctx, a, v):
+    return ([ctx.emit(_sum([_mul(a[c * 4 + r], v[c])]))
+             for c in range(3) for r in range(4)] + list(a[12:]))
+
+
+def _mat4_from_rotation_translation_scale(ctx, q, v, s):
+    x, y, z, w = q
+    sx, sy, sz = s
+    e = ctx.emit
+    x2, y2, z2 = e(x + ' + ' + x), e(y + ' + ' + y), e(z + ' + ' + z)
+    xx, xy, xz = e(_mul(x, x2)), e(_mul(x, y2)), e(_mul(x, z2))
+    yy, yz, zz = e(_mul(y, y2)), e(_mul(y, z2)), e(_mul(z, z2))
+    wx, wy, wz = e(_mul(w, x2)), e(_mul(w, y2)), e(_mul(w, z2))
+    return [e('(1 - ({0} + {1})) * {2}'.format(yy, zz, sx)),
+            e('({0} + {1}) * {2}'.format(xy, wz, sx)),
+            e('({0} - {1}) * {2}'.format(xz, wy, sx)), '0.0',
+            e('({0} - {1}) * {2}'.format(xy, wz, sy)),
+            e('(1 - ({0} + {1})) * {2}'.format(xx, zz, sy)),
+            e('({0} + {1}) * {2}'.format(yz, wx, sy)), '0.0',
+            e('({0} + {1}) * {2}'.format(xz, wy, sz)),
+            e('({0} - {1}) * {2}'.format(yz, wx, sz)),
+            e('(1 - ({0} + {1})) * {2}'.format(xx, yy, sz)), '0.0',
+            v[0], v[1], v[2], '1.0']
+
+
+def _componentwise(fmt):
+    def rule(ctx, a, b):
+        return [ctx.emit(fmt.format(x, y)) for x, y in zip(a, b)]
+    return rule
+
+
+def _add(ctx, a, b):
+    return [ctx.emit(_sum([x, y])) for x, y in zip(a, b)]
+
+
+def _scale(ctx, a, b):
+    return [ctx.emit(_sum([_mul(x, b)])) for x in a]
+
+
+def _negate(ctx, a):
+    return [ctx.emit('-' + x) for x in a]
+
+
+def _normalize(ctx, a):
+    length = ctx.rsqrt0(ctx.emit(_sum(_mul(x, x) for x in a)))
+    return [ctx.emit(_sum([_mul(x, length)])) for x in a]
+
+
+def _vec3_cross(ctx, a, b):
+    ax, ay, az = a
+    bx, by, bz = b
+    return [ctx.emit(_sum([_mul(ay, bz)], [_mul(az, by)])),
+            ctx.emit(_sum([_mul(az, bx)], [_mul(ax, bz)])),
+            ctx.emit(_sum([_mul(ax, by)], [_mul(ay, bx)]))]
+
+
+def _vec3_transform_mat4(ctx, a, m):
+    x, y, z = a
+    w = ctx.nonzero(ctx.emit(_sum([_mul(m[3], x), _mul(m[7], y),
+                                   _mul(m[11], z), m[15]])))
+    return [ctx.emit('({0}) / {1}'.format(
+        _sum([_mul(m[r], x), _mul(m[4 + r], y), _mul(m[8 + r], z),
+              m[12 + r]]), w)) for r in range(3)]
+
+
+def _vec4_transform_mat4(ctx, a, m):
+    return [ctx.emit(_sum(_mul(m[c * 4 + r], a[c]) for c in range(4)))
+            for r in range(4)]
+
+
+def _transform_quat(ctx, a, q):
+    x, y, z = a[:3]
+    qx, qy, qz, qw = q
+    e = ctx.emit
+    ix = e(_sum([_mul(qw, x), _mul(qy, z)], [_mul(qz, y)]))
+    iy = e(_sum([_mul(qw, y), _mul(qz, x)], [_mul(qx, z)]))
+    iz = e(_sum([_mul(qw, z), _mul(qx, y)], [_mul(qy, x)]))
+    iw = e(_sum([], [_mul(qx, x), _mul(qy, y), _mul(qz, z)]))
+    out = [e(_sum([_mul(ix, qw), _mul(iz, qy)],
+                  [_mul(iw, qx), _mul(iy, qz)])),
+           e(_sum([_mul(iy, qw), _mul(ix, qz)],
+                  [_mul(iw, qy), _mul(iz, qx)])),
+           e(_sum([_mul(iz, qw), _mul(iy, qx)],
+                  [_mul(iw, qz), _mul(ix, qy)]))]
+    return out + list(a[3:])
+
+
+def _quat_multiply(ctx, a, b):
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    return [ctx.emit(_sum([_mul(ax, bw), _mul(aw, bx), _mul(ay, bz)],
+                          [_mul(az, by)])),
+            ctx.emit(_sum([_mul(ay, bw), _mul(aw, by), _mul(az, bx)],
+                          [_mul(ax, bz)])),
+            ctx.emit(_sum([_mul(az, bw), _mul(aw, bz), _mul(ax, by)],
+                          [_mul(ay, bx)])),
+            ctx.emit(_sum([_mul(aw, bw)],
+                          [_mul(ax, bx), _mul(ay, by), _mul(az, bz)]))]
+
+
+#: Mapping from function -> (argument sizes (0 for scalars), output size,
+#: rule)
+RULES = {
+    mat4.identity: ((), 16, _mat4_identity),
+    mat4.multiply: ((16, 16), 16, _mat4_multiply),
+    mat4.translate: ((16, 3), 16, _mat4_translate),
+    mat4.scale: ((16, 3), 16, _mat4_scale),
+    mat4.from_rotation_translation_scale: (
+        (4, 3, 3), 16, _mat4_from_rotation_translation_scale),
+    vec3.add: ((3, 3), 3, _add),
+    vec3.subtract: ((3, 3), 3, _componentwise('{0} - {1}')),
+    vec3.multiply: ((3, 3), 3, _componentwise('{0} * {1}')),
+    vec3.scale: ((3, 0), 3, _scale),
+    vec3.negate: ((3,), 3, _negate),
+    vec3.normalize: ((3,), 3, _normalize),
+    vec3.cross: ((3, 3), 3, _vec3_cross),
+    vec3.transform_mat4: ((3, 16), 3, _vec3_transform_mat4),
+    vec3.transform_quat: ((3, 4), 3, _transform_quat),
+    vec4.add: ((4, 4), 4, _add),
+    vec4.subtract: ((4, 4), 4, _componentwise('{0} - {1}')),
+    vec4.multiply: ((4, 4), 4, _componentwise('{0} * {1}')),
+    vec4.scale: ((4, 0), 4, _scale),
+    vec4.normalize: ((4,), 4, _normalize),
+    vec4.transform_mat4: ((4, 16), 4, _vec4_transform_mat4),
+    vec4.transform_quat: ((4, 4), 4, _transform_quat),
+    quat.multiply: ((4, 4), 4, _quat_multiply),
+    quat.scale: ((4, 0), 4, _scale),
+    quat.add: ((4, 4), 4, _add),
+    quat.normalize: ((4,), 4, _normalize),
+}
+
+
+def _check_name(name):
+    if not isinstance(name, str) or not name.isidentifier() or \
+            keyword.iskeyword(name) or name.startswith('_'):
+        raise ValueError('Invalid name {0!r}'.format(name))
+
+
+def _generate(steps, outputs, batch):
+    """Returns (source, args) of the fused function"""
+    ctx = _Context(batch)
+    values = {}  # Mapping from name -> components
+    inputs = []  # List of (name, size)
+    for step in steps:
+        func, out, args = step[0], step[1], step[2:]
+        if func not in RULES:
+            raise ValueError('Cannot fuse {0!r}'.format(func))
+        sizes, out_size, rule = RULES[func]
+        if len(args) != len(sizes):
+            raise ValueError('{0} takes {1} arguments after out'.format(
+                func.__name__, len(sizes)))
+        _check_name(out)
+        comps = []
+        for name, size in zip(args, sizes):
+            _check_name(name)
+            if name not in values:
+                values[name] = ['{0}_{1}'.format(name, i)
+                                for i in range(size)] if size else name
+                inputs.append((name, size))
+            value = values[name]
+            if (len(value) if isinstance(value, list) else 0) != size:
+                raise ValueError('{0!r} has the wrong size for {1}'.format(
+                    name, func.__name__))
+            comps.append(value)
+        values[out] = rule(ctx, *comps)
+        assert len(values[out]) == out_size
+    input_names = [name for name, size in inputs]
+    for name in outputs:
+        if name not in values:
+            raise ValueError('Output {0!r} is never written'.format(name))
+        if not isinstance(values[name], list):
+            raise ValueError('Output {0!r} is a scalar'.format(name))
+    args = input_names + [x for x in outputs if x not in input_names]
+
+    # Keep only the statements the outputs depend on
+    needed = set()
+    for name in outputs:
+        needed.update(values[name])
+    body = []
+    for name, expr in reversed(ctx.lines):
+        if name in needed:
+            body.append((name, expr))
+            needed.update(_identifiers(expr))
+    body.reverse()
+
+    src = ['def _fused({0}):'.format(', '.join(args))]
+    for name, size in inputs:
+        if not size:
+            if batch:
+                src.append('    {0} = _scalars({0})'.format(name))
+            continue
+        comps = ['{0}_{1}'.format(name, i) for i in range(size)]
+        if not needed.intersection(comps):
+            continue
+        if batch:
+            src.append('    {0} = _columns({1}, {2})'.format(
+                ', '.join(comps), name, size))
+        else:
+            src.append('    {0} = {1}'.format(', '.join(comps), name))
+    for name, expr in body:
+        src.append('    {0} = {1}'.format(name, expr))
+    for name in outputs:
+        if batch:
+            src.append('    {0} = _rows({0}, {1})'.format(
+                name, len(values[name])))
+            fmt = '    {0}[:, {1}] = {2}'
+        else:
+            fmt = '    {0}[{1}] = {2}'
+        for i, comp in enumerate(values[name]):
+            src.append(fmt.format(name, i, comp))
+    if len(src) == 1:
+        src.append('    pass')
+    return '\n'.join(src) + '\n', args
+
+
+def _identifiers(expr):
+    out = []
+    word = ''
+    for c in expr + ' ':
+        if c.isalnum() or c == '_':
+            word += c
+        else:
+            if word and word.isidentifier():
+                out.append(word)
+            word = ''
+    return out
+
+
+def _columns(a, size):
+    """Returns list of the `size` columns of per-object (n, size) or
+    shared (size,) float data `a`"""
+    if not isinstance(a, numpy.ndarray):
+        a = numpy.frombuffer(a, numpy.float32)
+    if a.ndim == 1 and a.size != size:
+        a = a.reshape(-1, size)
+    return [a[..., i] for i in range(size)]
+
+
+def _scalars(a):
+    return numpy.asarray(a, numpy.float32)
+
+
+def _rows(a, size):
+    """Returns writable (n, size) view of output float data `a`"""
+    if not isinstance(a, numpy.ndarray):
+        a = numpy.frombuffer(a, numpy.float32)
+    return a.reshape(-1, size)
+
+
+#: Mapping from (steps, outputs, batch) -> fused function
+_cache = {}
+
+
+def fuse(steps, outputs, batch=False):
+    """Returns function computing chain `steps`, writing `outputs`.
+
+    Each step is a tuple (func, out, *args) of a function in RULES and
+    names. Generated functions are cached, so fusing the same chain again
+    is cheap. If `batch` is True, the returned function is vectorized with
+    NumPy: every input is either shared (e.g. a single mat4) or has one
+    row per object (an (n, size) array, or a flat float buffer of n
+    rows), scalar inputs can be arrays of n values, and the outputs must
+    be writable float buffers of n rows."""
+    steps = tuple(tuple(step) for step in steps)
+    outputs = tuple(outputs)
+    key = steps, outputs, bool(batch)
+    f = _cache.get(key)
+    if f is not None:
+        return f
+    if batch and numpy is None:
+        raise ValueError('batch requires NumPy')
+    src, args = _generate(steps, outputs, batch)
+    if batch:
+        namespace = {'_columns': _columns, '_scalars': _scalars,
+                     '_rows': _rows, '_where': numpy.where,
+                     '_maximum': numpy.maximum, '_sqrt': numpy.sqrt}
+    else:
+        namespace = {'_sqrt': math.sqrt}
+    exec(compile(src, '<fused>', 'exec'), namespace)
+    f = namespace['_fused']
+    #: Argument names
+    f.args = tuple(args)
+    #: Generated source
+    f.source = src
+    _cache[key] = f
+    return f
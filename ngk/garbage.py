@@ -0,0 +1,33 @@
+"""Deferred deletion of GL object names.
+
+GL objects can only be deleted with their context current, so handles
+queue their names when they die and the queues are flushed once per frame
+(see vid.ContextGroup). flush() deletes them in batches, with one call per
+batch where the GL binding can delete several names at once, and spreads a
+large backlog (e.g. after a level is unloaded) over several frames."""
+import array
+import time
+
+
+#: Number of names deleted per batch (and between deadline checks)
+BATCH = 256
+
+
+def flush(queue, delete, deadline, delete_many=None):
+    """Deletes names in `queue` in batches of BATCH until `deadline`
+    (time.perf_counter()). At least one batch is deleted.
+
+    Each batch is deleted with delete_many(n, names) (e.g.
+    glDeleteTextures, with names as array('I')) if not None, else with
+    delete(name) for each name. Returns True if the queue was emptied."""
+    while queue:
+        batch = queue[-BATCH:]
+        del queue[-BATCH:]
+        if delete_many is not None:
+            delete_many(len(batch), array.array('I', batch))
+        else:
+            for x in batch:
+                delete(x)
+        if queue and time.perf_counter() >= deadline:
+            return False
+    return True
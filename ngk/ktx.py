@@ -0,0 +1,382 @@
+"""KTX (version 1) texture container reader/writer and ETC1 encoder.
+
+load() memory-maps the file, so the mip levels are memoryviews into the
+mapping which are passed to GL without copying (see
+vid.CompressedTexture2.from_ktx()).
+
+Convert PNG images to ETC1 KTX files offline with::
+
+    python -m ngk.ktx image.png [more.png ...]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+IDENTIFIER = b'\xabKTX 11\xbb\r\n\x1a\n'
+
+#: endianness, glType, glTypeSize, glFormat, glInternalFormat,
+#: glBaseInternalFormat, pixelWidth, pixelHeight, pixelDepth,
+#: numberOfArrayElements, numberOfFaces, numberOfMipmapLevels,
+#: bytesOfKeyValueData
+_FIELDS = '13I'
+_HEADER_SIZE = len(IDENTIFIER) + struct.calcsize(_FIELDS)
+_ENDIANNESS = 0x04030201
+
+# GL formats (without importing vid)
+GL_RGB = 0x1907
+GL_ETC1_RGB8_OES = 0x8D64
+GL_COMPRESSED_RGB_S3TC_DXT1_EXT = 0x83F0
+GL_COMPRESSED_RGBA_S3TC_DXT1_EXT = 0x83F1
+GL_COMPRESSED_RGBA_S3TC_DXT3_EXT = 0x83F2
+GL_COMPRESSED_RGBA_S3TC_DXT5_EXT = 0x83F3
+GL_COMPRESSED_RGB_PVRTC_4BPPV1_IMG = 0x8C00
+GL_COMPRESSED_RGB_PVRTC_2BPPV1_IMG = 0x8C01
+GL_COMPRESSED_RGBA_PVRTC_4BPPV1_IMG = 0x8C02
+GL_COMPRESSED_RGBA_PVRTC_2BPPV1_IMG = 0x8C03
+
+#: Mapping from GLES2 extension -> compressed formats it adds
+EXTENSION_FORMATS = {
+    'GL_OES_compressed_ETC1_RGB8_texture': (GL_ETC1_RGB8_OES,),
+    'GL_EXT_texture_compression_s3tc': (
+        GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT1_EXT,
+        GL_COMPRESSED_RGBA_S3TC_DXT3_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT),
+    'GL_EXT_texture_compression_dxt1': (
+        GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT1_EXT),
+    'GL_IMG_texture_compression_pvrtc': (
+        GL_COMPRESSED_RGB_PVRTC_4BPPV1_IMG,
+        GL_COMPRESSED_RGB_PVRTC_2BPPV1_IMG,
+        GL_COMPRESSED_RGBA_PVRTC_4BPPV1_IMG,
+        GL_COMPRESSED_RGBA_PVRTC_2BPPV1_IMG),
+}
+
+
+class KTX:
+    """KTX texture in buffer `data` (e.g. an mmap).
+
+    `levels` is a list of (w, h, data) of each mip level, level 0 first,
+    where data is a memoryview into `data`. Only 2D textures (one face, no
+    array elements) are supported."""
+
+    def __init__(self, data):
+        view = memoryview(data).cast('B')
+        if len(view) < _HEADER_SIZE or \
+                view[:len(IDENTIFIER)] != IDENTIFIER:
+            raise ValueError('Not a KTX file')
+        offset = len(IDENTIFIER)
+        endianness, = struct.unpack_from('<I', view, offset)
+        if endianness == _ENDIANNESS:
+            order = '<'
+        elif endianness == 0x01020304:
+            order = '>'
+        else:
+            raise ValueError('Invalid KTX endianness')
+        (_, self.gl_type, self.gl_type_size, self.gl_format,
+         self.internal_format, self.base_internal_format, self.w, self.h,
+         depth, num_elements, num_faces, num_levels,
+         kv_bytes) = struct.unpack_from(order + _FIELDS, view, offset)
+        if depth or num_elements or num_faces != 1:
+            raise ValueError('Only 2D KTX textures are supported')
+        offset = _HEADER_SIZE + kv_bytes
+        #: List of (w, h, data) of each mip level
+        self.levels = []
+        w, h = self.w, self.h
+        for i in range(max(1, num_levels)):
+            if offset + 4 > len(view):
+                raise ValueError('Truncated KTX file')
+            size, = struct.unpack_from(order + 'I', view, offset)
+            offset += 4
+            if offset + size > len(view):
+                raise ValueError('Truncated KTX file')
+            self.levels.append((w, h, view[offset:offset + size]))
+            offset += (size + 3) & ~3
+            w = max(1, w // 2)
+            h = max(1, h // 2)
+        self.__view = view
+        self.__mmap = None
+
+    #: True if the data is compressed (glType 0)
+    compressed = property(lambda x: x.gl_type == 0)
+
+    def close(self):
+        """Releases the level views and the mapping (if any).
+
+        Views of the levels made with memoryview() (e.g. by
+        vid.CompressedTexture2.from_ktx()) stay valid: the mapping is then
+        unmapped once the last of them is released."""
+        for w, h, data in self.levels:
+            data.release()
+        self.levels = []
+        self.__view.release()
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                # Still exported
+                pass
+            self.__mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def load(path):
+    """Memory-maps KTX file `path`. Returns KTX."""
+    with open(path, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        ktx = KTX(m)
+    except Exception:
+        m.close()
+        raise
+    ktx._KTX__mmap = m
+    return ktx
+
+
+def write(f, w, h, internal_format, levels, base_internal_format=GL_RGB):
+    """Writes KTX file of compressed mip `levels` (level 0 first) to binary
+    file object `f`"""
+    f.write(IDENTIFIER)
+    f.write(struct.pack('<' + _FIELDS, _ENDIANNESS, 0, 1, 0, internal_format,
+                        base_internal_format, w, h, 0, 0, 1, len(levels), 0))
+    for data in levels:
+        size = memoryview(data).nbytes
+        f.write(struct.pack('<I', size))
+        f.write(data)
+        f.write(bytes(-size & 3))
+
+
+# ETC1 encoder
+
+#: Modifier tables of ETC1, in pixel index order (a, b, -a, -b)
+ETC1_MODIFIERS = ((2, 8, -2, -8), (5, 17, -5, -17), (9, 29, -9, -29),
+                  (13, 42, -13, -42), (18, 60, -18, -60),
+                  (24, 80, -24, -80), (33, 106, -33, -106),
+                  (47, 183, -47, -183))
+
+
+def _subblocks(blocks, flip):
+    """Returns pixels (N, 8, 3) and pixel numbers (x * 4 + y) of the two
+    subblocks of `blocks` (N, 4, 4, 3) indexed [y, x]"""
+    if flip:
+        # 4x2 top and bottom
+        coords = ([(x, y) for y in (0, 1) for x in range(4)],
+                  [(x, y) for y in (2, 3) for x in range(4)])
+    else:
+        # 2x4 left and right
+        coords = ([(x, y) for x in (0, 1) for y in range(4)],
+                  [(x, y) for x in (2, 3) for y in range(4)])
+    out = []
+    for c in coords:
+        ys = [y for x, y in c]
+        xs = [x for x, y in c]
+        out.append((blocks[:, ys, xs], [x * 4 + y for x, y in c]))
+    return out
+
+
+def _fit(pixels, base):
+    """Returns (error, table, selectors) of the best modifier table for
+    subblock `pixels` (N, 8, 3) with base colors `base` (N, 3)"""
+    np = numpy
+    mods = np.array(ETC1_MODIFIERS, np.int32)
+    # (N, table, modifier, channel)
+    colors = np.clip(base[:, None, None, :] + mods[None, :, :, None], 0, 255)
+    # (N, table, pixel, modifier)
+    d = pixels[:, None, :, None, :] - colors[:, :, None, :, :]
+    err = (d * d).sum(axis=-1)
+    selectors = err.argmin(axis=-1)
+    err = err.min(axis=-1).sum(axis=-1)
+    table = err.argmin(axis=-1)
+    n = np.arange(len(pixels))
+    return err[n, table], table, selectors[n, table]
+
+
+#: Number of blocks encoded at once (bounds temporary memory)
+_ETC1_CHUNK = 4096
+
+
+def _encode_blocks(blocks):
+    """Returns (high, low) words of ETC1 `blocks` (N, 4, 4, 3)"""
+    np = numpy
+    n = len(blocks)
+    best_err = np.full(n, np.inf)
+    high = np.zeros(n, np.int64)
+    low = np.zeros(n, np.int64)
+    for flip in (0, 1):
+        (p0, pos0), (p1, pos1) = _subblocks(blocks, flip)
+        avg0 = p0.mean(axis=1)
+        avg1 = p1.mean(axis=1)
+        # Individual mode: two 4-bit colors
+        q0 = np.clip(np.rint(avg0 / 17), 0, 15).astype(np.int64)
+        q1 = np.clip(np.rint(avg1 / 17), 0, 15).astype(np.int64)
+        indiv = (q0, q1, q0 * 17, q1 * 17, np.ones(n, bool), 0)
+        # Differential mode: 5-bit color and 3-bit signed delta
+        d0 = np.clip(np.rint(avg0 * 31 / 255), 0, 31).astype(np.int64)
+        d1 = np.clip(np.rint(avg1 * 31 / 255), 0, 31).astype(np.int64)
+        delta = d1 - d0
+        ok = ((delta >= -4) & (delta <= 3)).all(axis=1)
+        diff = (d0, delta & 7, (d0 << 3) | (d0 >> 2), (d1 << 3) | (d1 >> 2),
+                ok, 1)
+        for c0, c1, base0, base1, valid, diffbit in (indiv, diff):
+            e0, t0, s0 = _fit(p0, base0)
+            e1, t1, s1 = _fit(p1, base1)
+            err = np.where(valid, e0 + e1, np.inf)
+            better = err < best_err
+            if not better.any():
+                continue
+            best_err = np.where(better, err, best_err)
+            if diffbit:
+                hi = (((c0[:, 0] << 3) | c1[:, 0]) << 24 |
+                      ((c0[:, 1] << 3) | c1[:, 1]) << 16 |
+                      ((c0[:, 2] << 3) | c1[:, 2]) << 8)
+            else:
+                hi = (c0[:, 0] << 28 | c1[:, 0] << 24 | c0[:, 1] << 20 |
+                      c1[:, 1] << 16 | c0[:, 2] << 12 | c1[:, 2] << 8)
+            hi = hi | (t0 << 5) | (t1 << 2) | (diffbit << 1) | flip
+            lo = np.zeros(n, np.int64)
+            for sel, pos in ((s0, pos0), (s1, pos1)):
+                for k, i in enumerate(pos):
+                    lo |= (sel[:, k] >> 1) << (16 + i) | (sel[:, k] & 1) << i
+            high = np.where(better, hi, high)
+            low = np.where(better, lo, low)
+    return high, low
+
+
+def encode_etc1(w, h, data, comp=3):
+    """Encodes 8-bit RGB(A) image `data` (rows top-down, alpha is dropped)
+    to ETC1 blocks. Requires NumPy. Returns bytes."""
+    if numpy is None:
+        raise ValueError('ETC1 encoding requires NumPy')
+    np = numpy
+    img = np.frombuffer(data, np.uint8, w * h * comp)
+    img = img.reshape(h, w, comp)[:, :, :3]
+    # Pad to whole blocks by repeating the edge pixels
+    bw, bh = (w + 3) // 4, (h + 3) // 4
+    img = np.pad(img, ((0, bh * 4 - h), (0, bw * 4 - w), (0, 0)), 'edge')
+    blocks = img.reshape(bh, 4, bw, 4, 3).swapaxes(1, 2).reshape(-1, 4, 4, 3)
+    out = np.empty((len(blocks), 2), '>u4')
+    for i in range(0, len(blocks), _ETC1_CHUNK):
+        chunk = blocks[i:i + _ETC1_CHUNK].astype(np.int32)
+        out[i:i + _ETC1_CHUNK, 0], out[i:i + _ETC1_CHUNK, 1] = \
+            _encode_blocks(chunk)
+    return out.tobytes()
+
+
+def decode_etc1(w, h, data):
+    """Decodes ETC1 blocks to 8-bit RGB rows (top-down). Requires NumPy.
+    Returns bytes."""
+    if numpy is None:
+        raise ValueError('ETC1 decoding requires NumPy')
+    np = numpy
+    bw, bh = (w + 3) // 4, (h + 3) // 4
+    words = np.frombuffer(data, '>u4', bw * bh * 2).reshape(-1, 2)
+    hi = words[:, 0].astype(np.int64)
+    lo = words[:, 1].astype(np.int64)
+    flip = hi & 1
+    diffbit = (hi >> 1) & 1
+    tables = ((hi >> 5) & 7, (hi >> 2) & 7)
+    base = np.zeros((2, len(hi), 3), np.int64)
+    for i, shift in enumerate((24, 16, 8)):
+        # Individual
+        i0 = (hi >> (shift + 4)) & 15
+        i1 = (hi >> shift) & 15
+        # Differential
+        d0 = (hi >> (shift + 3)) & 31
+        d1 = d0 + (((hi >> shift) & 7) ^ 4) - 4
+        base[0, :, i] = np.where(diffbit, (d0 << 3) | (d0 >> 2), i0 * 17)
+        base[1, :, i] = np.where(diffbit, (d1 << 3) | (d1 >> 2), i1 * 17)
+    mods = np.array(ETC1_MODIFIERS, np.int64)
+    blocks = np.zeros((len(hi), 4, 4, 3), np.int64)
+    for x in range(4):
+        for y in range(4):
+            i = x * 4 + y
+            sel = (((lo >> (16 + i)) & 1) << 1) | ((lo >> i) & 1)
+            sub = np.where(flip, y >= 2, x >= 2).astype(np.int64)
+            table = np.where(sub, tables[1], tables[0])
+            b = base[sub, np.arange(len(hi))]
+            blocks[:, y, x] = b + mods[table, sel][:, None]
+    blocks = np.clip(blocks, 0, 255).astype(np.uint8)
+    img = blocks.reshape(bh, bw, 4, 4, 3).swapaxes(1, 2)
+    return img.reshape(bh * 4, bw * 4, 3)[:h, :w].tobytes()
+
+
+def _downsample(img):
+    """Halves image (h, w, 3) with a box filter"""
+    np = numpy
+    h, w = img.shape[:2]
+    img = img.astype(np.uint16)
+    if h > 1:
+        img = img[:h // 2 * 2]
+        img = (img[0::2] + img[1::2] + 1) // 2
+    if w > 1:
+        img = img[:, :w // 2 * 2]
+        img = (img[:, 0::2] + img[:, 1::2] + 1) // 2
+    return img.astype(np.uint8)
+
+
+def convert(src, dst, mipmaps=True):
+    """Converts PNG (or any image stbi loads) `src` to ETC1 KTX file `dst`,
+    with a full mip chain if `mipmaps`. Requires NumPy and stbi."""
+    if numpy is None:
+        raise ValueError('ETC1 encoding requires NumPy')
+    import stbi
+    w, h, comp, data = stbi.load(src, 3)
+    img = numpy.frombuffer(data, numpy.uint8).reshape(h, w, 3)
+    levels = [encode_etc1(w, h, data)]
+    lw, lh = w, h
+    while mipmaps and (lw > 1 or lh > 1):
+        img = _downsample(img)
+        lh, lw = img.shape[:2]
+        levels.append(encode_etc1(lw, lh, img.tobytes()))
+    tmp = dst + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f, w, h, GL_ETC1_RGB8_OES, levels)
+    os.replace(tmp, dst)
+
+
+def cached(src, dst=None, mipmaps=True):
+    """Returns path of the ETC1 KTX file of image `src` (default: `src`
+    with a .ktx extension), converting it if it is missing or older than
+    `src`"""
+    if dst is None:
+        dst = os.path.splitext(src)[0] + '.ktx'
+    try:
+        stale = os.stat(dst).st_mtime_ns < os.stat(src).st_mtime_ns
+    except FileNotFoundError:
+        stale = True
+    if stale:
+        convert(src, dst, mipmaps)
+    return dst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ngk.ktx',
+                                     description='Converts images to ETC1 '
+                                     'KTX files')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='convert even if the KTX file is up to date')
+    parser.add_argument('--no-mipmaps', action='store_true',
+                        help='only write level 0')
+    parser.add_argument('images', nargs='+', help='source images')
+    args = parser.parse_args(argv)
+    for src in args.images:
+        if args.force:
+            dst = os.path.splitext(src)[0] + '.ktx'
+            convert(src, dst, not args.no_mipmaps)
+        else:
+            dst = cached(src, mipmaps=not args.no_mipmaps)
+        print('{0} -> {1}'.format(src, dst))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
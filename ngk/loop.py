@@ -0,0 +1,114 @@
+"""Main loop runner with frame pacing"""
+import time
+
+
+class FrameStats:
+    """Frame statistics collected by `run`"""
+
+    def __init__(self):
+        #: Number of frames run
+        self.frames = 0
+        #: Number of frames which finished after their deadline
+        self.missed = 0
+        #: Number of low priority behaviors deferred due to the update budget
+        self.deferred = 0
+        #: Longest frame time (seconds)
+        self.max_frame_time = 0.0
+        #: Sum of all frame times (seconds)
+        self.total_frame_time = 0.0
+        #: Return value of the root behavior
+        self.result = None
+
+    @property
+    def avg_frame_time(self):
+        return self.total_frame_time / self.frames if self.frames else 0.0
+
+    @property
+    def missed_ratio(self):
+        return self.missed / self.frames if self.frames else 0.0
+
+    def __repr__(self):
+        return ('FrameStats(frames={0}, missed={1}, deferred={2}, '
+                'avg={3:.2f}ms, max={4:.2f}ms)'.format(
+                    self.frames, self.missed, self.deferred,
+                    self.avg_frame_time * 1000, self.max_frame_time * 1000))
+
+
+def sleep_until(deadline, clock=time.monotonic, sleep=time.sleep,
+                slack=0.002):
+    """Sleeps until `deadline`.
+
+    The OS sleep is woken up `slack` seconds early and the remainder is spent
+    spinning (with sleep(0), yielding the CPU), since `sleep` usually
+    overshoots by a scheduler tick."""
+    remaining = deadline - clock()
+    if remaining > slack:
+        sleep(remaining - slack)
+    while clock() < deadline:
+        sleep(0)
+
+
+def run(win, root, rate=1.0/60, swap_interval=1, budget=None, background=(),
+        stats=None, clock=time.monotonic, sleep=time.sleep):
+    """Runs behavior `root` on `win` until it returns or the window quits.
+
+    `root` is stepped once per frame between `win.before_step()` and
+    `win.after_step()`, with frames paced at `rate` seconds.
+
+    `background` behaviors are low priority: after `root` has been stepped,
+    they are stepped round-robin only while the frame has spent less than
+    `budget` seconds (defaults to half of `rate`) on updates. Behaviors which
+    do not fit are deferred to the next frame. Finished background behaviors
+    are dropped.
+
+    Returns the FrameStats of the run. The return value of `root` is stored
+    in its `result` attribute."""
+    if stats is None:
+        stats = FrameStats()
+    if budget is None:
+        budget = rate / 2
+    if swap_interval is not None:
+        win.swap_interval = swap_interval
+    background = list(background)
+    # Next background behavior to step
+    bg_i = 0
+    deadline = clock() + rate
+    while not win.quit:
+        frame_start = clock()
+        win.before_step()
+        try:
+            next(root)
+        except StopIteration as e:
+            stats.result = e.value
+            win.after_step()
+            break
+        # Step low priority behaviors within the remaining budget
+        num_bg = len(background)
+        for i in range(num_bg):
+            if clock() - frame_start >= budget:
+                stats.deferred += num_bg - i
+                break
+            bg_i %= len(background)
+            try:
+                next(background[bg_i])
+                bg_i += 1
+            except StopIteration:
+                del background[bg_i]
+                if not background:
+                    break
+        win.after_step()
+        # Frame pacing
+        now = clock()
+        frame_time = now - frame_start
+        stats.frames += 1
+        stats.total_frame_time += frame_time
+        if frame_time > stats.max_frame_time:
+            stats.max_frame_time = frame_time
+        if now > deadline:
+            # Missed the deadline, resync instead of trying to catch up
+            stats.missed += 1
+            deadline = now + rate
+        else:
+            sleep_until(deadline, clock, sleep)
+            deadline += rate
+    return stats
@@ -1,4 +1,5 @@
 import array
+import math
 
 
 def create():
@@ -18,7 +19,7 @@ def identity(out):
 
 
 def invert(out, a):
-    """Invert a mat4"""
+    """Invert a mat4. Returns `out`, or None if `a` is not invertible."""
     (a00, a01, a02, a03, a10, a11, a12, a13, a20, a21, a22, a23, a30, a31,
      a32, a33) = a
     b00 = a00 * a11 - a01 * a10
@@ -53,6 +54,7 @@ def invert(out, a):
     out[13] = (a00 * b09 - a01 * b07 + a02 * b06) * det
     out[14] = (a31 * b01 - a30 * b03 - a32 * b00) * det
     out[15] = (a20 * b03 - a21 * b01 + a22 * b00) * det
+    return out
 
 
 def multiply(out, a, b):
@@ -143,3 +145,145 @@ def ortho(out, left, right, bottom, top, near, far):
     out[13] = (top + bottom) * bt
     out[14] = (far + near) * nf
     out[15] = 1
+
+
+def perspective(out, fovy, aspect, near, far):
+    """Returns perspective projection matrix with vertical field of view
+    `fovy` (radians)"""
+    f = 1.0 / math.tan(fovy / 2)
+    nf = 1 / (near - far)
+    out[0] = f / aspect
+    out[1] = 0
+    out[2] = 0
+    out[3] = 0
+    out[4] = 0
+    out[5] = f
+    out[6] = 0
+    out[7] = 0
+    out[8] = 0
+    out[9] = 0
+    out[10] = (far + near) * nf
+    out[11] = -1
+    out[12] = 0
+    out[13] = 0
+    out[14] = 2 * far * near * nf
+    out[15] = 0
+
+
+def look_at(out, eye, center, up):
+    """Returns view matrix of eye at `eye` looking at `center`"""
+    eyex, eyey, eyez = eye
+    upx, upy, upz = up
+    centerx, centery, centerz = center
+    if abs(eyex - centerx) < 1e-6 and abs(eyey - centery) < 1e-6 and \
+            abs(eyez - centerz) < 1e-6:
+        identity(out)
+        return
+    z0 = eyex - centerx
+    z1 = eyey - centery
+    z2 = eyez - centerz
+    length = 1 / math.sqrt(z0*z0 + z1*z1 + z2*z2)
+    z0 *= length
+    z1 *= length
+    z2 *= length
+    x0 = upy * z2 - upz * z1
+    x1 = upz * z0 - upx * z2
+    x2 = upx * z1 - upy * z0
+    length = math.sqrt(x0*x0 + x1*x1 + x2*x2)
+    if length:
+        length = 1 / length
+        x0 *= length
+        x1 *= length
+        x2 *= length
+    y0 = z1 * x2 - z2 * x1
+    y1 = z2 * x0 - z0 * x2
+    y2 = z0 * x1 - z1 * x0
+    length = math.sqrt(y0*y0 + y1*y1 + y2*y2)
+    if length:
+        length = 1 / length
+        y0 *= length
+        y1 *= length
+        y2 *= length
+    out[0] = x0
+    out[1] = y0
+    out[2] = z0
+    out[3] = 0
+    out[4] = x1
+    out[5] = y1
+    out[6] = z1
+    out[7] = 0
+    out[8] = x2
+    out[9] = y2
+    out[10] = z2
+    out[11] = 0
+    out[12] = -(x0 * eyex + x1 * eyey + x2 * eyez)
+    out[13] = -(y0 * eyex + y1 * eyey + y2 * eyez)
+    out[14] = -(z0 * eyex + z1 * eyey + z2 * eyez)
+    out[15] = 1
+
+
+def from_quat(out, q):
+    """Sets `out` to the rotation of quat `q`"""
+    x, y, z, w = q
+    x2 = x + x
+    y2 = y + y
+    z2 = z + z
+    xx = x * x2
+    yx = y * x2
+    yy = y * y2
+    zx = z * x2
+    zy = z * y2
+    zz = z * z2
+    wx = w * x2
+    wy = w * y2
+    wz = w * z2
+    out[0] = 1 - yy - zz
+    out[1] = yx + wz
+    out[2] = zx - wy
+    out[3] = 0
+    out[4] = yx - wz
+    out[5] = 1 - xx - zz
+    out[6] = zy + wx
+    out[7] = 0
+    out[8] = zx + wy
+    out[9] = zy - wx
+    out[10] = 1 - xx - yy
+    out[11] = 0
+    out[12] = 0
+    out[13] = 0
+    out[14] = 0
+    out[15] = 1
+
+
+def from_rotation_translation_scale(out, q, v, s):
+    """Sets `out` to translate(v) * rotate(q) * scale(s)"""
+    x, y, z, w = q
+    sx, sy, sz = s
+    x2 = x + x
+    y2 = y + y
+    z2 = z + z
+    xx = x * x2
+    xy = x * y2
+    xz = x * z2
+    yy = y * y2
+    yz = y * z2
+    zz = z * z2
+    wx = w * x2
+    wy = w * y2
+    wz = w * z2
+    out[0] = (1 - (yy + zz)) * sx
+    out[1] = (xy + wz) * sx
+    out[2] = (xz - wy) * sx
+    out[3] = 0
+    out[4] = (xy - wz) * sy
+    out[5] = (1 - (xx + zz)) * sy
+    out[6] = (yz + wx) * sy
+    out[7] = 0
+    out[8] = (xz + wy) * sz
+    out[9] = (yz - wx) * sz
+    out[10] = (1 - (xx + yy)) * sz
+    out[11] = 0
+    out[12] = v[0]
+    out[13] = v[1]
+    out[14] = v[2]
+    out[15] = 1
@@ -0,0 +1,236 @@
+"""Mesh optimization: vertex welding, 16-bit index chunking and triangle
+reordering for the post-transform vertex cache.
+
+index_geom() turns a Tri3Geom (or a triangle Geom) into indexed Geoms::
+
+    geoms = mesh.index_geom(tri3geom)
+    for geom in geoms:
+        geom.draw(win, prog)
+"""
+import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Max number of verts addressable with 16-bit indices
+MAX_VERTS = 65535
+
+
+def weld(vertdata, num_floats=8, elemdata=None):
+    """Merges bitwise identical verts of `vertdata` (`num_floats` floats
+    per vert), drawn in `elemdata` order (default: all verts in order).
+    Verts are kept in order of first use and unused verts are dropped.
+    Returns (vertdata, elemdata) as array('f') and array('I')."""
+    nf = num_floats
+    if numpy is not None:
+        np = numpy
+        v = np.frombuffer(vertdata, np.float32).reshape(-1, nf)
+        if elemdata is not None:
+            e = np.frombuffer(elemdata, np.dtype('u{0}'.format(
+                memoryview(elemdata).itemsize)))
+            v = v[e]
+        if not len(v):
+            return array.array('f'), array.array('I')
+        keys = np.ascontiguousarray(v).view(
+            np.dtype((np.void, nf * 4))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True,
+                                      return_inverse=True)
+        # Number unique verts by first use
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return (array.array('f', v[first[order]].tobytes()),
+                array.array('I', rank[inverse.ravel()].astype(np.uint32)
+                            .tobytes()))
+    view = memoryview(vertdata).cast('B')
+    stride = nf * 4
+    if elemdata is None:
+        elemdata = range(len(view) // stride)
+    remap = {}
+    out = bytearray()
+    elems = array.array('I')
+    for i in elemdata:
+        key = bytes(view[i * stride:(i + 1) * stride])
+        j = remap.get(key)
+        if j is None:
+            j = remap[key] = len(remap)
+            out += key
+        elems.append(j)
+    return array.array('f', bytes(out)), elems
+
+
+def remove_degenerate(elemdata):
+    """Returns array('I') of the triangles of `elemdata` which do not
+    repeat a vert"""
+    e = elemdata
+    return array.array('I', [x for i in range(0, len(e) - 2, 3)
+                             if e[i] != e[i + 1] and e[i] != e[i + 2] and
+                             e[i + 1] != e[i + 2]
+                             for x in (e[i], e[i + 1], e[i + 2])])
+
+
+# Vertex cache optimization (Tom Forsyth, "Linear-Speed Vertex Cache
+# Optimisation")
+
+_CACHE_DECAY_POWER = 1.5
+_LAST_TRI_SCORE = 0.75
+_VALENCE_BOOST_SCALE = 2.0
+_VALENCE_BOOST_POWER = 0.5
+
+
+def _score_tables(cache_size, max_valence=32):
+    cache = [_LAST_TRI_SCORE] * 3 + [
+        (1.0 - (i - 3) / (cache_size - 3)) ** _CACHE_DECAY_POWER
+        for i in range(3, cache_size)]
+    valence = [0.0] + [_VALENCE_BOOST_SCALE * i ** -_VALENCE_BOOST_POWER
+                       for i in range(1, max_valence)]
+    return cache, valence
+
+
+def optimize_vertex_cache(elemdata, num_verts=None, cache_size=32):
+    """Returns array('I') of the triangles of `elemdata` reordered so that
+    consecutive triangles reuse verts, for a post-transform vertex cache
+    of about `cache_size` entries"""
+    num_tris = len(elemdata) // 3
+    if num_verts is None:
+        num_verts = max(elemdata) + 1 if num_tris else 0
+    cache_scores, valence_scores = _score_tables(cache_size)
+    max_valence = len(valence_scores)
+    # Triangles of each vert which were not added yet
+    vert_tris = [[] for i in range(num_verts)]
+    for t in range(num_tris):
+        for v in elemdata[3 * t:3 * t + 3]:
+            vert_tris[v].append(t)
+    cache_pos = [-1] * num_verts
+
+    def score(v):
+        n = len(vert_tris[v])
+        if not n:
+            return -1.0
+        p = cache_pos[v]
+        s = cache_scores[p] if p >= 0 else 0.0
+        return s + (valence_scores[n] if n < max_valence
+                    else _VALENCE_BOOST_SCALE * n ** -_VALENCE_BOOST_POWER)
+    vert_score = [score(v) for v in range(num_verts)]
+    tri_score = [sum(vert_score[v] for v in elemdata[3 * t:3 * t + 3])
+                 for t in range(num_tris)]
+    added = [False] * num_tris
+    out = array.array('I')
+    cache = []
+    best = 0 if num_tris else -1
+    next_unadded = 0
+    while best >= 0:
+        tri = elemdata[3 * best:3 * best + 3]
+        out.extend(tri)
+        added[best] = True
+        for v in tri:
+            vert_tris[v].remove(best)
+        # Move the tri's verts to the front of the cache
+        new_cache = list(tri) + [v for v in cache if v not in tri]
+        for v in new_cache[cache_size:]:
+            cache_pos[v] = -1
+        cache = new_cache[:cache_size]
+        for i, v in enumerate(cache):
+            cache_pos[v] = i
+        # Rescore the verts of the cache (and those pushed out)
+        for v in new_cache:
+            s = score(v)
+            d = s - vert_score[v]
+            if d:
+                vert_score[v] = s
+                for t in vert_tris[v]:
+                    tri_score[t] += d
+        # Best tri using a cached vert
+        best = -1
+        best_score = -1.0
+        for v in cache:
+            for t in vert_tris[v]:
+                if tri_score[t] > best_score:
+                    best = t
+                    best_score = tri_score[t]
+        if best < 0:
+            while next_unadded < num_tris and added[next_unadded]:
+                next_unadded += 1
+            if next_unadded < num_tris:
+                best = next_unadded
+    return out
+
+
+def acmr(elemdata, cache_size=16):
+    """Returns average cache miss ratio (transformed verts per triangle)
+    of drawing `elemdata` with a FIFO vertex cache of `cache_size`"""
+    num_tris = len(elemdata) // 3
+    if not num_tris:
+        return 0.0
+    cache = []
+    misses = 0
+    for v in elemdata:
+        if v not in cache:
+            misses += 1
+            cache.append(v)
+            if len(cache) > cache_size:
+                del cache[0]
+    return misses / num_tris
+
+
+def chunk(vertdata, elemdata, num_floats=8, max_verts=MAX_VERTS):
+    """Splits mesh into chunks of at most `max_verts` verts, keeping the
+    triangle order. Returns list of (vertdata, elemdata) as array('f') and
+    array('H')."""
+    nf = num_floats
+    out = []
+    remap = {}
+    verts = array.array('f')
+    elems = array.array('H')
+    for i in range(0, len(elemdata) - 2, 3):
+        tri = elemdata[i:i + 3]
+        if len(remap) + sum(v not in remap for v in tri) > max_verts:
+            out.append((verts, elems))
+            remap = {}
+            verts = array.array('f')
+            elems = array.array('H')
+        for v in tri:
+            j = remap.get(v)
+            if j is None:
+                j = remap[v] = len(remap)
+                verts.extend(vertdata[v * nf:(v + 1) * nf])
+            elems.append(j)
+    if elems:
+        out.append((verts, elems))
+    return out
+
+
+def index(vertdata, num_floats=8, elemdata=None, reorder=True,
+          cache_size=32, max_verts=MAX_VERTS):
+    """Welds triangle mesh `vertdata` (drawn in `elemdata` order if not
+    None), drops degenerate triangles, optionally reorders triangles for
+    the vertex cache and splits it into chunks of at most `max_verts`
+    verts. Returns list of (vertdata, elemdata) as array('f') and
+    array('H')."""
+    vertdata, elemdata = weld(vertdata, num_floats, elemdata)
+    elemdata = remove_degenerate(elemdata)
+    if reorder:
+        elemdata = optimize_vertex_cache(elemdata,
+                                         len(vertdata) // num_floats,
+                                         cache_size)
+    return chunk(vertdata, elemdata, num_floats, max_verts)
+
+
+def index_geom(geom, reorder=True, cache_size=32):
+    """Returns list of indexed vid.Geoms drawing triangle Geom (or
+    Tri3Geom) `geom`"""
+    from . import vid
+    if geom.prim != vid.GL_TRIANGLES:
+        raise ValueError('geom must draw GL_TRIANGLES')
+    strides = set(x.stride for x in geom.vertptrs.values())
+    if len(strides) != 1:
+        raise ValueError('strides do not match')
+    stride = strides.pop()
+    if stride % 4:
+        raise ValueError('stride is not a multiple of 4')
+    elemdata = getattr(geom, 'elemdata', None)
+    return [vid.Geom(vid.GL_TRIANGLES, verts, dict(geom.vertptrs), elems)
+            for verts, elems in index(geom.vertdata, stride // 4, elemdata,
+                                      reorder, cache_size)]
@@ -0,0 +1,250 @@
+"""Wavefront OBJ importer.
+
+load() parses an OBJ file into a Geom in Tri3Geom vertex layout
+(position, normal, UV). Polygons are triangulated as fans and corners
+sharing the same position/UV/normal indices are welded into one vert,
+drawn through 16-bit `elemdata`. Meshes with more than 65535 unique
+verts are returned as a non-indexed Tri3Geom instead.
+
+The parsed mesh is cached in a binary file next to the source (see
+cache_path()), so later loads read two buffers instead of parsing."""
+import array
+import hashlib
+import itertools
+import os
+import struct
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Floats per vert: position, normal, UV (Tri3Geom layout)
+NUM_FLOATS = 8
+
+#: Max number of verts of an indexed mesh
+MAX_INDEXED_VERTS = 65535
+
+_MAGIC = b'NGKO'
+_VERSION = 1
+
+#: magic, version, source mtime, source size, source SHA-1, number of
+#: floats, number of elems, elem itemsize
+_HEADER = struct.Struct('<4sIqQ20sQQI')
+
+
+def _floats(lines, first, count):
+    """Returns array('f') of floats `first` to `first + count` (token
+    indices) of each line"""
+    return array.array('f', map(float, itertools.chain.from_iterable(
+        line.split()[first:first + count] for line in lines)))
+
+
+def _resolve(i, count):
+    """Returns 0-based index of OBJ index `i` (1-based, or negative
+    relative to `count`), or -1 if missing"""
+    if not i:
+        return -1
+    i = int(i)
+    if i < 0:
+        i += count
+    else:
+        i -= 1
+    if not 0 <= i < count:
+        raise ValueError('OBJ index out of range')
+    return i
+
+
+def parse(text):
+    """Parses OBJ `text`. Returns (vertdata, elemdata): array('f') with
+    NUM_FLOATS floats per unique vert and array('I') of 3 vert indices per
+    triangle. V coordinates are flipped, so UV (0, 0) is the top left of
+    the (top-down) texture. Verts without a normal get (0, 0, 0)."""
+    vlines = []
+    vtlines = []
+    vnlines = []
+    #: Mapping from face token or (position, UV, normal) indices -> vert
+    #: index
+    remap = {}
+    #: (position, UV, normal) indices of each vert
+    keys = []
+    elems = array.array('I')
+    for line in text.splitlines():
+        if line.startswith('v '):
+            vlines.append(line)
+        elif line.startswith('vt '):
+            vtlines.append(line)
+        elif line.startswith('vn '):
+            vnlines.append(line)
+        elif line.startswith('f '):
+            idx = []
+            for tok in line.split()[1:]:
+                i = remap.get(tok)
+                if i is None:
+                    parts = tok.split('/')
+                    key = (_resolve(parts[0], len(vlines)),
+                           _resolve(parts[1] if len(parts) > 1 else None,
+                                    len(vtlines)),
+                           _resolve(parts[2] if len(parts) > 2 else None,
+                                    len(vnlines)))
+                    if key[0] < 0:
+                        raise ValueError('Face without position')
+                    i = remap.get(key)
+                    if i is None:
+                        i = remap[key] = len(keys)
+                        keys.append(key)
+                    if '-' not in tok:
+                        # Relative indices depend on the line, so only
+                        # absolute tokens are cached
+                        remap[tok] = i
+                idx.append(i)
+            if len(idx) < 3:
+                raise ValueError('Face with less than 3 verts')
+            # Triangulate as a fan
+            a = idx[0]
+            for k in range(1, len(idx) - 1):
+                elems.extend((a, idx[k], idx[k + 1]))
+    positions = _floats(vlines, 1, 3)
+    uvs = _floats(vtlines, 1, 2)
+    normals = _floats(vnlines, 1, 3)
+    if len(positions) != 3 * len(vlines) or len(uvs) != 2 * len(vtlines) \
+            or len(normals) != 3 * len(vnlines):
+        raise ValueError('Vertex with too few components')
+    return _build(keys, positions, uvs, normals), elems
+
+
+def _build(keys, positions, uvs, normals):
+    """Returns vertdata of verts `keys`"""
+    n = len(keys)
+    if numpy is not None and n:
+        np = numpy
+        k = np.array(keys, np.int64).reshape(n, 3)
+        out = np.zeros((n, NUM_FLOATS), np.float32)
+        out[:, 0:3] = np.frombuffer(positions, np.float32).reshape(-1, 3)[
+            k[:, 0]]
+        has = k[:, 2] >= 0
+        if has.any():
+            out[has, 3:6] = np.frombuffer(normals, np.float32).reshape(
+                -1, 3)[k[has, 2]]
+        has = k[:, 1] >= 0
+        if has.any():
+            out[has, 6:8] = np.frombuffer(uvs, np.float32).reshape(-1, 2)[
+                k[has, 1]]
+            out[has, 7] = 1.0 - out[has, 7]
+        return array.array('f', out.tobytes())
+    out = array.array('f', bytes(4 * NUM_FLOATS * n))
+    for i, (p, t, nm) in enumerate(keys):
+        o = i * NUM_FLOATS
+        out[o:o + 3] = positions[3 * p:3 * p + 3]
+        if nm >= 0:
+            out[o + 3:o + 6] = normals[3 * nm:3 * nm + 3]
+        if t >= 0:
+            out[o + 6] = uvs[2 * t]
+            out[o + 7] = 1.0 - uvs[2 * t + 1]
+    return out
+
+
+def unindex(vertdata, elemdata, num_floats=NUM_FLOATS):
+    """Returns array('f') of the verts of `vertdata` in `elemdata` order"""
+    if numpy is not None:
+        np = numpy
+        v = np.frombuffer(vertdata, np.float32).reshape(-1, num_floats)
+        e = np.frombuffer(elemdata, np.dtype('u{0}'.format(
+            memoryview(elemdata).itemsize)))
+        return array.array('f', v[e].tobytes())
+    out = array.array('f')
+    for i in elemdata:
+        out.extend(vertdata[i * num_floats:(i + 1) * num_floats])
+    return out
+
+
+def cache_path(path):
+    """Returns path of the binary cache of OBJ file `path`"""
+    return path + '.cache'
+
+
+def _read_cache(path, st):
+    """Returns (vertdata, elemdata) from the cache of `path` if it is of
+    the source with stat `st`, else None"""
+    try:
+        f = open(cache_path(path), 'rb')
+    except OSError:
+        return None
+    with f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            return None
+        (magic, version, mtime, size, digest, num_floats, num_elems,
+         itemsize) = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION or size != st.st_size:
+            return None
+        if mtime != st.st_mtime_ns:
+            # Touched or checked out again: compare contents
+            with open(path, 'rb') as src:
+                source = src.read()
+            if hashlib.sha1(source).digest() != digest:
+                return None
+        vertdata = array.array('f')
+        elemdata = array.array('H' if itemsize == 2 else 'I')
+        try:
+            vertdata.fromfile(f, num_floats)
+            elemdata.fromfile(f, num_elems)
+        except EOFError:
+            return None
+    return vertdata, elemdata
+
+
+def _write_cache(path, st, source, vertdata, elemdata):
+    tmp = cache_path(path) + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, st.st_mtime_ns,
+                                 st.st_size, hashlib.sha1(source).digest(),
+                                 len(vertdata), len(elemdata),
+                                 elemdata.itemsize))
+            vertdata.tofile(f)
+            elemdata.tofile(f)
+        os.replace(tmp, cache_path(path))
+    except OSError:
+        # The cache is optional (e.g. read-only directory)
+        pass
+
+
+def load_arrays(path, cache=True):
+    """Returns (vertdata, elemdata) of OBJ file `path`. Meshes with more
+    than MAX_INDEXED_VERTS verts are unindexed (elemdata is empty),
+    otherwise elemdata is array('H')."""
+    st = os.stat(path)
+    if cache:
+        out = _read_cache(path, st)
+        if out is not None:
+            return out
+    with open(path, 'rb') as f:
+        source = f.read()
+    vertdata, elemdata = parse(source.decode('utf-8', 'replace'))
+    if len(vertdata) // NUM_FLOATS > MAX_INDEXED_VERTS:
+        vertdata = unindex(vertdata, elemdata)
+        elemdata = array.array('H')
+    else:
+        elemdata = array.array('H', elemdata)
+    if cache:
+        _write_cache(path, st, source, vertdata, elemdata)
+    return vertdata, elemdata
+
+
+def load(path, cache=True, aPos='aPos', aUV='aUV', aNorm='aNorm'):
+    """Returns vid.Geom (indexed) or vid.Tri3Geom (more than
+    MAX_INDEXED_VERTS verts) of OBJ file `path`"""
+    from . import vid
+    vertdata, elemdata = load_arrays(path, cache)
+    if not elemdata:
+        geom = vid.Tri3Geom(NUM_FLOATS, aPos, aUV, aNorm)
+        geom.vertdata = vertdata
+        return geom
+    stride = NUM_FLOATS * vertdata.itemsize
+    vertptrs = {
+        aPos: vid.VertAttrPtr(3, vid.GL_FLOAT, vid.GL_FALSE, stride, 0),
+        aNorm: vid.VertAttrPtr(3, vid.GL_FLOAT, vid.GL_FALSE, stride, 12),
+        aUV: vid.VertAttrPtr(2, vid.GL_FLOAT, vid.GL_FALSE, stride, 24),
+    }
+    return vid.Geom(vid.GL_TRIANGLES, vertdata, vertptrs, elemdata)
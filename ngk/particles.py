@@ -0,0 +1,186 @@
+"""Particle system drawn as a Quad2Geom"""
+import array
+import itertools
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Particle state fields, each stored in its own packed array
+FIELDS = ('x', 'y', 'vx', 'vy', 'life', 'size', 'r', 'g', 'b', 'a')
+
+
+#: Number of floats per vertex: aPos (2), aUV (2), aColor (4)
+NUM_FLOATS = 8
+
+
+def _repeat(v, n):
+    """Returns `v` if it is a sequence, otherwise `n` copies of it"""
+    if isinstance(v, (int, float)):
+        return itertools.repeat(v, n)
+    return v
+
+
+class ParticleSystem:
+    """Fixed capacity particle system with structure-of-arrays state.
+
+    Live particles are always packed at the front of the arrays: dead
+    particles are swapped with the last live particle. Each particle is
+    drawn as a quad of `size` centered on its position with an aColor
+    vertex attribute."""
+
+    def __init__(self, capacity, aPos='aPos', aUV='aUV', aColor='aColor'):
+        #: Maximum number of particles
+        self.capacity = int(capacity)
+        #: Number of live particles
+        self.count = 0
+        #: State arrays
+        for name in FIELDS:
+            setattr(self, name, array.array('f', bytes(4 * self.capacity)))
+        #: Vertex data of all quads, reused every frame
+        self.vertdata = array.array('f', bytes(4 * 4 * NUM_FLOATS *
+                                               self.capacity))
+        #: Vertex attr names
+        self.__attr_names = (aPos, aUV, aColor)
+        self.__geom = None
+
+    @property
+    def geom(self):
+        """Quad2Geom drawing the particles"""
+        if self.__geom is None:
+            from . import vid
+            aPos, aUV, aColor = self.__attr_names
+            geom = vid.Quad2Geom(NUM_FLOATS, aPos, aUV)
+            stride = NUM_FLOATS * self.vertdata.itemsize
+            geom.vertptrs[aColor] = vid.VertAttrPtr(
+                4, vid.GL_FLOAT, vid.GL_FALSE, stride,
+                4 * self.vertdata.itemsize)
+            self.__geom = geom
+        return self.__geom
+
+    def emit(self, n, x, y, vx=0.0, vy=0.0, life=1.0, size=1.0,
+             color=(1.0, 1.0, 1.0, 1.0)):
+        """Emits `n` particles.
+
+        Every argument except `color` is either a number shared by all new
+        particles or a sequence with one value per particle. Particles which
+        do not fit are dropped. Returns number of particles emitted."""
+        start = self.count
+        n = min(int(n), self.capacity - start)
+        if n <= 0:
+            return 0
+        end = start + n
+        values = (x, y, vx, vy, life, size) + tuple(color)
+        for name, v in zip(FIELDS, values):
+            dst = getattr(self, name)
+            if numpy is not None:
+                if not isinstance(v, (int, float)):
+                    v = numpy.asarray(v, numpy.float32)[:n]
+                numpy.frombuffer(dst, numpy.float32)[start:end] = v
+            else:
+                dst[start:end] = array.array('f', itertools.islice(
+                    _repeat(v, n), n))
+        self.count = end
+        return n
+
+    def step(self, dt, ax=0.0, ay=0.0):
+        """Integrates particles by `dt` seconds with acceleration (ax, ay),
+        ages them and kills particles whose life ran out"""
+        n = self.count
+        if not n:
+            return
+        if numpy is not None:
+            return self.__step_numpy(dt, ax, ay)
+        x, y, vx, vy, life = self.x, self.y, self.vx, self.vy, self.life
+        dvx = ax * dt
+        dvy = ay * dt
+        for i in range(n):
+            vx[i] += dvx
+            vy[i] += dvy
+            x[i] += vx[i] * dt
+            y[i] += vy[i] * dt
+            life[i] -= dt
+        # Swap-remove dead particles
+        i = 0
+        while i < n:
+            if life[i] > 0:
+                i += 1
+                continue
+            n -= 1
+            for name in FIELDS:
+                a = getattr(self, name)
+                a[i] = a[n]
+        self.count = n
+
+    def __step_numpy(self, dt, ax, ay):
+        np = numpy
+        n = self.count
+        f = {name: np.frombuffer(getattr(self, name), np.float32)[:n]
+             for name in FIELDS}
+        vx, vy = f['vx'], f['vy']
+        if ax:
+            vx += ax * dt
+        if ay:
+            vy += ay * dt
+        f['x'] += vx * dt
+        f['y'] += vy * dt
+        life = f['life']
+        life -= dt
+        alive = life > 0
+        k = int(np.count_nonzero(alive))
+        if k < n:
+            # Move live particles from the tail into the holes at the front
+            holes = np.flatnonzero(~alive[:k])
+            movers = np.flatnonzero(alive[k:]) + k
+            for a in f.values():
+                a[holes] = a[movers]
+            self.count = k
+
+    def write_vertdata(self):
+        """Writes quads of live particles into `vertdata`.
+
+        Returns memoryview of the written part."""
+        n = self.count
+        vertdata = self.vertdata
+        nf = NUM_FLOATS
+        if numpy is not None:
+            np = numpy
+            v = np.frombuffer(vertdata, np.float32)[:n * 4 * nf]
+            v = v.reshape(n, 4, nf)
+            f = {name: np.frombuffer(getattr(self, name), np.float32)[:n]
+                 for name in FIELDS}
+            half = f['size'] * 0.5
+            x0 = f['x'] - half
+            x1 = f['x'] + half
+            y0 = f['y'] - half
+            y1 = f['y'] + half
+            # A: bottom left, B: bottom right, C: top right, D: top left
+            v[:, 0, 0] = v[:, 3, 0] = x0
+            v[:, 1, 0] = v[:, 2, 0] = x1
+            v[:, 0, 1] = v[:, 1, 1] = y0
+            v[:, 2, 1] = v[:, 3, 1] = y1
+            v[:, :, 2:4] = ((0, 1), (1, 1), (1, 0), (0, 0))
+            for j, name in enumerate(('r', 'g', 'b', 'a')):
+                v[:, :, 4 + j] = f[name][:, None]
+        else:
+            x, y, size = self.x, self.y, self.size
+            r, g, b, a = self.r, self.g, self.b, self.a
+            for i in range(n):
+                half = size[i] * 0.5
+                x0 = x[i] - half
+                x1 = x[i] + half
+                y0 = y[i] - half
+                y1 = y[i] + half
+                c = r[i], g[i], b[i], a[i]
+                I = i * 4 * nf
+                vertdata[I:I + 4 * nf] = array.array(
+                    'f', (x0, y0, 0, 1) + c + (x1, y0, 1, 1) + c +
+                    (x1, y1, 1, 0) + c + (x0, y1, 0, 0) + c)
+        return memoryview(vertdata)[:n * 4 * nf]
+
+    def draw(self, win, prog):
+        """Uploads quads of live particles and draws them"""
+        geom = self.geom
+        geom.vertdata = self.write_vertdata()
+        geom.draw(win, prog)
@@ -1,4 +1,5 @@
 import math
+from . import vec3
 
 
 def create(x=0, y=0, z=0, w=1):
@@ -107,10 +108,94 @@ def set_axis_angle(out, axis, rad):
     out[3] = math.cos(rad)
 
 
+def dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2] + a[3]*b[3]
+
+
+def lerp(out, a, b, t):
+    ax, ay, az, aw = a
+    out[0] = ax + t * (b[0] - ax)
+    out[1] = ay + t * (b[1] - ay)
+    out[2] = az + t * (b[2] - az)
+    out[3] = aw + t * (b[3] - aw)
+
+
+def slerp(out, a, b, t):
+    """Spherical linear interpolation from `a` to `b` along the shortest
+    arc"""
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    cosom = ax * bx + ay * by + az * bz + aw * bw
+    if cosom < 0:
+        cosom = -cosom
+        bx, by, bz, bw = -bx, -by, -bz, -bw
+    if 1.0 - cosom > 1e-6:
+        omega = math.acos(cosom)
+        sinom = math.sin(omega)
+        scale0 = math.sin((1.0 - t) * omega) / sinom
+        scale1 = math.sin(t * omega) / sinom
+    else:
+        # Quats are very close, linear interpolation is good enough
+        scale0 = 1.0 - t
+        scale1 = t
+    out[0] = scale0 * ax + scale1 * bx
+    out[1] = scale0 * ay + scale1 * by
+    out[2] = scale0 * az + scale1 * bz
+    out[3] = scale0 * aw + scale1 * bw
+
+
+def from_mat3(out, m):
+    """Sets `out` to the rotation of mat3 `m`"""
+    trace = m[0] + m[4] + m[8]
+    if trace > 0:
+        root = math.sqrt(trace + 1.0)  # 2w
+        out[3] = 0.5 * root
+        root = 0.5 / root  # 1/(4w)
+        out[0] = (m[5] - m[7]) * root
+        out[1] = (m[6] - m[2]) * root
+        out[2] = (m[1] - m[3]) * root
+    else:
+        i = 0
+        if m[4] > m[0]:
+            i = 1
+        if m[8] > m[i * 3 + i]:
+            i = 2
+        j = (i + 1) % 3
+        k = (i + 2) % 3
+        root = math.sqrt(m[i * 3 + i] - m[j * 3 + j] - m[k * 3 + k] + 1.0)
+        out[i] = 0.5 * root
+        root = 0.5 / root
+        out[3] = (m[j * 3 + k] - m[k * 3 + j]) * root
+        out[j] = (m[j * 3 + i] + m[i * 3 + j]) * root
+        out[k] = (m[k * 3 + i] + m[i * 3 + k]) * root
+
+
 def set_rotation_to(out, a, b):
-    """Sets `out` to shortest rotation from `a` to `b`."""
-    pass
+    """Sets `out` to shortest rotation from `a` to `b`.
+
+    `a` and `b` must be unit vec3s."""
+    d = vec3.dot(a, b)
+    if d < -0.999999:
+        # Opposite vectors, rotate by 180 degrees around any perpendicular
+        axis = vec3.create()
+        vec3.cross(axis, (1, 0, 0), a)
+        if vec3.length(axis) < 0.000001:
+            vec3.cross(axis, (0, 1, 0), a)
+        vec3.normalize(axis, axis)
+        set_axis_angle(out, axis, math.pi)
+    elif d > 0.999999:
+        identity(out)
+    else:
+        axis = vec3.create()
+        vec3.cross(axis, a, b)
+        out[0], out[1], out[2] = axis
+        out[3] = 1 + d
+        normalize(out, out)
 
 
 def set_axes(out, view, right, up):
-    pass
+    """Sets `out` to the rotation given by the view, right and up axes"""
+    from_mat3(out, (right[0], up[0], -view[0],
+                    right[1], up[1], -view[1],
+                    right[2], up[2], -view[2]))
+    normalize(out, out)
@@ -0,0 +1,253 @@
+"""Background recording of window frames to disk"""
+import os
+import queue
+import threading
+import time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RecordStats:
+    """Statistics of a recording session"""
+
+    def __init__(self):
+        #: Number of capture() calls
+        self.offered = 0
+        #: Number of frames read back and queued
+        self.captured = 0
+        #: Number of frames dropped because all buffers were in use
+        self.dropped = 0
+        #: Number of frames skipped by decimation
+        self.skipped = 0
+        #: Number of frames written
+        self.written = 0
+        #: Number of bytes written
+        self.bytes_written = 0
+        #: Time spent in capture() on the calling thread (seconds)
+        self.capture_time = 0.0
+        #: Time spent encoding and writing on the worker (seconds)
+        self.encode_time = 0.0
+        #: Session start and end time
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.end_time if self.end_time is not None else time.monotonic()
+        return end - self.start_time
+
+    @property
+    def fps(self):
+        """Frames written per second of the session"""
+        return self.written / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def throughput(self):
+        """Bytes written per second of the session"""
+        return self.bytes_written / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return ('RecordStats(captured={0}, written={1}, dropped={2}, '
+                'skipped={3}, {4:.1f}fps, {5:.1f}MB/s)'.format(
+                    self.captured, self.written, self.dropped, self.skipped,
+                    self.fps, self.throughput / 1e6))
+
+
+# GL pixel formats (without importing vid)
+_GL_RGB = 0x1907
+_GL_RGBA = 0x1908
+
+
+#: Output formats: raw RGB(A) stream, raw I420 YUV stream (requires NumPy),
+#: or PNG image sequence (requires stbi)
+FORMATS = ('RGB', 'RGBA', 'YUV', 'PNG')
+
+
+class FrameRecorder:
+    """Records frames of a Window on a worker thread.
+
+    capture() reads the frame back into one of `num_buffers` preallocated
+    buffers and queues it; flipping, encoding and writing happen on the
+    worker. Capturing never waits for the worker: if every buffer is still
+    queued, the frame is dropped ('DROP' policy), or with the 'DECIMATE'
+    policy the recorder also halves its frame rate (and doubles it back
+    once the worker has caught up).
+
+    `path` is the output file for the raw stream formats. For 'PNG' it is
+    a format string of the frame index (e.g. 'shot-{0:05d}.png').
+
+    The frame size is fixed by `w` and `h`, or by the viewport at the first
+    capture()."""
+
+    def __init__(self, path, format='RGB', w=None, h=None, num_buffers=4,
+                 policy='DROP', clock=time.monotonic):
+        if format not in FORMATS:
+            raise ValueError('Invalid format {0!r}'.format(format))
+        if format == 'YUV' and numpy is None:
+            raise ValueError('YUV format requires NumPy')
+        if policy not in ('DROP', 'DECIMATE'):
+            raise ValueError('Invalid policy {0!r}'.format(policy))
+        if num_buffers < 2:
+            raise ValueError('num_buffers must be at least 2')
+        #: Output path
+        self.path = path
+        #: Output format
+        self.format = format
+        #: Frame size
+        self.w = w
+        self.h = h
+        #: Backpressure policy
+        self.policy = policy
+        #: Only every `decimation`-th offered frame is captured
+        self.decimation = 1
+        #: Session statistics
+        self.stats = RecordStats()
+        self.__num_buffers = int(num_buffers)
+        self.__clock = clock
+        self.__comp = 4 if format == 'RGBA' else 3
+        #: Free buffers
+        self.__free = queue.Queue()
+        #: Queued frames (index, buffer), None to stop
+        self.__frames = queue.Queue()
+        self.__thread = None
+        self.__file = None
+        self.__error = None
+        self.__closed = False
+
+    comp = property(lambda x: x.__comp)
+
+    def __start(self, win):
+        if self.w is None:
+            self.w = win._viewportw
+        if self.h is None:
+            self.h = win._viewporth
+        size = self.w * self.h * self.__comp
+        for i in range(self.__num_buffers):
+            self.__free.put(bytearray(size))
+        if self.format != 'PNG':
+            self.__file = open(self.path, 'wb', buffering=1 << 20)
+        self.stats.start_time = self.__clock()
+        self.__thread = threading.Thread(target=self.__work, daemon=True)
+        self.__thread.start()
+
+    def capture(self, win):
+        """Captures the current frame of `win` (call before
+        win.after_step()). Returns True if the frame was queued."""
+        if self.__error is not None:
+            raise self.__error
+        if self.__closed:
+            raise ValueError('recorder is closed')
+        start = self.__clock()
+        if self.__thread is None:
+            self.__start(win)
+        stats = self.stats
+        index = stats.offered
+        stats.offered += 1
+        if index % self.decimation:
+            stats.skipped += 1
+            return False
+        try:
+            buf = self.__free.get_nowait()
+        except queue.Empty:
+            stats.dropped += 1
+            if self.policy == 'DECIMATE':
+                self.decimation *= 2
+            return False
+        if self.policy == 'DECIMATE' and self.decimation > 1 and \
+                self.__frames.empty():
+            # Worker caught up
+            self.decimation //= 2
+        win.read_pixels(buf, 0, 0, self.w, self.h,
+                        _GL_RGBA if self.__comp == 4 else _GL_RGB, flip=False)
+        self.__frames.put((index, buf))
+        stats.captured += 1
+        stats.capture_time += self.__clock() - start
+        return True
+
+    def __work(self):
+        stats = self.stats
+        while True:
+            item = self.__frames.get()
+            if item is None:
+                return
+            index, buf = item
+            try:
+                start = self.__clock()
+                if self.__error is None:
+                    stats.bytes_written += self._write_frame(index, buf)
+                    stats.written += 1
+                stats.encode_time += self.__clock() - start
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__free.put(buf)
+
+    def _rows(self, buf):
+        """Returns list of rows of `buf` in top-down order"""
+        stride = self.w * self.__comp
+        m = memoryview(buf)
+        return [m[i:i + stride]
+                for i in range(len(m) - stride, -1, -stride)]
+
+    def _write_frame(self, index, buf):
+        """Encodes and writes bottom-up frame `buf`. Returns number of bytes
+        written."""
+        if self.format == 'PNG':
+            import stbi
+            path = self.path.format(index)
+            stbi.write_png(path, self.w, self.h, self.__comp,
+                           b''.join(self._rows(buf)))
+            return os.path.getsize(path)
+        if self.format == 'YUV':
+            data = self._to_i420(buf)
+            self.__file.write(data)
+            return len(data)
+        self.__file.writelines(self._rows(buf))
+        return len(buf)
+
+    def _to_i420(self, buf):
+        """Converts bottom-up RGB frame to top-down I420 (BT.601) bytes"""
+        np = numpy
+        w, h = self.w, self.h
+        rgb = np.frombuffer(buf, np.uint8).reshape(h, w, 3)[::-1]
+        rgb = rgb.astype(np.float32)
+        r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+        u = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+        v = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+        # Subsample chroma 2x2. Odd sizes are padded by repeating the last
+        # row and column, so chroma planes are (h + 1) // 2 x (w + 1) // 2.
+        pad = ((0, h % 2), (0, w % 2))
+        h2, w2 = h + h % 2, w + w % 2
+        u = np.pad(u, pad, 'edge').reshape(h2 // 2, 2, w2 // 2, 2)
+        v = np.pad(v, pad, 'edge').reshape(h2 // 2, 2, w2 // 2, 2)
+        u = u.mean(axis=(1, 3))
+        v = v.mean(axis=(1, 3))
+        out = np.concatenate([y.ravel(), u.ravel(), v.ravel()])
+        return np.clip(out + 0.5, 0, 255).astype(np.uint8).tobytes()
+
+    def close(self):
+        """Waits for queued frames to be written and closes the output.
+        Returns the session stats."""
+        if self.__closed:
+            return self.stats
+        self.__closed = True
+        if self.__thread is not None:
+            self.__frames.put(None)
+            self.__thread.join()
+            self.stats.end_time = self.__clock()
+        if self.__file is not None:
+            self.__file.close()
+        if self.__error is not None:
+            raise self.__error
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,231 @@
+"""Deterministic input recording and replay.
+
+InputRecorder wraps a Window and logs the events and time of every frame
+into a compact binary log. ReplayWindow plays the log back without SDL or
+GL, so the same session can be rerun as fast as possible::
+
+    with replay.InputRecorder(win, 'session.log') as rec:
+        loop.run(rec, root(rec), clock=rec.clock)
+
+    win = replay.ReplayWindow('session.log')
+    loop.run(win, root(win), rate=0, swap_interval=None, clock=win.clock,
+             sleep=win.sleep)
+
+In both modes, behaviors must take the time from `win.clock` (e.g.
+bhv.interval(..., clock=win.clock)), which returns the logged time of the
+current frame, so that the replay sees the same times as the session.
+Behaviors must skip drawing when replaying, since ReplayWindow has no GL
+context (`gl` is None). The virtual clock only moves between frames, so
+replays cannot be paced: run them with rate=0."""
+import struct
+import time
+from .event import KeyEvent, ButtonEvent, MotionEvent
+
+
+MAGIC = b'NGKR'
+VERSION = 2
+
+#: magic, version, w, h, window w, window h
+_HEADER = struct.Struct('<4sHffii')
+#: time, flags, number of events
+_FRAME = struct.Struct('<dBH')
+_CODE = struct.Struct('<B')
+#: key
+_KEY = struct.Struct('<i')
+#: mouse, button, x, y
+_BUTTON = struct.Struct('<IBii')
+#: mouse, state, x, y, relx, rely (doubles, so replays are bit exact)
+_MOTION = struct.Struct('<IIdddd')
+
+_QUIT = 1
+_BACK = 2
+
+#: Mapping from event type -> code
+_CODES = {'KEYDOWN': 0, 'KEYUP': 1, 'MOUSEDOWN': 2, 'MOUSEUP': 3,
+          'MOUSEMOVE': 4}
+_TYPES = {v: k for k, v in _CODES.items()}
+
+
+def _pack_events(out, events):
+    """Appends packed `events` to bytearray `out`"""
+    for ev in events:
+        code = _CODES.get(ev.type)
+        if code is None:
+            raise ValueError('Cannot record event {0!r}'.format(ev))
+        out += _CODE.pack(code)
+        if code <= 1:
+            out += _KEY.pack(ev.key)
+        elif code <= 3:
+            out += _BUTTON.pack(ev.mouse & 0xffffffff, ev.button, ev.x, ev.y)
+        else:
+            out += _MOTION.pack(ev.mouse & 0xffffffff, ev.state, ev.x, ev.y,
+                                ev.relx, ev.rely)
+
+
+class InputRecorder:
+    """Window wrapper recording events and frame times to file `f` (a path
+    or binary file object).
+
+    Use it in place of the window: every attribute not defined here is
+    forwarded to the wrapped window."""
+
+    def __init__(self, win, f, clock=time.monotonic):
+        self.__win = win
+        self.__clock = clock
+        if isinstance(f, str):
+            f = open(f, 'wb')
+            self.__owns_file = True
+        else:
+            self.__owns_file = False
+        self.__f = f
+        self.__start = None
+        #: Logged time of the current frame (None between frames)
+        self.__time = None
+        #: Number of frames recorded
+        self.frames = 0
+        f.write(_HEADER.pack(MAGIC, VERSION, win.w, win.h, win._winw,
+                             win._winh))
+
+    win = property(lambda x: x.__win)
+
+    def __getattr__(self, name):
+        return getattr(self.__win, name)
+
+    @property
+    def swap_interval(self):
+        return self.__win.swap_interval
+
+    @swap_interval.setter
+    def swap_interval(self, v):
+        self.__win.swap_interval = v
+
+    def clock(self):
+        """Returns logged time of the current frame (seconds since the
+        first frame). Between frames (e.g. while loop.run paces them),
+        returns the live time instead."""
+        if self.__time is not None:
+            return self.__time
+        now = self.__clock()
+        if self.__start is None:
+            self.__start = now
+        return now - self.__start
+
+    def before_step(self):
+        win = self.__win
+        win.before_step()
+        self.__time = None
+        t = self.clock()
+        flags = (_QUIT if win.quit else 0) | (_BACK if win.back else 0)
+        out = bytearray(_FRAME.pack(t, flags, len(win.events)))
+        _pack_events(out, win.events)
+        self.__f.write(out)
+        self.__time = t
+        self.frames += 1
+
+    def after_step(self):
+        self.__win.after_step()
+        self.__time = None
+
+    def close(self):
+        if self.__owns_file:
+            self.__f.close()
+        else:
+            self.__f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class ReplayWindow:
+    """Window stand-in playing back a log written by InputRecorder.
+
+    Each before_step() loads the next frame's events and virtual time. When
+    the log runs out, `quit` is set."""
+
+    def __init__(self, f):
+        if isinstance(f, str):
+            with open(f, 'rb') as fp:
+                data = fp.read()
+        elif isinstance(f, (bytes, bytearray, memoryview)):
+            data = bytes(f)
+        else:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ValueError('Not a replay log')
+        magic, version, w, h, winw, winh = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('Not a replay log')
+        if version != VERSION:
+            raise ValueError('Unsupported replay log version {0}'.format(
+                version))
+        self.__data = data
+        self.__offset = _HEADER.size
+        self.__time = 0.0
+        #: Window size
+        self.w = w
+        self.h = h
+        self._winw = winw
+        self._winh = winh
+        self._viewportx = 0
+        self._viewporty = 0
+        self._viewportw = winw
+        self._viewporth = winh
+        #: Events of the current frame
+        self.events = []
+        self.back = False
+        self.quit = False
+        #: No GL context
+        self.gl = None
+        self.swap_interval = None
+        #: Number of frames played
+        self.frames = 0
+
+    def clock(self):
+        """Returns recorded time of the current frame (seconds since the
+        first frame)"""
+        return self.__time
+
+    def sleep(self, t):
+        """Raises ValueError: waiting for the virtual clock would never
+        end"""
+        raise ValueError('Replays cannot be paced (use rate=0)')
+
+    def before_step(self):
+        data = self.__data
+        offset = self.__offset
+        self.events.clear()
+        if offset + _FRAME.size > len(data):
+            self.quit = True
+            return
+        t, flags, count = _FRAME.unpack_from(data, offset)
+        offset += _FRAME.size
+        events = self.events
+        for i in range(count):
+            code = data[offset]
+            offset += 1
+            type = _TYPES[code]
+            if code <= 1:
+                events.append(KeyEvent(type, *_KEY.unpack_from(data,
+                                                               offset)))
+                offset += _KEY.size
+            elif code <= 3:
+                events.append(ButtonEvent(type, *_BUTTON.unpack_from(
+                    data, offset)))
+                offset += _BUTTON.size
+            else:
+                events.append(MotionEvent(type, *_MOTION.unpack_from(
+                    data, offset)))
+                offset += _MOTION.size
+        self.__offset = offset
+        self.__time = t
+        if flags & _QUIT:
+            self.quit = True
+        if flags & _BACK:
+            self.back = True
+        self.frames += 1
+
+    def after_step(self):
+        pass
@@ -0,0 +1,198 @@
+"""Scene graph with cached hierarchical transforms"""
+import array
+import itertools
+from . import mat4, quat, vec3
+
+
+class Node:
+    """Scene graph node with a local translation/rotation/scale"""
+
+    def __init__(self, scene, parent=None):
+        #: Scene
+        self.__scene = scene
+        #: Index of world matrix in scene.world
+        self.__index = scene._alloc()
+        #: Parent node (or None if root)
+        self.__parent = None
+        #: Child nodes
+        self.__children = []
+        #: Local translation
+        self.__translation = vec3.create()
+        #: Local rotation
+        self.__rotation = quat.create()
+        #: Local scale
+        self.__scale = vec3.create(1, 1, 1)
+        #: Local transform changed
+        self._dirty = True
+        #: Some descendant has its local transform changed
+        self._child_dirty = False
+        scene._roots.append(self)
+        if parent is not None:
+            self.parent = parent
+        else:
+            self.invalidate()
+
+    scene = property(lambda x: x.__scene)
+
+    index = property(lambda x: x.__index)
+
+    children = property(lambda x: tuple(x.__children))
+
+    translation = property(lambda x: x.__translation)
+
+    rotation = property(lambda x: x.__rotation)
+
+    scale = property(lambda x: x.__scale)
+
+    @translation.setter
+    def translation(self, v):
+        self.__translation[:] = array.array('f', v)
+        self.invalidate()
+
+    @rotation.setter
+    def rotation(self, v):
+        self.__rotation[:] = array.array('f', v)
+        self.invalidate()
+
+    @scale.setter
+    def scale(self, v):
+        self.__scale[:] = array.array('f', v)
+        self.invalidate()
+
+    @property
+    def parent(self):
+        return self.__parent
+
+    @parent.setter
+    def parent(self, v):
+        if v is self.__parent:
+            return
+        if v is not None:
+            if v.scene is not self.__scene:
+                raise ValueError('parent belongs to a different scene')
+            x = v
+            while x is not None:
+                if x is self:
+                    raise ValueError('parent would create a cycle')
+                x = x.parent
+        # Detach
+        if self.__parent is None:
+            self.__scene._roots.remove(self)
+        else:
+            self.__parent.__children.remove(self)
+        # Attach
+        if v is None:
+            self.__scene._roots.append(self)
+        else:
+            v.__children.append(self)
+        self.__parent = v
+        self.invalidate()
+
+    @property
+    def world(self):
+        """Returns copy of the world matrix (as of the last Scene.update())"""
+        I = self.__index * 16
+        return self.__scene.world[I:I + 16]
+
+    def invalidate(self):
+        """Marks the local transform as changed.
+
+        Must be called after modifying translation/rotation/scale in place."""
+        self._dirty = True
+        x = self.__parent
+        while x is not None and not x._child_dirty:
+            x._child_dirty = True
+            x = x.__parent
+        self.__scene._dirty = True
+
+    def _compute(self, world, tmp):
+        """Computes world matrix into `world` (a memoryview of scene.world)"""
+        I = self.__index * 16
+        out = world[I:I + 16]
+        if self.__parent is None:
+            mat4.from_rotation_translation_scale(out, self.__rotation,
+                                                 self.__translation,
+                                                 self.__scale)
+        else:
+            mat4.from_rotation_translation_scale(tmp, self.__rotation,
+                                                 self.__translation,
+                                                 self.__scale)
+            P = self.__parent.__index * 16
+            mat4.multiply(out, world[P:P + 16], tmp)
+        self._dirty = False
+
+    def _release(self):
+        """Releases slots of this node and all of its descendants"""
+        for child in self.__children:
+            child._release()
+        self.__scene._free_slot(self.__index)
+        self.__index = None
+
+
+class Scene:
+    """Owns nodes and stores their world matrices in one array"""
+
+    def __init__(self):
+        #: World matrices (16 floats per node, indexed by Node.index)
+        self.world = array.array('f')
+        #: Incremented every time world matrices are recomputed
+        self.version = 0
+        #: Root nodes
+        self._roots = []
+        #: Free indices
+        self.__free = []
+        #: Some node has its local transform changed
+        self._dirty = False
+        #: Temporary local matrix
+        self.__tmp = mat4.create()
+
+    roots = property(lambda x: tuple(x._roots))
+
+    def _alloc(self):
+        """Allocates world matrix slot. Returns new index."""
+        if self.__free:
+            return self.__free.pop()
+        index = len(self.world) // 16
+        self.world.extend(mat4.IDENTITY)
+        return index
+
+    def _free_slot(self, index):
+        I = index * 16
+        self.world[I:I + 16] = mat4.IDENTITY
+        self.__free.append(index)
+
+    def add(self, parent=None):
+        """Returns new Node"""
+        return Node(self, parent)
+
+    def remove(self, node):
+        """Removes `node` and all of its descendants"""
+        node.parent = None
+        self._roots.remove(node)
+        node._release()
+
+    def update(self):
+        """Recomputes world matrices of changed subtrees.
+
+        Returns True if any world matrix was recomputed."""
+        if not self._dirty:
+            return False
+        tmp = self.__tmp
+        world = memoryview(self.world)
+        try:
+            # Parents are always computed before their children
+            stack = list(zip(self._roots, itertools.repeat(False)))
+            while stack:
+                node, force = stack.pop()
+                force = force or node._dirty
+                if force:
+                    node._compute(world, tmp)
+                elif not node._child_dirty:
+                    continue
+                node._child_dirty = False
+                stack.extend(zip(node.children, itertools.repeat(force)))
+        finally:
+            world.release()
+        self._dirty = False
+        self.version += 1
+        return True
@@ -0,0 +1,111 @@
+"""Frame-scoped scratch arena for math temporaries"""
+import array
+from . import mat4
+
+
+_QUAT_IDENTITY = array.array('f', (0, 0, 0, 1))
+
+
+class Arena:
+    """Hands out vec3/vec4/quat/mat4 slots as memoryviews into one big
+    array('f'), instead of allocating an array per temporary.
+
+    All slots are freed at once by reset(), typically at the end of each
+    frame, which is O(1). Slots must not be used after the reset. In
+    `debug` mode reset() releases every handed out memoryview, so such use
+    raises ValueError instead of silently sharing memory with a newer
+    slot.
+
+    When the arena runs out, a new chunk is allocated; on the next
+    reset() the chunks are replaced by a single array big enough for the
+    whole frame."""
+
+    def __init__(self, capacity=4096, debug=False):
+        #: Debug mode
+        self.debug = debug
+        #: Number of floats handed out since the last reset
+        self.used = 0
+        #: Highest `used` seen
+        self.peak = 0
+        self.__data = array.array('f', bytes(4 * max(int(capacity), 16)))
+        self.__view = memoryview(self.__data)
+        #: Offset into the current chunk
+        self.__offset = 0
+        #: Number of floats in earlier chunks of this frame
+        self.__spilled = 0
+        #: Slots handed out in debug mode
+        self.__slots = []
+
+    capacity = property(lambda x: len(x.__data))
+
+    def alloc(self, n):
+        """Returns memoryview of `n` floats (uninitialized)"""
+        offset = self.__offset
+        end = offset + n
+        if end > len(self.__data):
+            # Start a new chunk. Earlier chunks stay alive through the
+            # slots pointing into them.
+            self.__spilled += offset
+            self.__data = array.array('f', bytes(
+                4 * max(2 * len(self.__data), n)))
+            self.__view = memoryview(self.__data)
+            offset = 0
+            end = n
+        self.__offset = end
+        self.used += n
+        slot = self.__view[offset:end]
+        if self.debug:
+            self.__slots.append(slot)
+        return slot
+
+    def vec3(self, x=0, y=0, z=0):
+        out = self.alloc(3)
+        out[0], out[1], out[2] = x, y, z
+        return out
+
+    def vec4(self, x=0, y=0, z=0, w=0):
+        out = self.alloc(4)
+        out[0], out[1], out[2], out[3] = x, y, z, w
+        return out
+
+    def quat(self):
+        """Returns identity quat slot"""
+        out = self.alloc(4)
+        out[:] = _QUAT_IDENTITY
+        return out
+
+    def mat4(self):
+        """Returns identity mat4 slot"""
+        out = self.alloc(16)
+        out[:] = mat4.IDENTITY
+        return out
+
+    def reset(self):
+        """Frees all slots"""
+        if self.used > self.peak:
+            self.peak = self.used
+        if self.__spilled:
+            # Replace the chunks with one array big enough for the peak
+            self.__data = array.array('f', bytes(4 * self.peak))
+            self.__view = memoryview(self.__data)
+            self.__spilled = 0
+        self.__offset = 0
+        self.used = 0
+        if self.__slots:
+            slots = self.__slots
+            self.__slots = []
+            in_use = 0
+            for slot in slots:
+                try:
+                    slot.release()
+                except BufferError:
+                    in_use += 1
+            if in_use:
+                raise ValueError('{0} scratch slots are still exported to '
+                                 'other buffers'.format(in_use))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.reset()
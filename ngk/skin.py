@@ -0,0 +1,154 @@
+"""CPU skinning of Tri3Geom vertex data"""
+import array
+from . import anim, mat4
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def skin_verts(out, bind, bone_indices, bone_weights, bones, influences=4,
+               num_floats=8, first=0, count=None):
+    """Skins verts in Tri3Geom layout (position, normal, UV, ...).
+
+    `bind` holds the bind pose verts and `out` receives the skinned verts,
+    both with `num_floats` floats per vert. Each vert has `influences` bone
+    indices (into `bones`, 16 floats per bone) and weights. Only the
+    `count` verts starting at vert `first` are skinned. Normals are
+    transformed by the blended matrix and renormalized, which assumes bones
+    are not non-uniformly scaled. Floats after the normal are copied."""
+    nf = num_floats
+    if count is None:
+        count = len(bind) // nf - first
+    if count <= 0:
+        return
+    if numpy is not None:
+        return _skin_verts_numpy(out, bind, bone_indices, bone_weights,
+                                 bones, influences, nf, first, count)
+    for i in range(first, first + count):
+        # Blend the 3x4 parts of the bone matrices
+        m = [0.0] * 12
+        for k in range(i * influences, (i + 1) * influences):
+            w = bone_weights[k]
+            if not w:
+                continue
+            B = bone_indices[k] * 16
+            b = bones[B:B+16]
+            for j in range(3):
+                m[j] += b[j] * w
+                m[3 + j] += b[4 + j] * w
+                m[6 + j] += b[8 + j] * w
+                m[9 + j] += b[12 + j] * w
+        I = i * nf
+        x, y, z, nx, ny, nz = bind[I:I+6]
+        out[I] = m[0] * x + m[3] * y + m[6] * z + m[9]
+        out[I+1] = m[1] * x + m[4] * y + m[7] * z + m[10]
+        out[I+2] = m[2] * x + m[5] * y + m[8] * z + m[11]
+        nx, ny, nz = (m[0] * nx + m[3] * ny + m[6] * nz,
+                      m[1] * nx + m[4] * ny + m[7] * nz,
+                      m[2] * nx + m[5] * ny + m[8] * nz)
+        length = (nx * nx + ny * ny + nz * nz) ** 0.5
+        if length > 0:
+            nx, ny, nz = nx / length, ny / length, nz / length
+        out[I+3], out[I+4], out[I+5] = nx, ny, nz
+        out[I+6:I+nf] = bind[I+6:I+nf]
+
+
+def _skin_verts_numpy(out, bind, bone_indices, bone_weights, bones,
+                      influences, nf, first, count):
+    np = numpy
+    end = first + count
+    src = np.frombuffer(bind, np.float32).reshape(-1, nf)[first:end]
+    dst = np.frombuffer(out, np.float32).reshape(-1, nf)[first:end]
+    idx = np.asarray(memoryview(bone_indices)).reshape(-1, influences)
+    w = np.asarray(memoryview(bone_weights), np.float32)
+    w = w.reshape(-1, influences)[first:end]
+    # Column-major mat4s: m[c, r] is column c, row r
+    m = np.frombuffer(bones, np.float32).reshape(-1, 4, 4)
+    m = np.einsum('nk,nkcr->ncr', w, m[idx[first:end]])
+    dst[:, 0:3] = np.einsum('nc,ncr->nr', src[:, 0:3], m[:, :3, :3])
+    dst[:, 0:3] += m[:, 3, :3]
+    n = np.einsum('nc,ncr->nr', src[:, 3:6], m[:, :3, :3])
+    length = np.sqrt((n * n).sum(axis=1))
+    length[length == 0] = 1.0
+    dst[:, 3:6] = n / length[:, None]
+    dst[:, 6:] = src[:, 6:]
+
+
+class Skin:
+    """Skins bind pose verts into the vertex data of a Tri3Geom.
+
+    The geom's vertdata must have the same size as `bind`. After skinning,
+    only the skinned span of verts is marked dirty, so only that span is
+    uploaded on the next draw."""
+
+    def __init__(self, geom, bind, bone_indices, bone_weights,
+                 num_bones, influences=4, inverse_bind=None):
+        #: Tri3Geom receiving the skinned verts
+        self.geom = geom
+        #: Bind pose verts
+        self.bind = bind
+        #: Bone indices (`influences` per vert)
+        self.bone_indices = bone_indices
+        #: Bone weights (`influences` per vert)
+        self.bone_weights = bone_weights
+        #: Number of bone influences per vert
+        self.influences = int(influences)
+        #: Number of bones
+        self.num_bones = int(num_bones)
+        #: Inverse bind matrices (16 floats per bone), or None
+        self.inverse_bind = inverse_bind
+        #: Skinning matrices (16 floats per bone)
+        self.bones = array.array('f', mat4.IDENTITY * self.num_bones)
+        nverts = len(bind) // geom.num_floats
+        if len(geom.vertdata) != len(bind):
+            raise ValueError('geom vertdata len does not match bind')
+        if len(bone_indices) != nverts * self.influences or \
+                len(bone_weights) != nverts * self.influences:
+            raise ValueError('bone_indices/bone_weights len does not match '
+                             'number of verts')
+        self.__blended = None
+
+    def update(self, first=0, count=None):
+        """Skins verts with the current `bones`"""
+        nf = self.geom.num_floats
+        if count is None:
+            count = len(self.bind) // nf - first
+        skin_verts(self.geom.vertdata, self.bind, self.bone_indices,
+                   self.bone_weights, self.bones, self.influences, nf,
+                   first, count)
+        self.geom.mark_dirty(first, count)
+
+    def update_pose(self, pose, parents=None, first=0, count=None):
+        """Computes `bones` from anim.Pose `pose` and skins verts.
+
+        See Pose.to_mat4s() for `parents`."""
+        bones = self.bones
+        pose.to_mat4s(bones, parents)
+        ib = self.inverse_bind
+        if ib is not None:
+            if numpy is not None:
+                np = numpy
+                m = np.frombuffer(bones, np.float32).reshape(-1, 4, 4)
+                # Column-major storage is transposed, so bone * inverse
+                # bind is inverse_bind^T @ bone^T
+                m[:] = np.matmul(np.frombuffer(ib, np.float32)
+                                 .reshape(-1, 4, 4), m)
+            else:
+                mv = memoryview(bones)
+                try:
+                    for i in range(self.num_bones):
+                        b = mv[i*16:i*16+16]
+                        mat4.multiply(b, b, ib[i*16:i*16+16])
+                finally:
+                    mv.release()
+        self.update(first, count)
+
+    def update_blend(self, a, b, t, parents=None, first=0, count=None):
+        """Blends anim.Poses `a` and `b` by `t` and skins verts with the
+        result (see anim.blend())"""
+        blended = self.__blended
+        if blended is None or blended.num_bones != a.num_bones:
+            blended = self.__blended = anim.Pose(a.num_bones)
+        anim.blend(blended, a, b, t)
+        self.update_pose(blended, parents, first, count)
@@ -0,0 +1,349 @@
+"""Spatial indexes of 2D rects for picking and region queries"""
+import math
+
+
+def rect_distance(rect, x, y):
+    """Returns distance from point (x, y) to `rect` (0 if inside)"""
+    x0, y0, x1, y1 = rect
+    dx = x0 - x if x < x0 else (x - x1 if x > x1 else 0)
+    dy = y0 - y if y < y0 else (y - y1 if y > y1 else 0)
+    return math.sqrt(dx*dx + dy*dy)
+
+
+def event_pos(win, ev):
+    """Returns position of MotionEvent/ButtonEvent `ev` in the coordinate
+    space of `win.ortho_mat` (origin at the center, y axis up)"""
+    x, y = ev.x, ev.y
+    if ev.type == 'MOUSEMOVE':
+        # Back from window size scaled to window pixels
+        x = x / win.w * win._winw
+        y = y / win.h * win._winh
+    # Through the (letterboxed) viewport, whose y is measured from the
+    # bottom of the window
+    top = win._winh - win._viewporty - win._viewporth
+    x = (x - win._viewportx) / win._viewportw * win.w
+    y = (y - top) / win._viewporth * win.h
+    return x - win.w / 2, win.h / 2 - y
+
+
+def quad2_rect(geom, index):
+    """Returns bounding rect (x0, y0, x1, y1) of quad `index` of Quad2Geom"""
+    nf = geom.num_floats
+    I = int(index) * 4 * nf
+    v = geom.vertdata
+    xs = v[I:I + 4 * nf:nf]
+    ys = v[I + 1:I + 4 * nf:nf]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class _SpatialIndex:
+    """Rect storage and common interface of GridIndex and QuadTree, which
+    implement remove(), query_rect() and _min_radius() (the initial search
+    radius of nearest()).
+
+    Keys are ints (e.g. Quad2Geom quad indices) mapped to rects
+    (x0, y0, x1, y1)."""
+
+    def __init__(self):
+        #: Mapping from key -> rect
+        self._rects = {}
+        #: Bounding box of all rects inserted since the last clear()
+        self._bbox = None
+        #: Mapping from tracked geom -> listener
+        self.__listeners = {}
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, key):
+        return key in self._rects
+
+    def rect(self, key):
+        return self._rects[key]
+
+    def insert(self, key, x0, y0, x1, y1):
+        """Inserts (or moves) `key` with rect (x0, y0)-(x1, y1)"""
+        self._rects[key] = (x0, y0, x1, y1)
+        self._grow(x0, y0, x1, y1)
+
+    def clear(self):
+        self._rects.clear()
+        self._bbox = None
+
+    def query_point(self, x, y):
+        """Returns list of keys whose rects contain point (x, y)"""
+        return self.query_rect(x, y, x, y)
+
+    def _grow(self, x0, y0, x1, y1):
+        """Grows bounding box of all rects ever inserted"""
+        b = self._bbox
+        if b is None:
+            self._bbox = (x0, y0, x1, y1)
+        elif x0 < b[0] or y0 < b[1] or x1 > b[2] or y1 > b[3]:
+            self._bbox = (min(x0, b[0]), min(y0, b[1]),
+                          max(x1, b[2]), max(y1, b[3]))
+
+    def nearest(self, x, y, max_dist=math.inf):
+        """Returns key whose rect is nearest to point (x, y), or None"""
+        if not self._rects:
+            return None
+        rects = self._rects
+        bx0, by0, bx1, by1 = self._bbox
+        r = self._min_radius()
+        while True:
+            # Any rect within distance r overlaps the query square
+            best = None
+            best_dist = min(r, max_dist)
+            for key in self.query_rect(x - r, y - r, x + r, y + r):
+                d = rect_distance(rects[key], x, y)
+                if d <= best_dist:
+                    best, best_dist = key, d
+            if best is not None or r >= max_dist:
+                return best
+            if x - r <= bx0 and y - r <= by0 and x + r >= bx1 and \
+                    y + r >= by1:
+                # Query square covered every rect
+                return None
+            r *= 2
+
+    # Quad2Geom tracking
+
+    def track(self, geom):
+        """Indexes quads of Quad2Geom `geom` and keeps them in sync.
+
+        Keys are quad indices. Empty (deleted) quads are skipped. Only one
+        geom should be tracked per index."""
+        def rebuild():
+            self.clear()
+            nf = geom.num_floats
+            v = geom.vertdata
+            for index in range(len(v) // (4 * nf)):
+                I = index * 4 * nf
+                if any(v[I:I + 4 * nf]):
+                    self.insert(index, *quad2_rect(geom, index))
+        rebuild()
+
+        def listener(kind, index):
+            if kind == 'SET':
+                self.insert(index, *quad2_rect(geom, index))
+            elif kind == 'DEL':
+                self.remove(index)
+            elif kind == 'CLEAR':
+                # Cleared, or vertdata was replaced
+                rebuild()
+        geom.listeners.append(listener)
+        self.__listeners[geom] = listener
+
+    def untrack(self, geom):
+        """Stops keeping the index in sync with `geom`"""
+        geom.listeners.remove(self.__listeners.pop(geom))
+
+
+class GridIndex(_SpatialIndex):
+    """Uniform grid (spatial hash) of rects.
+
+    Best when rects are of similar size, about `cell_size` across."""
+
+    def __init__(self, cell_size=64.0):
+        super().__init__()
+        #: Cell size
+        self.cell_size = float(cell_size)
+        #: Mapping from (cx, cy) -> set of keys
+        self.__cells = {}
+        #: Mapping from key -> cell range (cx0, cy0, cx1, cy1)
+        self.__ranges = {}
+
+    def __cell_range(self, x0, y0, x1, y1):
+        s = self.cell_size
+        return (math.floor(x0 / s), math.floor(y0 / s),
+                math.floor(x1 / s), math.floor(y1 / s))
+
+    def insert(self, key, x0, y0, x1, y1):
+        rng = self.__cell_range(x0, y0, x1, y1)
+        super().insert(key, x0, y0, x1, y1)
+        old = self.__ranges.get(key)
+        if old == rng:
+            return
+        if old is not None:
+            self.__unlink(key, old)
+        self.__ranges[key] = rng
+        cells = self.__cells
+        cx0, cy0, cx1, cy1 = rng
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cell = cells[cx, cy] = set()
+                cell.add(key)
+
+    def __unlink(self, key, rng):
+        cells = self.__cells
+        cx0, cy0, cx1, cy1 = rng
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = cells[cx, cy]
+                cell.discard(key)
+                if not cell:
+                    del cells[cx, cy]
+
+    def remove(self, key):
+        """Removes `key`. Does nothing if `key` is not in the index."""
+        rng = self.__ranges.pop(key, None)
+        if rng is None:
+            return
+        del self._rects[key]
+        self.__unlink(key, rng)
+
+    def clear(self):
+        super().clear()
+        self.__cells.clear()
+        self.__ranges.clear()
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Returns list of keys whose rects overlap (x0, y0)-(x1, y1)"""
+        cx0, cy0, cx1, cy1 = self.__cell_range(x0, y0, x1, y1)
+        cells = self.__cells
+        found = set()
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(cells):
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    cell = cells.get((cx, cy))
+                    if cell:
+                        found.update(cell)
+        else:
+            # Query covers more cells than there are occupied cells
+            for (cx, cy), cell in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found.update(cell)
+        rects = self._rects
+        out = []
+        for key in found:
+            rx0, ry0, rx1, ry1 = rects[key]
+            if rx0 <= x1 and rx1 >= x0 and ry0 <= y1 and ry1 >= y0:
+                out.append(key)
+        return out
+
+    def _min_radius(self):
+        return self.cell_size / 2
+
+
+class QuadTree(_SpatialIndex):
+    """Loose quadtree of rects covering region (x0, y0)-(x1, y1).
+
+    Every rect is stored in exactly one node: the deepest node whose loose
+    bounds (the node's bounds expanded by half its size on every side)
+    contain the rect. Nodes are stored in a dict keyed by
+    (depth, ix, iy), so moving a rect is O(1). Rects whose center is
+    outside the region are kept at the root."""
+
+    def __init__(self, x0, y0, x1, y1, max_depth=8):
+        super().__init__()
+        #: Region covered
+        self.bounds = (x0, y0, x1, y1)
+        #: Maximum depth
+        self.max_depth = int(max_depth)
+        #: Mapping from (depth, ix, iy) -> set of keys
+        self.__nodes = {}
+        #: Mapping from key -> node
+        self.__node_of = {}
+        #: Number of nodes at each depth
+        self.__depth_count = [0] * (self.max_depth + 1)
+
+    def __node(self, x0, y0, x1, y1):
+        bx0, by0, bx1, by1 = self.bounds
+        w = bx1 - bx0
+        h = by1 - by0
+        cx = (x0 + x1) / 2
+        cy = (y0 + y1) / 2
+        if not (bx0 <= cx < bx1 and by0 <= cy < by1):
+            return (0, 0, 0)
+        size = max((x1 - x0) / w, (y1 - y0) / h)
+        if size > 0:
+            # Loose bounds hold rects up to the node size
+            depth = min(max(int(-math.log2(size)), 0), self.max_depth)
+        else:
+            depth = self.max_depth
+        n = 1 << depth
+        return (depth, min(int((cx - bx0) / w * n), n - 1),
+                min(int((cy - by0) / h * n), n - 1))
+
+    def insert(self, key, x0, y0, x1, y1):
+        node = self.__node(x0, y0, x1, y1)
+        super().insert(key, x0, y0, x1, y1)
+        old = self.__node_of.get(key)
+        if old == node:
+            return
+        if old is not None:
+            self.__unlink(key, old)
+        self.__node_of[key] = node
+        keys = self.__nodes.get(node)
+        if keys is None:
+            keys = self.__nodes[node] = set()
+            self.__depth_count[node[0]] += 1
+        keys.add(key)
+
+    def __unlink(self, key, node):
+        keys = self.__nodes[node]
+        keys.discard(key)
+        if not keys:
+            del self.__nodes[node]
+            self.__depth_count[node[0]] -= 1
+
+    def remove(self, key):
+        """Removes `key`. Does nothing if `key` is not in the index."""
+        node = self.__node_of.pop(key, None)
+        if node is None:
+            return
+        del self._rects[key]
+        self.__unlink(key, node)
+
+    def clear(self):
+        super().clear()
+        self.__nodes.clear()
+        self.__node_of.clear()
+        self.__depth_count = [0] * (self.max_depth + 1)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Returns list of keys whose rects overlap (x0, y0)-(x1, y1)"""
+        bx0, by0, bx1, by1 = self.bounds
+        w = bx1 - bx0
+        h = by1 - by0
+        nodes = self.__nodes
+        rects = self._rects
+        out = []
+        for depth, count in enumerate(self.__depth_count):
+            if not count:
+                continue
+            n = 1 << depth
+            if depth == 0:
+                candidates = [nodes[0, 0, 0]]
+            else:
+                # Nodes whose loose bounds overlap the query
+                nw = w / n
+                nh = h / n
+                ix0 = max(math.ceil((x0 - bx0) / nw - 1.5), 0)
+                iy0 = max(math.ceil((y0 - by0) / nh - 1.5), 0)
+                ix1 = min(math.floor((x1 - bx0) / nw + 0.5), n - 1)
+                iy1 = min(math.floor((y1 - by0) / nh + 0.5), n - 1)
+                if ix1 < ix0 or iy1 < iy0:
+                    continue
+                if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) <= count:
+                    candidates = [nodes.get((depth, ix, iy))
+                                  for iy in range(iy0, iy1 + 1)
+                                  for ix in range(ix0, ix1 + 1)]
+                else:
+                    candidates = [keys for (d, ix, iy), keys in nodes.items()
+                                  if d == depth and ix0 <= ix <= ix1 and
+                                  iy0 <= iy <= iy1]
+            for keys in candidates:
+                if not keys:
+                    continue
+                for key in keys:
+                    rx0, ry0, rx1, ry1 = rects[key]
+                    if rx0 <= x1 and rx1 >= x0 and ry0 <= y1 and ry1 >= y0:
+                        out.append(key)
+        return out
+
+    def _min_radius(self):
+        bx0, by0, bx1, by1 = self.bounds
+        return max(bx1 - bx0, by1 - by0) / (1 << self.max_depth)
@@ -10,7 +10,8 @@ import time
 import weakref
 from cgles2 import *
 from csdl2 import *
-from . import mat4, vec3
+from . import garbage, ktx, mat4, vec3
+from .event import KeyEvent, ButtonEvent, MotionEvent
 
 
 class _Buffer:
@@ -18,37 +19,86 @@ class _Buffer:
 
     __bufs = None
 
-    def __init__(self, win, type, num_bufs=1):
-        #: Window
-        self.__win = win
-        gl = win.gl
+    def __init__(self, group, type, num_bufs=1):
+        #: ContextGroup
+        self.__group = group
         #: Buffer type (GL_ARRAY_BUFFER or GL_ELEMENT_ARRAY_BUFFER)
         self.__type = type
-        # Generate bufs
-        self.__bufs = [gl.createBuffer() for i in range(num_bufs)]
+        #: Number of bufs (cycled through by set_data())
+        self.__num_bufs = num_bufs
+        #: Data store size of each buf
+        self.__sizes = [0] * num_bufs
         # Current buffer i
         self.__currentbuf = -1
         #: Update flag
         self.update = True
+        #: Pending (start, end) byte range to upload with set_sub_data()
+        self.dirty = None
+        #: Size of the data store of the current buffer in bytes
+        self.size = 0
+        #: Bytes held in all bufs
+        self.nbytes = 0
+        #: Frame number of the last bind
+        self.last_frame = group.frame
+        group._gpu_track(self)
+        # Generate bufs
+        self.__create()
+
+    def __create(self):
+        group = self.__group
+        self.__bufs = [group._create_buffer()
+                       for i in range(self.__num_bufs)]
 
     def __del__(self):
         if self.__bufs:
-            self.__win._del_buffers.extend(self.__bufs)
+            self.__group._free_buffers(self.__type, self.__bufs)
+        self.__group._gpu_untrack(self)
 
     type = property(lambda x: x.__type)
 
     def bind(self):
         """Bind buffer"""
-        gl = self.__win.gl
+        gl = self.__group.gl
         gl.bindBuffer(self.__type, self.__bufs[self.__currentbuf])
+        self.__group._gpu_touch(self)
 
     def set_data(self, data, usage):
-        gl = self.__win.gl
+        group = self.__group
+        gl = group.gl
+        if self.__bufs is None:
+            self.__create()
         nextbuf_i = (self.__currentbuf + 1) % len(self.__bufs)
         nextbuf = self.__bufs[nextbuf_i]
         gl.bindBuffer(self.__type, nextbuf)
         gl.bufferData(self.__type, data, usage)
         self.__currentbuf = nextbuf_i
+        self.size = memoryview(data).nbytes
+        self.dirty = None
+        group.uploaded_bytes += self.size
+        self.__sizes[nextbuf_i] = self.size
+        group._gpu_account(self, sum(self.__sizes))
+        group._gpu_touch(self)
+
+    def set_sub_data(self, offset, data):
+        """Replaces part of the current buffer's data store, starting at
+        byte `offset`"""
+        gl = self.__group.gl
+        gl.bindBuffer(self.__type, self.__bufs[self.__currentbuf])
+        gl.bufferSubData(self.__type, offset, data)
+        self.__group.uploaded_bytes += memoryview(data).nbytes
+
+    def evict(self):
+        """Deletes the GL buffers. They are recreated and the data uploaded
+        again on next use."""
+        if self.__bufs:
+            self.__group._del_buffers.extend(self.__bufs)
+            self.__bufs = None
+        self.__sizes = [0] * self.__num_bufs
+        self.__currentbuf = -1
+        self.size = 0
+        self.dirty = None
+        self.update = True
+        self.__group._gpu_account(self, 0)
 
 
 class _Texture:
@@ -56,28 +106,87 @@ class _Texture:
 
     __tex = None
 
-    def __init__(self, win, target):
-        #: Window
-        self.__win = win
+    def __init__(self, group, target):
+        #: ContextGroup
+        self.__group = group
         #: Texture target
         self.__target = target
-        #: Texture handle
-        self.__tex = gl.createTexture()
         #: Update flag
         self.update = True
+        #: Pending (x0, y0, x1, y1) rect to upload with texSubImage2D()
+        self.dirty = None
+        #: Applied (min filter, mag filter, wrap s, wrap t), or None
+        self.params = None
+        #: Bytes held by the texture
+        self.nbytes = 0
+        #: Bytes held by level 0
+        self.__level0_bytes = 0
+        #: Whether levels other than 0 were specified
+        self.__mipmapped = False
+        #: Frame number of the last bind
+        self.last_frame = group.frame
+        group._gpu_track(self)
+        #: Texture handle
+        self.__tex = group._create_texture()
 
     def __del__(self):
         if self.__tex:
-            self.__win._del_textures.append(self.__tex)
+            self.__group._free_texture(self.__target, self.__tex,
+                                       self.__mipmapped)
+        self.__group._gpu_untrack(self)
 
     def bind(self):
-        gl = self.__win.gl
+        gl = self.__group.gl
+        if self.__tex is None:
+            self.__tex = self.__group._create_texture()
         gl.bindTexture(self.__target, self.__tex)
+        self.__group._gpu_touch(self)
 
     def texImage2D(self, target, w, h, fmt, data):
-        gl = self.__win.gl
+        gl = self.__group.gl
         self.bind()
         gl.texImage2D(target, 0, fmt, w, h, 0, fmt, GL_UNSIGNED_BYTE, data)
+        self.__level0_bytes = w * h * (4 if fmt == GL_RGBA else 3)
+        self.__group.uploaded_bytes += self.__level0_bytes
+        self.__group._gpu_account(self, self.__level0_bytes)
+
+    def compressedTexImage2D(self, target, level, fmt, w, h, data):
+        gl = self.__group.gl
+        self.bind()
+        nbytes = memoryview(data).nbytes
+        gl.compressedTexImage2D(target, level, fmt, w, h, 0, nbytes, data)
+        if level:
+            self.__mipmapped = True
+        self.__group.uploaded_bytes += nbytes
+        # Level 0 replaces the whole mip chain
+        self.__group._gpu_account(self, nbytes + (self.nbytes if level
+                                                  else 0))
+
+    def texSubImage2D(self, target, x, y, w, h, fmt, data):
+        gl = self.__group.gl
+        self.bind()
+        gl.texSubImage2D(target, 0, x, y, w, h, fmt, GL_UNSIGNED_BYTE, data)
+        self.__group.uploaded_bytes += memoryview(data).nbytes
+
+    def generate_mipmap(self):
+        gl = self.__group.gl
+        self.bind()
+        gl.generateMipmap(self.__target)
+        self.__mipmapped = True
+        # The mip chain adds a third
+        self.__group._gpu_account(self, self.__level0_bytes * 4 // 3)
+
+    def evict(self):
+        """Deletes the GL texture. It is recreated and the data uploaded
+        again on next bind."""
+        if self.__tex:
+            self.__group._del_textures.append(self.__tex)
+            self.__tex = None
+        self.__mipmapped = False
+        self.update = True
+        self.dirty = None
+        self.params = None
+        self.__group._gpu_account(self, 0)
 
 
 VertexAttribInfo = collections.namedtuple('VertexAttribInfo',
@@ -95,10 +204,10 @@ class _Program:
 
     __progobj = None
 
-    def __init__(self, win):
-        #: Window
-        self.__win = win
-        gl = self.__win.gl
+    def __init__(self, group):
+        #: ContextGroup
+        self.__group = group
+        gl = self.__group.gl
         self.__vertobj = gl.createShader(GL_VERTEX_SHADER)
         self.__fragobj = gl.createShader(GL_FRAGMENT_SHADER)
         self.__progobj = gl.createProgram()
@@ -116,32 +225,35 @@ class _Program:
 
     def __del__(self):
         if self.__progobj:
-            self.__win._del_programs.append(self.__progobj)
+            self.__group._del_programs.append(self.__progobj)
         if self.__fragobj:
-            self.__win._del_shaders.append(self.__fragobj)
+            self.__group._del_shaders.append(self.__fragobj)
         if self.__vertobj:
-            self.__win._del_shaders.append(self.__vertobj)
+            self.__group._del_shaders.append(self.__vertobj)
 
-    def bind(self):
-        gl = self.__win.gl
-        oldprog = self.__win._prog
+    def bind(self, win):
+        """Makes program current in Window `win`"""
+        gl = self.__group.gl
+        oldprog = win._prog
         if oldprog:
             oldprog = oldprog()
-        if oldprog is self:
-            return
-        self.__win._prog = None
-        gl.useProgram(self.__progobj)
-        # Enable vertex arrays
-        for v in self.vert_attrs.values():
-            gl.enableVertexAttribArray(v.index)
-        # Enable textures
+        if oldprog is not self:
+            win._prog = None
+            gl.useProgram(self.__progobj)
+            # Enable vertex arrays
+            for v in self.vert_attrs.values():
+                gl.enableVertexAttribArray(v.index)
+            win._prog = weakref.ref(self)
+        # Enable textures. Texture unit bindings are per context, so they
+        # are bound even if the program is current: its textures may have
+        # been set while drawing in another window of the group.
         for texunit, tex in self.__textures.items():
             gl.activeTexture(GL_TEXTURE0 + texunit)
-            tex.bind(self.__win)
-        self.__win._prog = weakref.ref(self)
+            tex.bind(win)
 
-    def unbind(self):
-        prog = self.__win._prog
+    def unbind(self, win):
+        gl = self.__group.gl
+        prog = win._prog
         if prog:
             prog = prog()
         if prog is not self:
@@ -151,11 +263,11 @@ class _Program:
             if v.index == 0:
                 continue
             gl.disableVertexAttribArray(v.index)
-        self.__win._prog = None
+        win._prog = None
 
     def compile(self, vert, frag):
         """Compile and link program"""
-        gl = self.__win.gl
+        gl = self.__group.gl
         # vert
         gl.shaderSource(self.__vertobj, vert)
         gl.compileShader(self.__vertobj)
@@ -198,10 +310,11 @@ class _Program:
                 texunit = 0
             self.uniforms[name] = UniformInfo(name, size, type, loc, texunit)
 
-    def set_uniform(self, name, value):
-        """Sets uniform `name` to `value`"""
-        gl = self.__win.gl
-        self.bind()
+    def set_uniform(self, name, value, win):
+        """Sets uniform `name` to `value` (binding the program in Window
+        `win`)"""
+        gl = self.__group.gl
+        self.bind(win)
         name, count, type, loc, texunit = self.uniforms[name]
         if type == GL_FLOAT:
             gl.uniform1fv(loc, count, value)
@@ -227,26 +340,182 @@ class _Program:
             gl.uniformMatrix4fv(loc, count, GL_FALSE, value)
         elif type == GL_SAMPLER_2D or type == GL_SAMPLER_CUBE:
             gl.activeTexture(GL_TEXTURE0 + texunit)
-            value.bind(self.__win)  # Bind texture
+            value.bind(win)  # Bind texture
             self.__textures[texunit] = value
             gl.uniform1i(loc, texunit)
 
 
-KeyEvent = collections.namedtuple('KeyEvent', 'type key')
-
-
-ButtonEvent = collections.namedtuple('ButtonEvent', 'type mouse button x y')
-
+class ContextGroup:
+    """GL objects shared by the windows of a context group.
+
+    Textures, buffers and programs are created once per group and drawn in
+    any of its windows. Per-context state (the current program, enabled
+    vertex attribs and texture bindings) stays with each Window."""
+
+    def __init__(self):
+        #: GL functions (of the first window)
+        self.gl = None
+        #: Number of bytes uploaded to buffers and textures (for profiling)
+        self.uploaded_bytes = 0
+        #: Frame number (incremented by after_step() of the group's first
+        #: window, so it counts frames of the group, not of each window)
+        self.frame = 0
+        #: Weak reference to the Window which advances `frame`
+        self.__frame_win = None
+        #: Bytes held by textures and buffers of this group
+        self.gpu_bytes = 0
+        #: If gpu_bytes exceeds this many bytes, resources which were not
+        #: bound in the last `evict_after` frames are evicted (least
+        #: recently bound first). None to disable.
+        self.gpu_budget = None
+        #: Number of frames a resource must be unused to be evicted
+        self.evict_after = 60
+        #: Mapping from id(resource) -> weakref, least recently bound first
+        self._gpu_lru = collections.OrderedDict()
+        #: Garbage queues
+        self._del_buffers = []
+        self._del_textures = []
+        self._del_shaders = []
+        self._del_programs = []
+        #: Max seconds after_step() spends deleting garbage (at least one
+        #: batch is deleted per frame, the rest is left for later frames)
+        self.delete_budget = 0.002
+        #: Max number of names kept in each of the buffer and texture pools
+        self.pool_size = 64
+        #: Buffer and texture names of dead handles, reused by new handles.
+        #: Their data stores are first shrunk to nothing by after_step()
+        #: (while queued in _orphan_*), so pooled names hold no memory.
+        self._pool_buffers = []
+        self._pool_textures = []
+        #: (target, name) of pooled names whose data store is not freed yet
+        self._orphan_buffers = []
+        self._orphan_textures = []
+        self.__compressed_formats = None
 
-MotionEvent = collections.namedtuple('MotionEvent', 'type mouse state x y '
-                                                    'relx rely')
+    @property
+    def compressed_formats(self):
+        """Set of compressed texture formats the driver supports (going by
+        its extensions)"""
+        if self.__compressed_formats is None:
+            extensions = self.gl.getString(GL_EXTENSIONS).split()
+            self.__compressed_formats = frozenset(
+                fmt for ext in extensions
+                for fmt in ktx.EXTENSION_FORMATS.get(ext, ()))
+        return self.__compressed_formats
+
+    def _create_buffer(self):
+        if self._pool_buffers:
+            return self._pool_buffers.pop()
+        return self.gl.createBuffer()
+
+    def _free_buffers(self, type, bufs):
+        n = max(0, min(len(bufs), self.pool_size - len(self._pool_buffers) -
+                       len(self._orphan_buffers)))
+        self._orphan_buffers.extend((type, x) for x in bufs[:n])
+        self._del_buffers.extend(bufs[n:])
+
+    def _create_texture(self):
+        if self._pool_textures:
+            return self._pool_textures.pop()
+        return self.gl.createTexture()
+
+    def _free_texture(self, target, tex, mipmapped):
+        # Respecifying level 0 would keep the other levels, so mipmapped
+        # textures are deleted
+        if not mipmapped and target == GL_TEXTURE_2D and \
+                len(self._pool_textures) + len(self._orphan_textures) < \
+                self.pool_size:
+            self._orphan_textures.append((target, tex))
+        else:
+            self._del_textures.append(tex)
+
+    def _gpu_track(self, res):
+        self._gpu_lru[id(res)] = weakref.ref(res)
+
+    def _gpu_untrack(self, res):
+        if self._gpu_lru.pop(id(res), None) is not None:
+            self.gpu_bytes -= res.nbytes
+
+    def _gpu_touch(self, res):
+        res.last_frame = self.frame
+        self._gpu_lru.move_to_end(id(res))
+
+    def _gpu_account(self, res, nbytes):
+        self.gpu_bytes += nbytes - res.nbytes
+        res.nbytes = nbytes
+
+    def evict(self, budget=0, unused=None):
+        """Evicts textures and buffers, least recently bound first, which
+        were not bound in the last `unused` frames (default: `evict_after`)
+        until at most `budget` bytes are held. Evicted resources are
+        uploaded again when next drawn. Returns number of bytes freed."""
+        if unused is None:
+            unused = self.evict_after
+        last_frame = self.frame - unused
+        start = self.gpu_bytes
+        for ref in list(self._gpu_lru.values()):
+            if self.gpu_bytes <= budget:
+                break
+            res = ref()
+            if res is None:
+                continue
+            if res.last_frame >= last_frame:
+                # The rest were bound more recently
+                break
+            if res.nbytes:
+                res.evict()
+        return start - self.gpu_bytes
+
+    def _step(self, win):
+        """Called by after_step() of Window `win` of the group, with its
+        context current"""
+        frame_win = (self.__frame_win() if self.__frame_win is not None
+                     else None)
+        if frame_win is None:
+            # First window stepped (or the previous one was destroyed)
+            self.__frame_win = weakref.ref(win)
+            frame_win = win
+        if win is frame_win:
+            self.frame += 1
+            if self.gpu_budget is not None and \
+                    self.gpu_bytes > self.gpu_budget:
+                self.evict(self.gpu_budget)
+        gl = self.gl
+        # Free the data stores of names entering the pools
+        for type, buf in self._orphan_buffers:
+            gl.bindBuffer(type, buf)
+            gl.bufferData(type, b'', GL_STATIC_DRAW)
+            self._pool_buffers.append(buf)
+        self._orphan_buffers.clear()
+        for target, tex in self._orphan_textures:
+            gl.bindTexture(target, tex)
+            gl.texImage2D(target, 0, GL_RGBA, 1, 1, 0, GL_RGBA,
+                          GL_UNSIGNED_BYTE, bytes(4))
+            self._pool_textures.append(tex)
+        self._orphan_textures.clear()
+        # Cleanup garbage
+        deadline = time.perf_counter() + self.delete_budget
+        # Batched glDeleteTextures/glDeleteBuffers where the binding has
+        # them, else one call per name
+        queues = ((self._del_programs, gl.deleteProgram, None),
+                  (self._del_shaders, gl.deleteShader, None),
+                  (self._del_textures, gl.deleteTexture,
+                   getattr(gl, 'deleteTextures', None)),
+                  (self._del_buffers, gl.deleteBuffer,
+                   getattr(gl, 'deleteBuffers', None)))
+        for queue, delete, delete_many in queues:
+            if not garbage.flush(queue, delete, deadline, delete_many):
+                break
 
 
 class Window:
     _quad_elemid = None
 
+    #: Weak reference to the Window whose context is current
+    _current = None
+
     def __init__(self, title, w, h, near=None, far=None, max_quads=None,
-                 resizable=True):
+                 resizable=True, share=None):
         #: Window title
         self.__title = str(title)
         #: Window width
@@ -279,6 +548,8 @@ class Window:
         self.quit = False
         #: SDL Event Data
         self.__ev = SDL_Event()
+        #: Swap interval (0: immediate, 1: vsync, -1: adaptive vsync)
+        self.__swap_interval = None
         # Init SDL
         SDL_InitSubSystem(SDL_INIT_VIDEO)
         SDL_GL_SetAttribute(SDL_GL_CONTEXT_MAJOR_VERSION, 2)
@@ -295,9 +566,20 @@ class Window:
                                       self.w, self.h,
                                       flags)
         # Init SDL OpenGL Context
+        if share is not None:
+            # Share objects with the context of Window `share`
+            share.make_current()
+            SDL_GL_SetAttribute(SDL_GL_SHARE_WITH_CURRENT_CONTEXT, 1)
+        else:
+            SDL_GL_SetAttribute(SDL_GL_SHARE_WITH_CURRENT_CONTEXT, 0)
         self.__glctx = SDL_GL_CreateContext(self.__win)
+        Window._current = weakref.ref(self)
         # Load OpenGL functions
         self.gl = GL(SDL_GL_GetProcAddress)
+        #: ContextGroup of the window
+        self.group = share.group if share is not None else ContextGroup()
+        if self.group.gl is None:
+            self.group.gl = self.gl
         #: Quad Element Buffer data
         self._quad_elemdata = array.array('H')
         if max_quads is None:
@@ -317,11 +599,42 @@ class Window:
         # Orthographic projection matrix
         self.ortho_mat = mat4.create()
         self.__resize_viewport(self.w, self.h)
-        #: Garbage queues
-        self._del_buffers = []
-        self._del_textures = []
-        self._del_shaders = []
-        self._del_programs = []
+
+    uploaded_bytes = property(lambda x: x.group.uploaded_bytes)
+
+    frame = property(lambda x: x.group.frame)
+
+    gpu_bytes = property(lambda x: x.group.gpu_bytes)
+
+    @property
+    def gpu_budget(self):
+        return self.group.gpu_budget
+
+    @gpu_budget.setter
+    def gpu_budget(self, v):
+        self.group.gpu_budget = v
+
+    @property
+    def evict_after(self):
+        return self.group.evict_after
+
+    @evict_after.setter
+    def evict_after(self, v):
+        self.group.evict_after = v
+
+    def evict(self, budget=0, unused=None):
+        """Evicts unused resources of the window's ContextGroup (see
+        ContextGroup.evict())"""
+        return self.group.evict(budget, unused)
+
+    def make_current(self):
+        """Makes the window's GL context current (if it is not)"""
+        current = Window._current
+        if current is not None and current() is self:
+            return
+        if SDL_GL_MakeCurrent(self.__win, self.__glctx) < 0:
+            raise ValueError(SDL_GetError())
+        Window._current = weakref.ref(self)
 
     def __del__(self):
         if self._quad_elemid:
@@ -337,6 +650,22 @@ class Window:
         SDL_SetWindowTitle(self.__win, '{0} (FPS:{1})'.format(v, self.__fps))
         self.__title = v
 
+    @property
+    def swap_interval(self):
+        return self.__swap_interval
+
+    @swap_interval.setter
+    def swap_interval(self, v):
+        v = int(v)
+        if SDL_GL_SetSwapInterval(v) < 0:
+            if v != -1:
+                raise ValueError(SDL_GetError())
+            # Adaptive vsync is not supported, fall back to vsync
+            v = 1
+            if SDL_GL_SetSwapInterval(v) < 0:
+                raise ValueError(SDL_GetError())
+        self.__swap_interval = v
+
     def __resize_viewport(self, winw, winh):
         if winw > winh:
             h = min(winw / self.w * self.h, winh)
@@ -362,6 +691,7 @@ class Window:
             self.__resize_viewport(win.data1, win.data2)
 
     def before_step(self):
+        self.make_current()
         self.events.clear()
         while SDL_PollEvent(self.__ev):
             if self.__ev.type == SDL_WINDOWEVENT:
@@ -395,20 +725,7 @@ class Window:
         self.gl.clear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
     def after_step(self):
-        # Cleanup garbage
-        gl = self.gl
-        for x in self._del_programs:
-            gl.deleteProgram(x)
-        self._del_programs.clear()
-        for x in self._del_shaders:
-            gl.deleteShader(x)
-        self._del_shaders.clear()
-        for x in self._del_textures:
-            gl.deleteTexture(x)
-        self._del_textures.clear()
-        for x in self._del_buffers:
-            gl.deleteBuffer(x)
-        self._del_buffers.clear()
+        self.group._step(self)
         SDL_GL_SwapWindow(self.__win)
         # FPS Count
         self.__frames += 1
@@ -421,22 +738,67 @@ class Window:
                                '{0} (FPS:{1})'.format(self.title, self.__fps))
             SDL_Log('FPS: %d', self.__fps)
 
-    def read_pixels(self):
-        """Read current pixels. Returns bytearray"""
-        out = bytearray(self._viewportw * self._viewporth * 3)
-        self.gl.readPixels(self._viewportx, self._viewporty, self._viewportw,
-                           self._viewporth, GL_RGB, GL_UNSIGNED_BYTE, out)
-        # Flip image
-        m = memoryview(out)
-        tmp = bytearray(self._viewportw * 3)
-        for y in range(self._viewporth // 2):
-            src = m[y*self._viewportw*3:(y+1)*self._viewportw*3]
-            tmp[:] = src
-            y = self._viewporth - y
-            dst = m[(y-1)*self._viewportw*3:y*self._viewportw*3]
-            src[:] = dst
-            dst[:] = tmp
-        return self._viewportw, self._viewporth, out
+    def read_pixels(self, out=None, x=0, y=0, w=None, h=None, fmt=GL_RGB,
+                    flip=True):
+        """Reads pixels of the (`x`, `y`, `w`, `h`) rect of the viewport
+        (default: all of it) into `out`.
+
+        `x` and `y` are measured from the top left of the viewport. `fmt` is
+        GL_RGB or GL_RGBA. If `out` is None a new bytearray is allocated,
+        otherwise it must be a writable buffer of at least w * h * comp
+        bytes. Rows are flipped to top-down order (in place) unless `flip`
+        is False (then they are bottom-up, as OpenGL returns them).
+
+        GL pads rows to 4 bytes (GL_PACK_ALIGNMENT), so GL_RGB rects whose
+        rows are not a multiple of 4 bytes are read through a temporary
+        buffer.
+
+        Returns (w, h, memoryview of the pixels in `out`)."""
+        if w is None:
+            w = self._viewportw - x
+        if h is None:
+            h = self._viewporth - y
+        if fmt == GL_RGB:
+            comp = 3
+        elif fmt == GL_RGBA:
+            comp = 4
+        else:
+            raise ValueError('fmt must be GL_RGB or GL_RGBA')
+        if w < 0 or h < 0 or x < 0 or y < 0 or \
+                x + w > self._viewportw or y + h > self._viewporth:
+            raise ValueError('rect is outside the viewport')
+        stride = w * comp
+        size = stride * h
+        if out is None:
+            out = bytearray(size)
+        m = memoryview(out).cast('B')
+        if len(m) < size:
+            raise ValueError('out is too small')
+        m = m[:size]
+        glx = self._viewportx + x
+        gly = self._viewporty + self._viewporth - y - h
+        pitch = (stride + 3) & ~3
+        if pitch != stride:
+            # Copy the padded rows (flipping them on the way)
+            tmp = bytearray(pitch * h)
+            self.gl.readPixels(glx, gly, w, h, fmt, GL_UNSIGNED_BYTE, tmp)
+            for i in range(h):
+                j = h - 1 - i if flip else i
+                m[i * stride:(i + 1) * stride] = \
+                    tmp[j * pitch:j * pitch + stride]
+            return w, h, m
+        self.gl.readPixels(glx, gly, w, h, fmt, GL_UNSIGNED_BYTE, m)
+        if flip:
+            # Swap row pairs through one row of scratch
+            tmp = bytearray(stride)
+            for i in range(h // 2):
+                a = m[i * stride:(i + 1) * stride]
+                j = h - 1 - i
+                b = m[j * stride:(j + 1) * stride]
+                tmp[:] = a
+                a[:] = b
+                b[:] = tmp
+        return w, h, m
 
 
 class Texture2:
@@ -444,9 +806,23 @@ class Texture2:
 
     step = 1
 
-    def __init__(self, w, h, data):
+    def __init__(self, w, h, data, min_filter=None, mag_filter=GL_NEAREST,
+                 wrap_s=GL_CLAMP_TO_EDGE, wrap_t=GL_CLAMP_TO_EDGE,
+                 mipmap=False):
         #: Texture handles
         self.__tex = weakref.WeakKeyDictionary()
+        #: Generate mipmaps on upload (w and h must be powers of two)
+        self.mipmap = mipmap
+        if min_filter is None:
+            min_filter = GL_LINEAR_MIPMAP_LINEAR if mipmap else GL_NEAREST
+        #: Minification filter (default: GL_LINEAR_MIPMAP_LINEAR with
+        #: mipmaps, else GL_NEAREST)
+        self.min_filter = min_filter
+        #: Magnification filter
+        self.mag_filter = mag_filter
+        #: Wrap modes
+        self.wrap_s = wrap_s
+        self.wrap_t = wrap_t
         # Upload
         self.set_data(w, h, data)
 
@@ -458,19 +834,51 @@ class Texture2:
 
     def bind(self, win):
         gl = win.gl
-        if win in self.__tex:
-            tex = self.__tex[win]
+        group = win.group
+        if group in self.__tex:
+            tex = self.__tex[group]
         else:
-            tex = self.__tex[win] = _Texture(win, GL_TEXTURE_2D)
+            tex = self.__tex[group] = _Texture(group, GL_TEXTURE_2D)
         tex.bind()
         if tex.update:
-            tex.texImage2D(GL_TEXTURE_2D, self.__w, self.__h, self.__fmt,
-                           self.__data)
+            self._upload(tex)
             tex.update = False
-        gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
-        gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            tex.dirty = None
+        elif tex.dirty is not None:
+            x0, y0, x1, y1 = tex.dirty
+            tex.texSubImage2D(GL_TEXTURE_2D, x0, y0, x1 - x0, y1 - y0,
+                              self.__fmt, self.__rect(x0, y0, x1, y1))
+            if self.mipmap:
+                tex.generate_mipmap()
+            tex.dirty = None
+        # Only set sampler state when it changed
+        params = (self.min_filter, self.mag_filter, self.wrap_s, self.wrap_t)
+        if tex.params != params:
+            gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, params[0])
+            gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, params[1])
+            gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, params[2])
+            gl.texParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, params[3])
+            tex.params = params
+
+    def _upload(self, tex):
+        """Uploads all of `data` to _Texture `tex`"""
+        tex.texImage2D(GL_TEXTURE_2D, self.__w, self.__h, self.__fmt,
+                       self.__data)
+        if self.mipmap:
+            tex.generate_mipmap()
+
+    def __rect(self, x0, y0, x1, y1):
+        """Returns pixels of rect as rows padded to 4 bytes (the default
+        GL_UNPACK_ALIGNMENT)"""
+        comp = 4 if self.__fmt == GL_RGBA else 3
+        stride = self.__w * comp
+        view = memoryview(self.__data).cast('B')
+        if x0 == 0 and x1 == self.__w and not stride % 4:
+            # Full rows are contiguous
+            return view[y0 * stride:y1 * stride]
+        pad = bytes(-(x1 - x0) * comp % 4)
+        return b''.join([view[y * stride + x0 * comp:y * stride + x1 * comp]
+                         .tobytes() + pad for y in range(y0, y1)])
 
     def set_data(self, w, h, data):
         # Validate data
@@ -483,6 +891,12 @@ class Texture2:
             fmt = GL_RGBA
         else:
             raise ValueError('Invalid data size')
+        if self.mipmap and (w & (w - 1) or h & (h - 1)):
+            raise ValueError('Mipmapped texture size must be powers of two')
+        self._store(w, h, data, fmt)
+
+    def _store(self, w, h, data, fmt):
+        """Replaces the texture data (uploaded on next bind())"""
         for tex in self.__tex.values():
             tex.update = True
         self.__w = w
@@ -490,11 +904,80 @@ class Texture2:
         self.__data = data
         self.__fmt = fmt
 
+    def mark_dirty(self, x, y, w, h):
+        """Marks the (`x`, `y`, `w`, `h`) rect of `data` as modified in
+        place. Only the rect is uploaded on the next bind()."""
+        if x < 0 or y < 0 or x + w > self.__w or y + h > self.__h:
+            raise ValueError('rect is outside the texture')
+        if w <= 0 or h <= 0:
+            return
+        x1 = x + w
+        y1 = y + h
+        for tex in self.__tex.values():
+            if tex.update:
+                continue
+            if tex.dirty is None:
+                tex.dirty = (x, y, x1, y1)
+            else:
+                dx0, dy0, dx1, dy1 = tex.dirty
+                tex.dirty = (min(dx0, x), min(dy0, y), max(dx1, x1),
+                             max(dy1, y1))
+
+
+class CompressedTexture2(Texture2):
+    """Texture2 of compressed data (e.g. ETC1) in format
+    `internal_format`, which must be in the ContextGroup's
+    `compressed_formats`.
+
+    `levels` is a list of the data of each mip level, level 0 first. It is
+    passed to GL as is, so memoryviews into a mapped file (see
+    from_ktx()) are uploaded without copying. Mipmaps cannot be generated
+    and the texture cannot be updated in part."""
+
+    def __init__(self, w, h, internal_format, levels, **kwargs):
+        if kwargs.get('mipmap'):
+            raise ValueError('Cannot generate mipmaps of compressed '
+                             'textures')
+        if kwargs.get('min_filter') is None and len(levels) > 1:
+            kwargs['min_filter'] = GL_LINEAR_MIPMAP_LINEAR
+        self.__internal_format = internal_format
+        super().__init__(w, h, levels, **kwargs)
+
+    @classmethod
+    def from_ktx(cls, ktx, **kwargs):
+        """Returns CompressedTexture2 of the levels of ktx.KTX `ktx`.
+
+        The texture holds its own views of the levels (uploaded again after
+        eviction), so `ktx` may be closed."""
+        if not ktx.compressed:
+            raise ValueError('KTX data is not compressed')
+        return cls(ktx.w, ktx.h, ktx.internal_format,
+                   [memoryview(data) for w, h, data in ktx.levels],
+                   **kwargs)
+
+    internal_format = property(lambda x: x.__internal_format)
+
+    def set_data(self, w, h, levels):
+        if not levels:
+            raise ValueError('No mip levels')
+        self._store(w, h, list(levels), self.__internal_format)
+
+    def _upload(self, tex):
+        w, h = self.w, self.h
+        for level, data in enumerate(self.data):
+            tex.compressedTexImage2D(GL_TEXTURE_2D, level,
+                                     self.__internal_format, w, h, data)
+            w = max(1, w // 2)
+            h = max(1, h // 2)
+
+    def mark_dirty(self, x, y, w, h):
+        raise ValueError('Compressed textures cannot be updated in part')
+
 
 class Tileset(Texture2):
     def __init__(self, w, h, data, tilew=0, tileh=0,
-                 num_frames=1, step=1):
-        super().__init__(w, h, data)
+                 num_frames=1, step=1, **kwargs):
+        super().__init__(w, h, data, **kwargs)
         #: Number of frames in tileset
         self.num_frames = num_frames
         #: Steps for each frame
@@ -548,23 +1031,24 @@ class Program:
     uniforms = property(lambda x: x.__uniforms)
 
     def __get_prog(self, win):
-        if win in self.__prog:
-            prog = self.__prog[win]
+        group = win.group
+        if group in self.__prog:
+            prog = self.__prog[group]
         else:
-            prog = self.__prog[win] = _Program(win)
+            prog = self.__prog[group] = _Program(group)
         if prog.update_compile:
             prog.compile(self.__vert, self.__frag)
             prog.update_compile = False
         if prog.update_uniforms:
             for k, v in self.__uniforms.items():
-                prog.set_uniform(k, v)
+                prog.set_uniform(k, v, win)
             prog.update_uniforms = False
         return prog
 
     def bind(self, win):
         gl = win.gl
         prog = self.__get_prog(win)
-        prog.bind()
+        prog.bind(win)
         # Depth check
         if self.depth_check:
             gl.enable(GL_DEPTH_TEST)
@@ -647,21 +1131,23 @@ class Geom:
         self.__update = True
 
     def __get_vertbuf(self, win):
-        if win in self.__vertbuf:
-            vertbuf = self.__vertbuf[win]
+        group = win.group
+        if group in self.__vertbuf:
+            vertbuf = self.__vertbuf[group]
         else:
-            vertbuf = self.__vertbuf[win] = _Buffer(win, GL_ARRAY_BUFFER)
+            vertbuf = self.__vertbuf[group] = _Buffer(group, GL_ARRAY_BUFFER)
         if vertbuf.update:
             vertbuf.set_data(self.vertdata, GL_STATIC_DRAW)
             vertbuf.update = False
         return vertbuf
 
     def __get_elembuf(self, win):
-        if win in self.__elembuf:
-            elembuf = self.__elembuf[win]
+        group = win.group
+        if group in self.__elembuf:
+            elembuf = self.__elembuf[group]
         else:
-            elembuf = self.__elembuf[win] = _Buffer(win,
-                                                    GL_ELEMENT_ARRAY_BUFFER)
+            elembuf = self.__elembuf[group] = _Buffer(
+                group, GL_ELEMENT_ARRAY_BUFFER)
         if elembuf.update:
             elembuf.set_data(self.elemdata, GL_STATIC_DRAW)
             elembuf.update = False
@@ -749,10 +1235,42 @@ class Tri3Geom(Geom):
 
     prim = property(lambda x: GL_TRIANGLES)
 
-    vertdata = property(lambda x: x.__vertdata)
+    @property
+    def vertdata(self):
+        """Vertex data (3 verts per tri).
+
+        Setting it replaces all tris. It can be set to any float buffer
+        (e.g. a memoryview into a bigger array), but then tris can no
+        longer be added or deleted."""
+        return self.__vertdata
+
+    @vertdata.setter
+    def vertdata(self, v):
+        self.__free.clear()
+        self.__vertdata = v
+        self.__update = True
 
     elemdata = property(lambda x: None)
 
+    def mark_dirty(self, first, count):
+        """Marks `count` verts starting at vert `first` as changed.
+
+        Unlike the other setters, only that span of the vertex data is
+        uploaded on the next draw (as long as the vertex data did not change
+        size)."""
+        if count <= 0:
+            return
+        nbytes = self.num_floats * memoryview(self.__vertdata).itemsize
+        start = first * nbytes
+        end = (first + count) * nbytes
+        for x in self.__vertbuf.values():
+            if x.update:
+                continue
+            if x.dirty is not None:
+                start = min(start, x.dirty[0])
+                end = max(end, x.dirty[1])
+            x.dirty = (start, end)
+
     def _get_tri3(self, index):
         """Returns (A, B, C) memoryviews of the 3 verts of tri `index`"""
         v = memoryview(self.__vertdata)
@@ -812,16 +1330,30 @@ class Tri3Geom(Geom):
         self.__update = False
 
     def __get_vertbuf(self, win):
-        if win in self.__vertbuf:
-            vertbuf = self.__vertbuf[win]
+        group = win.group
+        if group in self.__vertbuf:
+            vertbuf = self.__vertbuf[group]
         else:
-            vertbuf = self.__vertbuf[win] = _Buffer(win, GL_ARRAY_BUFFER, 2)
+            vertbuf = self.__vertbuf[group] = _Buffer(group,
+                                                      GL_ARRAY_BUFFER, 2)
+        if vertbuf.dirty is not None:
+            v = memoryview(self.__vertdata).cast('B')
+            start, end = vertbuf.dirty
+            if v.nbytes != vertbuf.size:
+                vertbuf.update = True
+            elif not vertbuf.update:
+                vertbuf.set_sub_data(start, v[start:end])
+                vertbuf.dirty = None
         if vertbuf.update:
             vertbuf.set_data(self.__vertdata, GL_DYNAMIC_DRAW)
             vertbuf.update = False
         return vertbuf
 
-    def draw(self, win, prog):
+    def draw(self, win, prog, ranges=None):
+        """Draws geometry.
+
+        If `ranges` is given, only the tris in the (first, count) tri index
+        ranges are drawn."""
         if self.__update:
             self.update()
         gl = win.gl
@@ -834,8 +1366,12 @@ class Tri3Geom(Geom):
             size, type, normalized, stride, offset = self.vertptrs[k]
             gl.vertexAttribPointer(info.index, size, type, normalized, stride,
                                    offset)
-        gl.drawArrays(GL_TRIANGLES, 0,
-                      len(self.__vertdata) // self.num_floats)
+        if ranges is None:
+            gl.drawArrays(GL_TRIANGLES, 0,
+                          len(self.__vertdata) // self.num_floats)
+        else:
+            for first, count in ranges:
+                gl.drawArrays(GL_TRIANGLES, first * 3, count * 3)
 
     # tri2 interface
 
@@ -930,6 +1466,9 @@ class Quad2Geom(Geom):
         assert self.__num_floats >= 4
         #: Free indices
         self.__free = []
+        #: Change listeners, called with ('SET', index), ('DEL', index) or
+        #: ('CLEAR', None) (all quads were removed or replaced)
+        self.listeners = []
         #: Vertex data
         self.__vertdata = array.array('f')
         #: Vertex buffer
@@ -949,6 +1488,23 @@ class Quad2Geom(Geom):
 
     num_floats = property(lambda x: x.__num_floats)
 
+    @property
+    def vertdata(self):
+        """Vertex data (4 verts per quad).
+
+        Setting it replaces all quads. It can be set to any float buffer
+        (e.g. a memoryview into a bigger array), but then quads can no
+        longer be added or deleted."""
+        return self.__vertdata
+
+    @vertdata.setter
+    def vertdata(self, v):
+        self.__free.clear()
+        self.__vertdata = v
+        self.__update = True
+        for f in self.listeners:
+            f('CLEAR', None)
+
     def _get_quad2(self, index):
         """Returns views of the 4 vertices of quad `index` (A, B, C, D)"""
         v = memoryview(self.__vertdata)
@@ -978,6 +1534,8 @@ class Quad2Geom(Geom):
         C[0], C[1], C[2], C[3] = cX, cY, cU, cV
         D[0], D[1], D[2], D[3] = dX, dY, dU, dV
         self.__update = True
+        for f in self.listeners:
+            f('SET', index)
 
     def add_quad2(self, *args, **kwargs):
         index = self._alloc_quad2()
@@ -997,11 +1555,15 @@ class Quad2Geom(Geom):
         # Add to free list
         self.__free.append(index)
         self.__update = True
+        for f in self.listeners:
+            f('DEL', index)
 
     def clear(self):
         self.__free.clear()
         del self.__vertdata[:]
         self.__update = True
+        for f in self.listeners:
+            f('CLEAR', None)
 
     def update(self):
         for x in self.__vertbuf.values():
@@ -1009,16 +1571,21 @@ class Quad2Geom(Geom):
         self.__update = False
 
     def __get_vertbuf(self, win):
-        if win in self.__vertbuf:
-            vertbuf = self.__vertbuf[win]
+        group = win.group
+        if group in self.__vertbuf:
+            vertbuf = self.__vertbuf[group]
         else:
-            vertbuf = self.__vertbuf[win] = _Buffer(win, GL_ARRAY_BUFFER, 2)
+            vertbuf = self.__vertbuf[group] = _Buffer(group,
+                                                      GL_ARRAY_BUFFER, 2)
         if vertbuf.update:
             vertbuf.set_data(self.__vertdata, GL_DYNAMIC_DRAW)
         return vertbuf
 
-    def draw(self, win, prog):
-        """Draw geometry"""
+    def draw(self, win, prog, ranges=None):
+        """Draw geometry.
+
+        If `ranges` is given, only the quads in the (first, count) quad index
+        ranges are drawn."""
         if self.__update:
             self.update()
         gl = win.gl
@@ -1034,6 +1601,11 @@ class Quad2Geom(Geom):
         # Bind element buffer
         gl.bindBuffer(GL_ELEMENT_ARRAY_BUFFER, win._quad_elemid)
         # Draw elements
-        gl.drawElements(GL_TRIANGLES,
-                        len(self.__vertdata) // self.__num_floats // 4 * 6,
-                        GL_UNSIGNED_SHORT, 0)
+        if ranges is None:
+            count = len(self.__vertdata) // self.__num_floats // 4 * 6
+            gl.drawElements(GL_TRIANGLES, count, GL_UNSIGNED_SHORT, 0)
+        else:
+            itemsize = win._quad_elemdata.itemsize
+            for first, count in ranges:
+                gl.drawElements(GL_TRIANGLES, count * 6, GL_UNSIGNED_SHORT,
+                                first * 6 * itemsize)
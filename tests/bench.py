@@ -0,0 +1,307 @@
+"""Microbenchmarks of ngk.
+
+Run with::
+
+    python -m tests.bench [-o results.json] [-b baseline.json]
+
+With a baseline, exits with status 1 if any benchmark regressed by more
+than the threshold. Benchmarks that need ngk.vid are skipped if it cannot
+be imported, and the window benchmarks are skipped if no window can be
+created (set SDL_VIDEODRIVER to run them headless)."""
+import argparse
+import fnmatch
+import json
+import math
+import sys
+import timeit
+from ngk import bhv, mat4, quat, vec3
+try:
+    from ngk import vid
+except ImportError:
+    vid = None
+
+
+#: List of (name, unit, higher_is_better, func, needs). `func` returns the
+#: measured value in `unit`. `needs` is None, 'vid' or 'window'.
+BENCHMARKS = []
+
+
+def bench(name, unit='ops/s', higher_is_better=True, needs=None):
+    def decorator(f):
+        BENCHMARKS.append((name, unit, higher_is_better, f, needs))
+        return f
+    return decorator
+
+
+def rate(f, repeat=3):
+    """Returns best calls of `f` per second"""
+    timer = timeit.Timer(f)
+    number, t = timer.autorange()
+    best = min([t] + timer.repeat(repeat - 1, number))
+    return number / best
+
+
+# Math
+
+@bench('math.mat4_multiply')
+def _():
+    a, b, out = mat4.create(), mat4.create(), mat4.create()
+    mat4.translate(a, a, (1, 2, 3))
+    return rate(lambda: mat4.multiply(out, a, b))
+
+
+@bench('math.mat4_invert')
+def _():
+    a, out = mat4.create(), mat4.create()
+    mat4.translate(a, a, (1, 2, 3))
+    return rate(lambda: mat4.invert(out, a))
+
+
+@bench('math.mat4_from_rotation_translation_scale')
+def _():
+    out = mat4.create()
+    return rate(lambda: mat4.from_rotation_translation_scale(
+        out, (0, 0, 0, 1), (1, 2, 3), (1, 1, 1)))
+
+
+@bench('math.vec3_transform_mat4')
+def _():
+    m, v, out = mat4.create(), vec3.create(1, 2, 3), vec3.create()
+    return rate(lambda: vec3.transform_mat4(out, v, m))
+
+
+@bench('math.quat_slerp')
+def _():
+    a, b, out = quat.create(), quat.create(), quat.create()
+    quat.rotate_y(b, b, 1.0)
+    return rate(lambda: quat.slerp(out, a, b, 0.3))
+
+
+# Geoms
+
+QUAD = (-1.0, -1.0, 0.0, 1.0, 0.0, -1.0, 1.0, 1.0,
+        0.0, 1.0, 1.0, 0.0, -1.0, 1.0, 0.0, 0.0)
+
+TRI = (-1.0, -1.0, 0.1, 0.0, 0.0, 1.0, 0.0, 1.0,
+       0.0, -1.0, 0.2, 0.0, 0.0, 1.0, 1.0, 1.0,
+       -0.5, 1.0, 0.4, 0.0, 0.0, 1.0, 0.5, 0.0)
+
+
+def _geom_rates(geom, add, set, delete, n=1000):
+    """Returns (add, set, del) items per second"""
+    def do_add():
+        geom.clear()
+        for i in range(n):
+            add(*args)
+    args = QUAD if add.__name__ == 'add_quad2' else TRI
+    out = [rate(do_add) * n]
+    out.append(rate(lambda: [set(i, *args) for i in range(n)]) * n)
+
+    def do_del():
+        for i in range(n):
+            delete(i)
+        for i in range(n):
+            add(*args)
+    # Deleting costs about as much as adding the item back (measured above)
+    t = 1 / (rate(do_del) * n) - 1 / out[0]
+    out.append(1 / t if t > 0 else math.inf)
+    return out
+
+
+def _geom_bench(cls_name, kind):
+    results = {}
+
+    def run():
+        if not results:
+            geom = getattr(vid, cls_name)()
+            add = getattr(geom, 'add_' + kind)
+            results['add'], results['set'], results['del'] = _geom_rates(
+                geom, add, getattr(geom, 'set_' + kind),
+                getattr(geom, 'del_' + kind))
+        return results
+    for op in ('add', 'set', 'del'):
+        bench('geom.{0}_{1}'.format(kind, op), kind + 's/s',
+              needs='vid')(lambda op=op: run()[op])
+
+
+_geom_bench('Quad2Geom', 'quad2')
+_geom_bench('Tri3Geom', 'tri3')
+
+
+# Behaviors
+
+def _ticker():
+    while True:
+        yield
+
+
+def _bhv_bench(n):
+    @bench('bhv.parallel_{0}'.format(n), 'behaviors/s')
+    def _():
+        it = bhv.parallel(*[_ticker() for i in range(n)])
+        return rate(lambda: next(it)) * n
+
+
+for _n in (10, 1000, 100000):
+    _bhv_bench(_n)
+
+
+# Window
+
+_win = None
+
+
+def _window():
+    global _win
+    if _win is None:
+        _win = vid.Window('bench', 160, 120, resizable=False)
+    return _win
+
+
+VERTSRC = r'''
+attribute vec3 aPos;
+attribute vec2 aUV;
+varying highp vec2 vUV;
+void main() {
+    gl_Position = vec4(aPos, 1.0);
+    vUV = aUV;
+}
+'''
+
+FRAGSRC = r'''
+varying highp vec2 vUV;
+void main() {
+    gl_FragColor = vec4(vUV, 0.0, 1.0);
+}
+'''
+
+
+def _upload_per_frame(mark_dirty):
+    win = _window()
+    prog = vid.Program(VERTSRC, FRAGSRC)
+    geom = vid.Tri3Geom()
+    for i in range(1000):
+        geom.add_tri3(*TRI)
+    geom.draw(win, prog)
+    frames = 10
+    start = win.uploaded_bytes
+    for frame in range(frames):
+        for i in range(10):
+            if mark_dirty:
+                A, B, C = geom._get_tri3(i)
+                A[0] = frame
+                geom.mark_dirty(i * 3, 3)
+            else:
+                geom.set_tri3(i, *TRI)
+        geom.draw(win, prog)
+    win.gl.finish()
+    return (win.uploaded_bytes - start) / frames
+
+
+@bench('win.upload_set_tri3_10_of_1000', 'bytes/frame', False, 'window')
+def _():
+    return _upload_per_frame(False)
+
+
+@bench('win.upload_mark_dirty_10_of_1000', 'bytes/frame', False, 'window')
+def _():
+    return _upload_per_frame(True)
+
+
+@bench('win.draw_quad2', 'draws/s', needs='window')
+def _():
+    win = _window()
+    prog = vid.Program(VERTSRC.replace('vec3 aPos', 'vec2 aPos')
+                       .replace('vec4(aPos, 1.0)', 'vec4(aPos, 0.0, 1.0)'),
+                       FRAGSRC)
+    geom = vid.Quad2Geom()
+    for i in range(100):
+        geom.add_quad2(*QUAD)
+
+    def draw():
+        for i in range(100):
+            geom.draw(win, prog)
+        win.gl.finish()
+    return rate(draw) * 100
+
+
+def run(pattern='*', log=None):
+    """Runs benchmarks matching `pattern`. Returns results dict."""
+    results = {}
+    window_ok = None
+    for name, unit, higher_is_better, f, needs in BENCHMARKS:
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        skip = None
+        if needs and vid is None:
+            skip = 'ngk.vid not importable'
+        elif needs == 'window':
+            if window_ok is None:
+                try:
+                    _window()
+                    window_ok = True
+                except Exception as e:
+                    window_ok = False
+                    window_error = e
+            if not window_ok:
+                skip = 'no window ({0})'.format(window_error)
+        if skip:
+            if log:
+                log('{0:45} skipped: {1}'.format(name, skip))
+            continue
+        value = f()
+        results[name] = {'value': value, 'unit': unit,
+                         'higher_is_better': higher_is_better}
+        if log:
+            log('{0:45} {1:14.6g} {2}'.format(name, value, unit))
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Returns list of (name, old, new) benchmarks which regressed by more
+    than `threshold` (fraction) compared to `baseline`"""
+    out = []
+    for name, res in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        old = base['value']
+        new = res['value']
+        if res['higher_is_better']:
+            regressed = new < old * (1 - threshold)
+        else:
+            regressed = new > old * (1 + threshold)
+        if regressed:
+            out.append((name, old, new))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.bench',
+                                     description='Runs ngk benchmarks')
+    parser.add_argument('-k', '--pattern', default='*',
+                        help='only run benchmarks matching glob pattern')
+    parser.add_argument('-o', '--output', help='save results to JSON file')
+    parser.add_argument('-b', '--baseline',
+                        help='compare against JSON results file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+                        help='allowed regression (default: 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    results = run(args.pattern, print)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print('REGRESSION {0}: {1:.6g} -> {2:.6g}'.format(name, old,
+                                                              new))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Render test harness: image comparison against reference images and a
+parallel test runner.
+
+Run the render tests in parallel worker processes with::
+
+    python -m tests.harness [-j N] [tests.testvid ...]
+"""
+import argparse
+import collections
+import concurrent.futures
+import io
+import math
+import operator
+import os
+import sys
+import unittest
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+root = os.path.dirname(__file__)
+
+
+#: Result of diff(): mean squared error, peak signal to noise ratio (dB,
+#: inf if equal), max absolute error of any channel, and bounding box
+#: (x0, y0, x1, y1) (exclusive) of changed pixels, or None
+Diff = collections.namedtuple('Diff', 'mse psnr max_error bbox')
+
+
+def _psnr(mse):
+    return math.inf if not mse else 10 * math.log10(255 * 255 / mse)
+
+
+def diff(a, b, w, h, comp):
+    """Compares 8-bit images `a` and `b` of `w` x `h` pixels with `comp`
+    channels. Returns Diff."""
+    n = w * h * comp
+    if len(a) != n or len(b) != n:
+        raise ValueError('Len does not match')
+    if not n:
+        return Diff(0.0, math.inf, 0, None)
+    if numpy is not None:
+        np = numpy
+        d = (np.frombuffer(a, np.uint8).astype(np.int64) -
+             np.frombuffer(b, np.uint8))
+        mse = float(np.dot(d, d)) / n
+        d = np.abs(d).reshape(h, w, comp)
+        max_error = int(d.max())
+        if not max_error:
+            return Diff(0.0, math.inf, 0, None)
+        changed = d.any(axis=2)
+        ys = np.flatnonzero(changed.any(axis=1))
+        xs = np.flatnonzero(changed.any(axis=0))
+        bbox = (int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1)
+        return Diff(mse, _psnr(mse), max_error, bbox)
+    # Skip equal rows with bulk compares, diff the others with map()
+    a = memoryview(a).cast('B')
+    b = memoryview(b).cast('B')
+    stride = w * comp
+    sq = 0
+    max_error = 0
+    x0 = w
+    x1 = y0 = y1 = 0
+    for y in range(h):
+        ra = a[y * stride:(y + 1) * stride]
+        rb = b[y * stride:(y + 1) * stride]
+        if ra == rb:
+            continue
+        d = list(map(operator.sub, ra, rb))
+        sq += sum(map(operator.mul, d, d))
+        max_error = max(max_error, max(map(abs, d)))
+        first = next(i for i, v in enumerate(d) if v)
+        last = stride - next(i for i, v in enumerate(reversed(d)) if v)
+        x0 = min(x0, first // comp)
+        x1 = max(x1, (last - 1) // comp + 1)
+        if not y1:
+            y0 = y
+        y1 = y + 1
+    if not max_error:
+        return Diff(0.0, math.inf, 0, None)
+    mse = sq / n
+    return Diff(mse, _psnr(mse), max_error, (x0, y0, x1, y1))
+
+
+#: Mapping from path -> (mtime, comp, (w, h, comp, data))
+_refs = {}
+
+
+def load_ref(path, comp):
+    """Returns decoded reference image (w, h, comp, data), cached until the
+    file changes"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _refs.get(path)
+    if cached is not None and cached[0] == mtime and cached[1] == comp:
+        return cached[2]
+    import stbi
+    img = stbi.load(path, comp)
+    _refs[path] = mtime, comp, img
+    return img
+
+
+class ImageTestCase(unittest.TestCase):
+    """TestCase comparing images against reference images in refimgs/.
+
+    A missing reference image is created from the image. On mismatch, the
+    image is written next to the reference as a -CONFLICT.png."""
+
+    def compareImage(self, name, w, h, comp, img, tolerance=1.0,
+                     max_error=None):
+        """Fails if the MSE is not below `tolerance`, or if any channel is
+        off by more than `max_error`"""
+        import stbi
+        filename = '{0}-{1}.png'.format(self.id(), name)
+        path = os.path.join(root, 'refimgs')
+        os.makedirs(path, exist_ok=True)
+        path = os.path.join(path, filename)
+        conflictfilename = '{0}-{1}-CONFLICT.png'.format(self.id(), name)
+        conflictpath = os.path.join(root, 'refimgs', conflictfilename)
+        if not os.path.exists(path):
+            stbi.write_png(path, w, h, comp, img)
+            if os.path.exists(conflictpath):
+                os.remove(conflictpath)
+            return
+        _w, _h, _comp, src = load_ref(path, comp)
+        if _w != w or _h != h or _comp != comp:
+            stbi.write_png(conflictpath, w, h, comp, img)
+            self.fail('Reference image dimensions do not match\n'
+                      'Reference: {0}\n'
+                      'Conflict: {1}'.format(path, conflictpath))
+        x = diff(src, img, w, h, comp)
+        if x.mse < tolerance and (max_error is None or
+                                  x.max_error <= max_error):
+            if os.path.exists(conflictpath):
+                os.remove(conflictpath)
+            return
+        stbi.write_png(conflictpath, w, h, comp, img)
+        self.fail('compareImage failed (MSE {0.mse:.3f}, tolerance '
+                  '{1}, PSNR {0.psnr:.2f} dB, max error {0.max_error}, '
+                  'changed {0.bbox})\n'
+                  'Reference: {2}\n'
+                  'Conflict: {3}'.format(x, tolerance, path,
+                                         conflictpath))
+
+    def compareWin(self, name, win, tolerance=1.0, max_error=None):
+        w, h, out = win.read_pixels()
+        # (stbi.write_png() may not accept memoryviews)
+        return self.compareImage(name, w, h, 3, bytes(out), tolerance,
+                                 max_error)
+
+
+# Parallel runner
+
+def _run_test(test_id):
+    """Runs test `test_id` in this (worker) process. Returns (test_id,
+    successful, output)."""
+    stream = io.StringIO()
+    suite = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    result = unittest.TextTestRunner(stream, verbosity=0).run(suite)
+    return test_id, result.wasSuccessful(), stream.getvalue()
+
+
+def _test_ids(suite):
+    for x in suite:
+        if isinstance(x, unittest.TestSuite):
+            yield from _test_ids(x)
+        else:
+            yield x.id()
+
+
+def run_parallel(names, jobs=None, log=None):
+    """Runs tests of modules/classes/methods `names`, each test in a worker
+    process (so each has its own windows and GL context). Returns True if
+    all tests passed."""
+    suite = unittest.defaultTestLoader.loadTestsFromNames(names)
+    ids = list(_test_ids(suite))
+    ok = True
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        for test_id, success, output in pool.map(_run_test, ids):
+            ok = ok and success
+            if log:
+                log('{0} ... {1}'.format(test_id, 'ok' if success
+                                         else 'FAIL'))
+                if not success:
+                    log(output)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.harness',
+                                     description='Runs tests in parallel '
+                                     'worker processes')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: CPUs)')
+    parser.add_argument('names', nargs='*', default=['tests.testvid'],
+                        help='test modules, classes or methods')
+    args = parser.parse_args(argv)
+    return 0 if run_parallel(args.names, args.jobs, print) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import math
+import unittest
+from ngk import anim, mat4, quat
+
+
+class TestAnim(unittest.TestCase):
+    def setUp(self):
+        self.clip = anim.Clip(2)
+        q = quat.create()
+        quat.set_axis_angle(q, (0, 0, 1), math.pi / 2)
+        self.q = q
+        self.clip.add_track(0, anim.TRANSLATION, (0, 1, 3),
+                            (0, 0, 0, 2, 0, 0, 2, 4, 0))
+        self.clip.add_track(1, anim.ROTATION, (0, 2),
+                            (0, 0, 0, 1) + tuple(q))
+
+    def assertSeqAlmostEqual(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for x, y in zip(a, b):
+            self.assertAlmostEqual(x, y, places=5)
+
+    def test_sample(self):
+        sampler = anim.Sampler(self.clip)
+        pose = anim.Pose(2)
+        for t in (0.5, 2.0, 5.0, 0.25):
+            sampler.sample(t, pose)
+            expected_t = {0.5: (1, 0, 0), 2.0: (2, 2, 0), 5.0: (2, 4, 0),
+                          0.25: (0.5, 0, 0)}[t]
+            self.assertSeqAlmostEqual(pose.translation[0:3], expected_t)
+        sampler.sample(1.0, pose)
+        expected = quat.create()
+        quat.set_axis_angle(expected, (0, 0, 1), math.pi / 4)
+        self.assertSeqAlmostEqual(pose.rotation[4:8], expected)
+        # Untouched channels keep their values
+        self.assertSeqAlmostEqual(pose.scale, (1, 1, 1, 1, 1, 1))
+
+    def test_to_mat4s_and_blend(self):
+        a = anim.Pose(2)
+        b = anim.Pose(2)
+        b.translation[0:3] = a.translation[0:3]
+        b.translation[0] = 4
+        b.rotation[4:8] = self.q
+        out = anim.Pose(2)
+        anim.blend(out, a, b, 0.5)
+        self.assertSeqAlmostEqual(out.translation[0:3], (2, 0, 0))
+        self.assertAlmostEqual(out.rotation[6], math.sin(math.pi / 8),
+                               places=5)
+        mats = out.to_mat4s(mat4.create() * 2, parents=(-1, 0))
+        # Child (at its parent's origin) is translated by the parent
+        self.assertSeqAlmostEqual(mats[28:31], (2, 0, 0))
+        with self.assertRaises(ValueError):
+            out.to_mat4s(mat4.create() * 2, parents=(1, -1))
+
+    def test_invalid_track(self):
+        with self.assertRaises(ValueError):
+            self.clip.add_track(0, anim.SCALE, (1, 0), (1, 1, 1) * 2)
+        with self.assertRaises(ValueError):
+            self.clip.add_track(0, anim.SCALE, (0, 1), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from tests import bench
+
+
+def result(value, higher_is_better=True):
+    return {'value': value, 'unit': 'ops/s',
+            'higher_is_better': higher_is_better}
+
+
+class TestCompare(unittest.TestCase):
+    def test_compare(self):
+        baseline = {'fast': result(100), 'slow': result(100),
+                    'time': result(1.0, False), 'same': result(5),
+                    'old': result(1)}
+        results = {'fast': result(150), 'slow': result(70),
+                   'time': result(1.5, False), 'same': result(5),
+                   'new': result(1)}
+        self.assertEqual(bench.compare(results, baseline),
+                         [('slow', 100, 70), ('time', 1.0, 1.5)])
+
+    def test_threshold(self):
+        baseline = {'a': result(100), 'b': result(1.0, False)}
+        results = {'a': result(85), 'b': result(1.1, False)}
+        self.assertEqual(bench.compare(results, baseline), [])
+        self.assertEqual(bench.compare(results, baseline, 0.05),
+                         [('a', 100, 85), ('b', 1.0, 1.1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
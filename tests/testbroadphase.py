@@ -0,0 +1,102 @@
+import math
+import random
+import unittest
+from ngk import broadphase
+
+
+def brute(boxes):
+    out = set()
+    ids = sorted(boxes)
+    for i, a in enumerate(ids):
+        for b in ids[i+1:]:
+            A, B = boxes[a], boxes[b]
+            if all(A[k] <= B[k+3] and B[k] <= A[k+3] for k in range(3)):
+                out.add((a, b))
+    return out
+
+
+def as_set(pairs):
+    return set(zip(pairs[0::2], pairs[1::2]))
+
+
+def random_box(rnd):
+    # Coordinates are integers so that touching boxes are common
+    x, y, z = (rnd.randint(0, 40) for i in range(3))
+    s = rnd.randint(0, 4)
+    return (x, y, z, x + s, y + s, z + s)
+
+
+def check_incremental(test, bp):
+    """Checks pairs of `bp` against brute force while objects are moved,
+    removed and added"""
+    rnd = random.Random(2)
+    boxes = {}
+    for i in range(150):
+        box = random_box(rnd)
+        boxes[bp.add(*box)] = box
+    test.assertEqual(as_set(bp.pairs()), brute(boxes))
+    for frame in range(10):
+        # Move some, remove some, add some
+        for id in rnd.sample(sorted(boxes), 20):
+            boxes[id] = random_box(rnd)
+            bp.set_aabb(id, *boxes[id])
+        for id in rnd.sample(sorted(boxes), 5):
+            del boxes[id]
+            bp.remove(id)
+        for i in range(5):
+            box = random_box(rnd)
+            boxes[bp.add(*box)] = box
+        pairs = bp.pairs()
+        test.assertEqual(pairs.typecode, 'i')
+        test.assertEqual(len(pairs), 2 * len(as_set(pairs)))
+        test.assertEqual(as_set(pairs), brute(boxes))
+
+
+def check_sphere(test, bp):
+    a = bp.add_sphere(0, 0, 0, 1)
+    b = bp.add_sphere(1.5, 0, 0, 1)
+    c = bp.add_sphere(10, 0, 0, 1)
+    test.assertEqual(as_set(bp.pairs()), {(a, b)})
+    bp.set_sphere(c, 3, 1, 0, 1)
+    test.assertEqual(as_set(bp.pairs()), {(a, b), (b, c)})
+
+
+class TestSweepAndPrune(unittest.TestCase):
+    def test_incremental(self):
+        check_incremental(self, broadphase.SweepAndPrune())
+
+    def test_sphere(self):
+        check_sphere(self, broadphase.SweepAndPrune())
+
+    def test_remove_unbounded(self):
+        # b's endpoints are not the last ones after moving it to +inf
+        bp = broadphase.SweepAndPrune()
+        boxes = {}
+        for box in ((0, 0, 0, math.inf, 1, 1), (5, 0, 0, 6, 1, 1),
+                    (2, 0, 0, 3, 1, 1)):
+            boxes[bp.add(*box)] = box
+        bp.remove(1)
+        del boxes[1]
+        for box in ((2.5, 0, 0, 2.75, 1, 1), (8, 0, 0, 9, 1, 1)):
+            boxes[bp.add(*box)] = box
+        self.assertEqual(as_set(bp.pairs()), brute(boxes))
+        bp.set_aabb(1, 20, 0, 0, 21, 1, 1)
+        boxes[1] = (20, 0, 0, 21, 1, 1)
+        self.assertEqual(as_set(bp.pairs()), brute(boxes))
+
+
+class TestSpatialHash(unittest.TestCase):
+    def test_incremental(self):
+        check_incremental(self, broadphase.SpatialHash(4))
+
+    def test_sphere(self):
+        check_sphere(self, broadphase.SpatialHash(4))
+
+    def test_too_large(self):
+        bp = broadphase.SpatialHash(4)
+        with self.assertRaises(ValueError):
+            bp.add(0, 0, 0, 5, 1, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import array
+import collections
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from ngk import bundle, ktx
+
+
+class FakeVid:
+    """Stand-in for ngk.vid recording constructor arguments"""
+
+    def __init__(self):
+        self.VertAttrPtr = collections.namedtuple(
+            'VertAttrPtr', 'size type normalized stride offset')
+
+        class Geom:
+            def __init__(self, *args):
+                self.args = args
+
+        class Tri3Geom:
+            def __init__(self, num_floats):
+                self.num_floats = num_floats
+                self.vertdata = None
+
+        class Texture2:
+            def __init__(self, *args, **kwargs):
+                self.args = args
+                self.kwargs = kwargs
+
+        self.Geom = Geom
+        self.Tri3Geom = Tri3Geom
+        self.Texture2 = Texture2
+        self.CompressedTexture2 = type('CompressedTexture2', (Texture2,), {})
+
+
+class TestBundle(unittest.TestCase):
+    def pack(self):
+        f = io.BytesIO()
+        with bundle.Packer(f) as packer:
+            packer.add_blob('raw', b'abc')
+            packer.add_geom('quad', 4, array.array('f', range(16)),
+                            {'aPos': (2, 0x1406, 0, 16, 0),
+                             'aUV': (2, 0x1406, 0, 16, 8)},
+                            array.array('H', [0, 1, 2, 2, 3, 0]))
+            packer.add_tri3('tri', array.array('f', range(24)))
+            packer.add_texture('tex', 2, 1, b'\x01\x02\x03\x04\x05\x06')
+            with self.assertRaises(ValueError):
+                packer.add_blob('raw', b'')
+        return f.getvalue()
+
+    def test_roundtrip(self):
+        with bundle.Bundle(self.pack()) as b:
+            self.assertIn('raw', b)
+            self.assertNotIn('missing', b)
+            self.assertEqual(bytes(b.blob('raw')), b'abc')
+            entry = b.entries['quad']
+            self.assertEqual(entry['prim'], 4)
+            self.assertEqual(entry['vertptrs']['aUV'], [2, 0x1406, 0, 16, 8])
+            self.assertEqual(b.view(entry['vertdata'], 'f').tolist(),
+                             list(range(16)))
+            self.assertEqual(b.view(entry['elemdata'],
+                                    entry['elemformat']).tolist(),
+                             [0, 1, 2, 2, 3, 0])
+            entry = b.entries['tex']
+            self.assertEqual((entry['w'], entry['h']), (2, 1))
+            self.assertEqual(bytes(b.view(entry['data'])),
+                             b'\x01\x02\x03\x04\x05\x06')
+            with self.assertRaises(ValueError):
+                b.blob('tex')
+
+    def test_vid(self):
+        # `from . import vid` takes the package attribute, so GL is never
+        # imported
+        vid = FakeVid()
+        patcher = mock.patch('ngk.vid', vid, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        f = io.BytesIO()
+        with bundle.Packer(f) as packer:
+            packer.add_compressed_texture('etc', 4, 4, ktx.GL_ETC1_RGB8_OES,
+                                          [b'\x01' * 8, b'\x02' * 8])
+        with bundle.Bundle(self.pack()) as b, bundle.Bundle(f.getvalue()) as c:
+            prim, vertdata, vertptrs, elemdata = b.geom('quad').args
+            self.assertEqual(prim, 4)
+            self.assertEqual(vertdata.nbytes, 64)
+            self.assertEqual(vertptrs['aUV'],
+                             vid.VertAttrPtr(2, 0x1406, 0, 16, 8))
+            self.assertEqual(elemdata.tolist(), [0, 1, 2, 2, 3, 0])
+            geom = b.geom('tri')
+            self.assertEqual(geom.num_floats, 8)
+            self.assertEqual(geom.vertdata.tolist(), list(range(24)))
+            tex = b.texture('tex', min_filter=1)
+            self.assertIsInstance(tex, vid.Texture2)
+            w, h, data = tex.args
+            self.assertEqual((w, h, bytes(data)),
+                             (2, 1, b'\x01\x02\x03\x04\x05\x06'))
+            self.assertEqual(tex.kwargs, {'min_filter': 1})
+            tex = c.texture('etc')
+            self.assertIsInstance(tex, vid.CompressedTexture2)
+            w, h, fmt, levels = tex.args
+            self.assertEqual((w, h, fmt), (4, 4, ktx.GL_ETC1_RGB8_OES))
+            self.assertEqual([bytes(x) for x in levels],
+                             [b'\x01' * 8, b'\x02' * 8])
+            with self.assertRaises(ValueError):
+                b.geom('tex')
+            with self.assertRaises(ValueError):
+                b.texture('raw')
+
+    def test_out_of_bounds(self):
+        with bundle.Bundle(self.pack()) as b:
+            with self.assertRaises(ValueError):
+                b.view([0, 1 << 20])
+            with self.assertRaises(ValueError):
+                b.view([-4, 4])
+
+    def test_aligned(self):
+        with bundle.Bundle(self.pack()) as b:
+            for entry in b.entries.values():
+                for k in ('data', 'vertdata', 'elemdata'):
+                    if k in entry:
+                        self.assertEqual(entry[k][0] % bundle.ALIGN, 0)
+
+    def test_close_releases_views(self):
+        b = bundle.Bundle(self.pack())
+        v = b.blob('raw')
+        b.close()
+        with self.assertRaises(ValueError):
+            v[0]
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            bundle.Bundle(b'NGKX' + bytes(32))
+        with self.assertRaises(ValueError):
+            bundle.Bundle(self.pack()[:-4])
+
+    def test_pack_files(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        raw = os.path.join(tmpdir.name, 'data.bin')
+        with open(raw, 'wb') as f:
+            f.write(b'hello')
+        tex = os.path.join(tmpdir.name, 'tex.ktx')
+        with open(tex, 'wb') as f:
+            ktx.write(f, 4, 4, ktx.GL_ETC1_RGB8_OES, [bytes(8), bytes(8)])
+        path = os.path.join(tmpdir.name, 'out.bundle')
+        self.assertEqual(bundle.main([path, raw, 'img=' + tex]), 0)
+        with bundle.Bundle(path) as b:
+            self.assertEqual(bytes(b.blob('data')), b'hello')
+            entry = b.entries['img']
+            self.assertEqual(entry['type'], 'compressed_texture')
+            self.assertEqual(entry['internal_format'], ktx.GL_ETC1_RGB8_OES)
+            self.assertEqual(len(entry['levels']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
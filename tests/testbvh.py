@@ -0,0 +1,142 @@
+import array
+import math
+import random
+import unittest
+from ngk import bvh, vec3
+
+
+class FakeTri3Geom:
+    """Tri3Geom vertex layout without GL"""
+
+    num_floats = 8
+
+    def __init__(self):
+        self.vertdata = array.array('f')
+
+    def add_tri(self, *verts):
+        for x, y, z in verts:
+            self.vertdata.extend((x, y, z, 0, 0, 1, 0, 0))
+
+
+def brute(geom, o, d):
+    best = None
+    tris = len(geom.vertdata) // 24
+    for i in range(tris):
+        v = geom.vertdata[i*24:i*24+24]
+        a, b, c = v[0:3], v[8:11], v[16:19]
+        e1 = vec3.create()
+        e2 = vec3.create()
+        vec3.subtract(e1, b, a)
+        vec3.subtract(e2, c, a)
+        p = vec3.create()
+        vec3.cross(p, d, e2)
+        det = vec3.dot(e1, p)
+        if abs(det) < 1e-9:
+            continue
+        s = vec3.create()
+        vec3.subtract(s, o, a)
+        u = vec3.dot(s, p) / det
+        q = vec3.create()
+        vec3.cross(q, s, e1)
+        v_ = vec3.dot(d, q) / det
+        t = vec3.dot(e2, q) / det
+        if u < 0 or v_ < 0 or u + v_ > 1 or t < 0:
+            continue
+        if best is None or t < best[1]:
+            best = (i, t)
+    return best
+
+
+class TestBVH(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1)
+        self.rnd = rnd
+        self.geom = FakeTri3Geom()
+        for i in range(200):
+            cx, cy, cz = (rnd.uniform(-10, 10) for k in range(3))
+            self.geom.add_tri(*[(cx + rnd.uniform(-1, 1),
+                                 cy + rnd.uniform(-1, 1),
+                                 cz + rnd.uniform(-1, 1)) for k in range(3)])
+
+    def random_ray(self):
+        o = vec3.create(*(self.rnd.uniform(-12, 12) for k in range(3)))
+        d = vec3.create(*(self.rnd.uniform(-1, 1) for k in range(3)))
+        vec3.normalize(d, d)
+        return o, d
+
+    def test_raycast_matches_brute_force(self):
+        tree = bvh.BVH(self.geom)
+        hits = 0
+        for j in range(200):
+            o, d = self.random_ray()
+            hit = tree.raycast(o, d)
+            expected = brute(self.geom, o, d)
+            if expected is None:
+                self.assertIsNone(hit)
+                continue
+            hits += 1
+            self.assertEqual(hit.index, expected[0])
+            self.assertAlmostEqual(hit.t, expected[1], places=4)
+        self.assertGreater(hits, 0)
+
+    def test_refit_and_batch(self):
+        tree = bvh.BVH(self.geom)
+        # Move every vert, then refit
+        v = self.geom.vertdata
+        for i in range(0, len(v), 8):
+            v[i] += 3
+        tree.refit()
+        origins = array.array('f')
+        dirs = array.array('f')
+        for j in range(100):
+            o, d = self.random_ray()
+            origins.extend(o)
+            dirs.extend(d)
+        index, t, u, w = tree.raycast_many(origins, dirs)
+        for j in range(100):
+            expected = brute(self.geom, origins[3*j:3*j+3],
+                             dirs[3*j:3*j+3])
+            if expected is None:
+                self.assertEqual(index[j], -1)
+                self.assertEqual(t[j], math.inf)
+            else:
+                self.assertEqual(index[j], expected[0])
+                self.assertAlmostEqual(t[j], expected[1], places=3)
+
+    def test_segment_and_empty(self):
+        geom = FakeTri3Geom()
+        geom.add_tri((-1, -1, 5), (1, -1, 5), (0, 1, 5))
+        geom.add_tri((0, 0, 0), (0, 0, 0), (0, 0, 0))  # deleted
+        tree = bvh.BVH(geom)
+        hit = tree.segment_cast(vec3.create(0, 0, 0), vec3.create(0, 0, 10))
+        self.assertEqual(hit.index, 0)
+        self.assertAlmostEqual(hit.t, 5)
+        self.assertAlmostEqual(hit.u, 0.25)
+        self.assertAlmostEqual(hit.v, 0.5)
+        self.assertIsNone(tree.segment_cast(vec3.create(0, 0, 0),
+                                            vec3.create(0, 0, 4)))
+        empty = bvh.BVH(FakeTri3Geom())
+        self.assertIsNone(empty.raycast((0, 0, 0), (0, 0, 1)))
+        empty.refit()
+
+    def test_axis_aligned_on_bounds(self):
+        # Origin on the x = 0 bounds plane with a zero x direction
+        geom = FakeTri3Geom()
+        geom.add_tri((0, 0, 0), (10, 0, 0), (0, 10, 0))
+        tree = bvh.BVH(geom)
+        for tmax in (math.inf, 100):
+            hit = tree.raycast((0, 5, 5), (0, 0, -1), tmax)
+            self.assertEqual(hit.index, 0)
+            self.assertAlmostEqual(hit.t, 5)
+        hit = tree.segment_cast(vec3.create(0, 5, 5), vec3.create(0, 5, -5))
+        self.assertAlmostEqual(hit.t, 5)
+        self.assertIsNone(tree.raycast((-1, 5, 5), (0, 0, -1)))
+        index, t, u, v = tree.raycast_many(array.array('f', (0, 5, 5)),
+                                           array.array('f', (0, 0, -1)),
+                                           100)
+        self.assertEqual(index[0], 0)
+        self.assertAlmostEqual(t[0], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import math
+import unittest
+from ngk import camera, mat4, vec3
+
+
+class FakeProgram:
+    def __init__(self):
+        self.uniforms = {}
+        self.sets = 0
+
+    def set_uniform(self, name, value):
+        self.uniforms[name] = value
+        self.sets += 1
+
+
+def assert_vec_close(test, a, b):
+    for x, y in zip(a, b):
+        test.assertAlmostEqual(x, y, places=5)
+
+
+class TestMat4(unittest.TestCase):
+    def test_perspective(self):
+        m = mat4.create()
+        mat4.perspective(m, math.pi / 2, 2.0, 1.0, 10.0)
+        p = vec3.create()
+        # A point on the near plane at the top edge of the view
+        vec3.transform_mat4(p, (0, 1, -1), m)
+        assert_vec_close(self, p, (0, 1, -1))
+        vec3.transform_mat4(p, (20, 0, -10), m)
+        assert_vec_close(self, p, (1, 0, 1))
+
+    def test_look_at(self):
+        m = mat4.create()
+        mat4.look_at(m, (0, 0, 5), (0, 0, 0), (0, 1, 0))
+        p = vec3.create()
+        vec3.transform_mat4(p, (1, 2, 0), m)
+        assert_vec_close(self, p, (1, 2, -5))
+
+    def test_from_quat(self):
+        m = mat4.create()
+        s = math.sqrt(0.5)
+        mat4.from_quat(m, (0, 0, s, s))
+        p = vec3.create()
+        vec3.transform_mat4(p, (1, 0, 0), m)
+        assert_vec_close(self, p, (0, 1, 0))
+
+
+class TestCamera(unittest.TestCase):
+    def test_from_quat_matches_look_at(self):
+        a = camera.Camera()
+        a.look_at((3, 0, 0), (0, 0, 0))
+        b = camera.Camera()
+        # Rotate 90 degrees about y, so -z points towards -x
+        s = math.sqrt(0.5)
+        b.from_quat((0, s, 0, s), (3, 0, 0))
+        assert_vec_close(self, a.view, b.view)
+        assert_vec_close(self, b.inverse_view[12:15], (3, 0, 0))
+
+    def test_cached(self):
+        cam = camera.Camera()
+        cam.perspective(1.0, 1.5, 0.1, 100)
+        cam.look_at((1, 2, 3), (0, 0, 0))
+        vp = cam.viewproj
+        want = mat4.create()
+        mat4.multiply(want, cam.proj, cam.view)
+        self.assertEqual(list(vp), list(want))
+        inv = cam.inverse_viewproj
+        ident = mat4.create()
+        mat4.multiply(ident, vp, inv)
+        assert_vec_close(self, ident, mat4.IDENTITY)
+        version = cam.version
+        cam.ortho(-1, 1, -1, 1, 0.1, 100)
+        self.assertEqual(cam.mode, 'ORTHO')
+        self.assertNotEqual(cam.version, version)
+        mat4.multiply(want, cam.proj, cam.view)
+        self.assertEqual(list(cam.viewproj), list(want))
+
+    def test_apply(self):
+        cam = camera.Camera()
+        cam.perspective(1.0, 1.0, 0.1, 100)
+        prog = FakeProgram()
+        self.assertTrue(cam.apply(prog))
+        self.assertFalse(cam.apply(prog))
+        self.assertIs(prog.uniforms['uViewProj'], cam.viewproj)
+        self.assertTrue(cam.apply(prog, 'uView', 'view'))
+        cam.perspective(1.0, 2.0, 0.1, 100)
+        # View did not change
+        self.assertFalse(cam.apply(prog, 'uView', 'view'))
+        self.assertTrue(cam.apply(prog))
+        self.assertEqual(prog.sets, 3)
+        # Program recompiled (uniforms cleared)
+        prog.uniforms.clear()
+        self.assertTrue(cam.apply(prog))
+
+
+if __name__ == '__main__':
+    unittest.main()
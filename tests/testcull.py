@@ -0,0 +1,47 @@
+import array
+import unittest
+from ngk import cull, mat4
+
+
+class TestCull(unittest.TestCase):
+    def setUp(self):
+        self.m = mat4.create()
+        mat4.ortho(self.m, -80, 80, -60, 60, -60, 60)
+        self.planes = cull.create_planes()
+        cull.frustum_planes(self.planes, self.m)
+
+    def test_single(self):
+        self.assertTrue(cull.sphere_visible(self.planes, (0, 0, 0), 1))
+        self.assertTrue(cull.sphere_visible(self.planes, (85, 0, 0), 10))
+        self.assertFalse(cull.sphere_visible(self.planes, (95, 0, 0), 10))
+        self.assertTrue(cull.aabb_visible(self.planes, (70, 50, 0),
+                                          (90, 70, 1)))
+        self.assertFalse(cull.aabb_visible(self.planes, (-100, 0, 0),
+                                           (-90, 1, 1)))
+
+    def test_batch(self):
+        spheres = array.array('f', [0, 0, 0, 1,
+                                    95, 0, 0, 10,
+                                    0, -65, 0, 10])
+        self.assertEqual(list(cull.cull_spheres(self.planes, spheres)),
+                         [1, 0, 1])
+        boxes = array.array('f', [-1, -1, -1, 1, 1, 1,
+                                  0, 61, 0, 5, 70, 5])
+        self.assertEqual(list(cull.cull_aabbs(self.planes, boxes)), [1, 0])
+        view = cull.view_rect(self.m)
+        for x, y in zip(view, (-80, -60, 80, 60)):
+            self.assertAlmostEqual(x, y, places=4)
+        rects = array.array('f', [-90, -10, -70, 10,
+                                  81, 0, 90, 10])
+        self.assertEqual(list(cull.cull_rects(view, rects)), [1, 0])
+
+    def test_visible_ranges(self):
+        mask = bytearray([1, 1, 0, 1, 0, 0, 1])
+        self.assertEqual(cull.visible_ranges(mask),
+                         [(0, 2), (3, 1), (6, 1)])
+        self.assertEqual(cull.visible_ranges(mask, 4, count=26),
+                         [(0, 8), (12, 4), (24, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import array
+import random
+import unittest
+from ngk import fuse, mat4, quat, vec3, vec4
+
+
+SIZES = {'m': 16, 'view': 16, 'pos': 3, 'size': 3, 'p': 3, 'q': 4,
+         'r': 4, 'v4': 4}
+
+
+def run_steps(steps, env):
+    """Runs chain step by step on arrays"""
+    for func, out, *args in steps:
+        if out not in env:
+            env[out] = array.array('f', bytes(4 * fuse.RULES[func][1]))
+        dst = env[out]
+        if out in args:
+            # The ngk functions are not all safe to call in-place
+            dst = array.array('f', dst)
+        func(dst, *[env[x] for x in args])
+        env[out] = dst
+
+
+def random_env():
+    rnd = random.Random(4)
+    env = {name: array.array('f', (rnd.uniform(-2, 2) for i in range(n)))
+           for name, n in SIZES.items()}
+    env['k'] = 1.5
+    quat.normalize(env['q'], env['q'])
+    return env
+
+
+STEPS = [(mat4.translate, 'm', 'm', 'pos'),
+         (mat4.scale, 'm', 'm', 'size'),
+         (mat4.multiply, 'mvp', 'view', 'm'),
+         (vec3.transform_mat4, 'c', 'p', 'mvp'),
+         (vec3.cross, 'n', 'c', 'pos'),
+         (vec3.normalize, 'n', 'n'),
+         (vec3.transform_quat, 'n', 'n', 'q'),
+         (vec3.scale, 'n', 'n', 'k'),
+         (quat.multiply, 'qr', 'q', 'r'),
+         (mat4.from_rotation_translation_scale, 't', 'qr', 'n', 'size'),
+         (vec4.transform_mat4, 'w', 'v4', 't'),
+         (vec4.transform_quat, 'w', 'w', 'q')]
+
+OUTPUTS = ('m', 'mvp', 'c', 'n', 't', 'w')
+
+
+class TestFuse(unittest.TestCase):
+    def assertClose(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for x, y in zip(a, b):
+            self.assertAlmostEqual(x, y, delta=1e-4 * max(1.0, abs(y)))
+
+    def test_matches_steps(self):
+        want = random_env()
+        run_steps(STEPS, want)
+        env = random_env()
+        f = fuse.fuse(STEPS, OUTPUTS)
+        self.assertEqual(f.args, ('m', 'pos', 'size', 'view', 'p', 'q',
+                                  'k', 'r', 'v4', 'mvp', 'c', 'n', 't', 'w'))
+        for name in OUTPUTS:
+            env.setdefault(name, array.array('f', bytes(4 * len(want[name]))))
+        f(*[env[x] for x in f.args])
+        for name in OUTPUTS:
+            self.assertClose(env[name], want[name])
+
+    def test_cached(self):
+        self.assertIs(fuse.fuse(STEPS, OUTPUTS), fuse.fuse(STEPS, OUTPUTS))
+
+    def test_identity_folded(self):
+        f = fuse.fuse([(mat4.identity, 'm'),
+                       (mat4.translate, 'm', 'm', 'pos')], ['m'])
+        self.assertEqual(f.args, ('pos', 'm'))
+        self.assertNotIn('*', f.source)
+        m = mat4.create()
+        f(array.array('f', (1, 2, 3)), m)
+        self.assertEqual(list(m[12:]), [1, 2, 3, 1])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            fuse.fuse([(mat4.invert, 'm', 'm')], ['m'])
+        with self.assertRaises(ValueError):
+            fuse.fuse([(mat4.multiply, 'm', 'a', 'pos'),
+                       (vec3.add, 'pos', 'pos', 'pos')], ['m'])
+        with self.assertRaises(ValueError):
+            fuse.fuse([(vec3.add, 'a', 'b', 'c')], ['d'])
+        with self.assertRaises(ValueError):
+            fuse.fuse([(vec3.add, 'a', 'b', 'import')], ['a'])
+
+    @unittest.skipIf(fuse.numpy is None, 'requires NumPy')
+    def test_batch(self):
+        np = fuse.numpy
+        n = 5
+        envs = []
+        for i in range(n):
+            env = random_env()
+            env['pos'][0] += i
+            env['k'] = i * 0.5
+            envs.append(env)
+        batch = dict(envs[0])
+        for name in ('m', 'pos', 'k'):
+            batch[name] = np.array([env[name] for env in envs], np.float32)
+        for name in OUTPUTS:
+            if name != 'm':
+                batch[name] = array.array('f', bytes(
+                    4 * n * (16 if name in ('mvp', 't') else
+                             3 if name in ('c', 'n') else 4)))
+        f = fuse.fuse(STEPS, OUTPUTS, batch=True)
+        f(*[batch[x] for x in f.args])
+        for i, env in enumerate(envs):
+            run_steps(STEPS, env)
+            for name in OUTPUTS:
+                size = len(env[name])
+                rows = np.asarray(batch[name], np.float32).reshape(-1, size)
+                self.assertClose(rows[i], env[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from ngk import garbage
+
+
+class TestFlush(unittest.TestCase):
+    def test_flush(self):
+        queue = list(range(600))
+        deleted = []
+        self.assertTrue(garbage.flush(queue, deleted.append, float('inf')))
+        self.assertEqual(queue, [])
+        self.assertEqual(sorted(deleted), list(range(600)))
+
+    def test_flush_many(self):
+        queue = list(range(600))
+        calls = []
+
+        def delete_many(n, names):
+            self.assertEqual(names.typecode, 'I')
+            self.assertEqual(len(names), n)
+            calls.append(list(names))
+        self.assertTrue(garbage.flush(queue, None, float('inf'),
+                                      delete_many))
+        self.assertEqual(queue, [])
+        self.assertEqual([len(x) for x in calls],
+                         [garbage.BATCH, garbage.BATCH,
+                          600 - 2 * garbage.BATCH])
+        self.assertEqual(sorted(sum(calls, [])), list(range(600)))
+
+    def test_deadline(self):
+        queue = list(range(600))
+        deleted = []
+        # At least one batch is deleted even when out of time
+        self.assertFalse(garbage.flush(queue, deleted.append, 0))
+        self.assertEqual(len(deleted), garbage.BATCH)
+        self.assertEqual(queue, list(range(600 - garbage.BATCH)))
+
+
+if __name__ == '__main__':
+    unittest.main()
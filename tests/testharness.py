@@ -0,0 +1,32 @@
+import math
+import unittest
+from tests import harness
+
+
+class TestDiff(unittest.TestCase):
+    def test_equal(self):
+        img = bytes(range(24))
+        d = harness.diff(img, bytearray(img), 4, 2, 3)
+        self.assertEqual(d, (0.0, math.inf, 0, None))
+
+    def test_changed(self):
+        a = bytearray(4 * 3 * 3)
+        b = bytearray(a)
+        # Pixel (1, 1) and (2, 2) change; errors of opposite sign must not
+        # cancel out
+        b[(1 * 4 + 1) * 3] = 10
+        b[(2 * 4 + 2) * 3 + 2] = 0
+        a[(2 * 4 + 2) * 3 + 2] = 10
+        d = harness.diff(a, b, 4, 3, 3)
+        self.assertAlmostEqual(d.mse, 200 / 36)
+        self.assertAlmostEqual(d.psnr, 10 * math.log10(255 * 255 * 36 / 200))
+        self.assertEqual(d.max_error, 10)
+        self.assertEqual(d.bbox, (1, 1, 3, 3))
+
+    def test_len_mismatch(self):
+        with self.assertRaises(ValueError):
+            harness.diff(bytes(3), bytes(6), 1, 1, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
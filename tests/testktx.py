@@ -0,0 +1,95 @@
+import io
+import os
+import struct
+import tempfile
+import unittest
+from ngk import ktx
+
+
+def _ktx_bytes(w, h, levels):
+    f = io.BytesIO()
+    ktx.write(f, w, h, ktx.GL_ETC1_RGB8_OES, levels)
+    return f.getvalue()
+
+
+class TestKTX(unittest.TestCase):
+    def test_read(self):
+        data = _ktx_bytes(8, 4, [bytes(range(16)), b'abcde', b'xyz'])
+        tex = ktx.KTX(data)
+        self.assertTrue(tex.compressed)
+        self.assertEqual(tex.internal_format, ktx.GL_ETC1_RGB8_OES)
+        self.assertEqual((tex.w, tex.h), (8, 4))
+        self.assertEqual([(w, h, bytes(d)) for w, h, d in tex.levels],
+                         [(8, 4, bytes(range(16))), (4, 2, b'abcde'),
+                          (2, 1, b'xyz')])
+
+    def test_big_endian(self):
+        data = bytearray(_ktx_bytes(4, 4, [b'abcdefgh']))
+        # Byte swap the header fields and the image size
+        n = len(ktx.IDENTIFIER)
+        fields = struct.unpack_from('<14I', data, n)
+        struct.pack_into('>14I', data, n, *fields)
+        tex = ktx.KTX(data)
+        self.assertEqual((tex.w, tex.h), (4, 4))
+        self.assertEqual(bytes(tex.levels[0][2]), b'abcdefgh')
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ktx.KTX(b'not a ktx file at all, but long enough to be one' * 2)
+        with self.assertRaises(ValueError):
+            ktx.KTX(_ktx_bytes(4, 4, [b'abcdefgh'])[:-4])
+
+    def test_load(self):
+        fd, path = tempfile.mkstemp(suffix='.ktx')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_ktx_bytes(4, 4, [b'abcdefgh']))
+        with ktx.load(path) as tex:
+            self.assertIsInstance(tex.levels[0][2], memoryview)
+            self.assertEqual(bytes(tex.levels[0][2]), b'abcdefgh')
+        self.assertEqual(tex.levels, [])
+
+    def test_close_keeps_views(self):
+        fd, path = tempfile.mkstemp(suffix='.ktx')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_ktx_bytes(4, 4, [b'abcdefgh']))
+        with ktx.load(path) as tex:
+            level = memoryview(tex.levels[0][2])
+        self.assertEqual(bytes(level), b'abcdefgh')
+        level.release()
+
+
+@unittest.skipIf(ktx.numpy is None, 'requires NumPy')
+class TestETC1(unittest.TestCase):
+    def test_flat(self):
+        for color in ((200, 10, 90), (0, 0, 0), (255, 255, 255)):
+            data = bytes(color) * 16
+            out = ktx.decode_etc1(4, 4, ktx.encode_etc1(4, 4, data))
+            for a, b in zip(out, data):
+                self.assertLessEqual(abs(a - b), 4)
+
+    def test_size(self):
+        w, h = 13, 10
+        data = bytes(range(256)) * (w * h * 3 // 256 + 1)
+        enc = ktx.encode_etc1(w, h, data[:w * h * 3])
+        self.assertEqual(len(enc), 4 * 3 * 8)
+        self.assertEqual(len(ktx.decode_etc1(w, h, enc)), w * h * 3)
+
+    def test_gradient(self):
+        w, h = 16, 8
+        # ETC1 modifiers change luminance, so gray ramps encode well
+        data = bytes(c for y in range(h) for x in range(w)
+                     for c in (x * 8 + y * 8,) * 3)
+        out = ktx.decode_etc1(w, h, ktx.encode_etc1(w, h, data))
+        mse = sum((a - b) ** 2 for a, b in zip(out, data)) / len(data)
+        self.assertLess(mse, 16)
+
+    def test_rgba(self):
+        rgba = bytes((10, 20, 30, 255)) * 16
+        self.assertEqual(ktx.encode_etc1(4, 4, rgba, 4),
+                         ktx.encode_etc1(4, 4, bytes((10, 20, 30)) * 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from ngk import loop
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        # Advance a little on every call so that spinning terminates
+        self.now += 1e-6
+        return self.now
+
+    def sleep(self, t):
+        self.now += t
+
+
+class FakeWindow:
+    def __init__(self, clock, frame_cost=0.0):
+        self.clock = clock
+        self.frame_cost = frame_cost
+        self.quit = False
+        self.swap_interval = None
+        self.steps = 0
+
+    def before_step(self):
+        pass
+
+    def after_step(self):
+        self.clock.now += self.frame_cost
+        self.steps += 1
+
+
+def counter(n, clock=None, cost=0.0):
+    for i in range(n):
+        if clock:
+            clock.now += cost
+        yield
+    return n
+
+
+class TestRun(unittest.TestCase):
+    def test_paced(self):
+        clock = FakeClock()
+        win = FakeWindow(clock, 0.001)
+        stats = loop.run(win, counter(10), rate=0.01, clock=clock,
+                         sleep=clock.sleep)
+        self.assertEqual(stats.result, 10)
+        self.assertEqual(stats.frames, 10)
+        self.assertEqual(stats.missed, 0)
+        self.assertEqual(win.swap_interval, 1)
+        self.assertAlmostEqual(clock.now, 0.1 + 0.001, places=3)
+
+    def test_missed(self):
+        clock = FakeClock()
+        win = FakeWindow(clock, 0.02)
+        stats = loop.run(win, counter(5), rate=0.01, clock=clock,
+                         sleep=clock.sleep)
+        self.assertEqual(stats.missed, 5)
+        self.assertAlmostEqual(stats.max_frame_time, 0.02, places=3)
+
+    def test_budget_defers_background(self):
+        clock = FakeClock()
+        win = FakeWindow(clock)
+        bg = [counter(100, clock, 0.003) for i in range(4)]
+        stats = loop.run(win, counter(3), rate=0.01, budget=0.005,
+                         background=bg, clock=clock, sleep=clock.sleep)
+        # Only 2 background behaviors fit into each frame
+        self.assertEqual(stats.deferred, 6)
+
+    def test_quit(self):
+        clock = FakeClock()
+        win = FakeWindow(clock)
+        win.quit = True
+        stats = loop.run(win, counter(3), swap_interval=None, clock=clock,
+                         sleep=clock.sleep)
+        self.assertEqual(stats.frames, 0)
+        self.assertIsNone(win.swap_interval)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import array
+import random
+import unittest
+from ngk import mesh
+
+
+def grid(n, num_floats=3):
+    """Returns unindexed vertdata of n x n quads (two tris each)"""
+    out = array.array('f')
+    for y in range(n):
+        for x in range(n):
+            a, b, c, d = (x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)
+            for vx, vy in (a, b, c, a, c, d):
+                out.extend((vx, vy, 0.0)[:num_floats])
+    return out
+
+
+class TestWeld(unittest.TestCase):
+    def test_weld(self):
+        vertdata, elemdata = mesh.weld(grid(1), 3)
+        self.assertEqual(list(vertdata), [0, 0, 0, 1, 0, 0, 1, 1, 0,
+                                          0, 1, 0])
+        self.assertEqual(list(elemdata), [0, 1, 2, 0, 2, 3])
+
+    def test_weld_elemdata(self):
+        vertdata = array.array('f', [5, 5, 1, 1, 0, 0, 2, 2])
+        elemdata = array.array('H', [3, 1, 2, 3, 1])
+        out, elems = mesh.weld(vertdata, 2, elemdata)
+        # Unused verts are dropped
+        self.assertEqual(list(out), [2, 2, 1, 1, 0, 0])
+        self.assertEqual(list(elems), [0, 1, 2, 0, 1])
+
+    def test_grid(self):
+        vertdata, elemdata = mesh.weld(grid(10), 3)
+        self.assertEqual(len(vertdata), 11 * 11 * 3)
+        self.assertEqual(len(elemdata), 10 * 10 * 6)
+
+    def test_remove_degenerate(self):
+        elemdata = array.array('I', [0, 1, 2, 3, 3, 4, 5, 6, 5, 7, 8, 9])
+        self.assertEqual(list(mesh.remove_degenerate(elemdata)),
+                         [0, 1, 2, 7, 8, 9])
+
+
+class TestVertexCache(unittest.TestCase):
+    def test_permutation(self):
+        vertdata, elemdata = mesh.weld(grid(8), 3)
+        out = mesh.optimize_vertex_cache(elemdata)
+        tris = sorted(tuple(elemdata[i:i + 3])
+                      for i in range(0, len(elemdata), 3))
+        self.assertEqual(sorted(tuple(out[i:i + 3])
+                                for i in range(0, len(out), 3)), tris)
+
+    def test_acmr(self):
+        vertdata, elemdata = mesh.weld(grid(30), 3)
+        tris = [elemdata[i:i + 3] for i in range(0, len(elemdata), 3)]
+        random.Random(1).shuffle(tris)
+        shuffled = array.array('I')
+        for t in tris:
+            shuffled.extend(t)
+        out = mesh.optimize_vertex_cache(shuffled)
+        self.assertGreater(mesh.acmr(shuffled), 2.0)
+        self.assertLess(mesh.acmr(out), 1.0)
+
+
+class TestChunk(unittest.TestCase):
+    def test_chunk(self):
+        vertdata, elemdata = mesh.weld(grid(4), 3)
+        chunks = mesh.chunk(vertdata, elemdata, 3, max_verts=8)
+        self.assertGreater(len(chunks), 1)
+        tris = []
+        for verts, elems in chunks:
+            self.assertEqual(elems.typecode, 'H')
+            self.assertLessEqual(len(verts) // 3, 8)
+            self.assertEqual(max(elems) + 1, len(verts) // 3)
+            tris.extend(tuple(verts[3 * v:3 * v + 3]) for v in elems)
+        # Same triangles in the same order
+        self.assertEqual(tris, [tuple(vertdata[3 * v:3 * v + 3])
+                                for v in elemdata])
+
+    def test_index(self):
+        chunks = mesh.index(grid(3), 3)
+        self.assertEqual(len(chunks), 1)
+        verts, elems = chunks[0]
+        self.assertEqual(len(verts), 16 * 3)
+        self.assertEqual(len(elems), 3 * 3 * 6)
+
+
+@unittest.skipIf(mesh.numpy is None, 'requires NumPy')
+class TestWeldFallback(unittest.TestCase):
+    def test_same_result(self):
+        vertdata = grid(5)
+        elemdata = array.array('H', range(0, len(vertdata) // 3, 2))
+        for args in ((vertdata, 3), (vertdata, 3, elemdata)):
+            fast = mesh.weld(*args)
+            numpy = mesh.numpy
+            mesh.numpy = None
+            try:
+                slow = mesh.weld(*args)
+            finally:
+                mesh.numpy = numpy
+            self.assertEqual(fast, slow)
+
+
+if __name__ == '__main__':
+    unittest.main()
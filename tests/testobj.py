@@ -0,0 +1,99 @@
+import array
+import os
+import tempfile
+import unittest
+from unittest import mock
+from ngk import obj
+
+
+QUAD = '''
+# Quad with a shared edge
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0 1.0
+vt 0 0
+vt 1 0
+vt 1 1
+vt 0 1
+vn 0 0 1
+f 1/1/1 2/2/1 3/3/1 4/4/1
+'''
+
+
+class TestParse(unittest.TestCase):
+    def test_quad(self):
+        vertdata, elemdata = obj.parse(QUAD)
+        self.assertEqual(list(elemdata), [0, 1, 2, 0, 2, 3])
+        self.assertEqual(len(vertdata), 4 * obj.NUM_FLOATS)
+        # Position, normal, UV (v flipped)
+        self.assertEqual(list(vertdata[16:24]),
+                         [1.0, 1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0])
+
+    def test_weld(self):
+        text = QUAD + 'f 1/1/1 3/3/1 4/4/1\nf 1/1 2/2 3/3\n'
+        vertdata, elemdata = obj.parse(text)
+        # Same indices are welded, without the normal they differ
+        self.assertEqual(len(vertdata) // obj.NUM_FLOATS, 7)
+        self.assertEqual(list(elemdata[6:9]), [0, 2, 3])
+        self.assertEqual(list(vertdata[4 * 8:4 * 8 + 8]),
+                         [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+
+    def test_relative(self):
+        text = 'v 0 0 0\nv 1 0 0\nv 0 1 0\nf -3 -2 -1\nv 5 5 5\nf 1 2 -1\n'
+        vertdata, elemdata = obj.parse(text)
+        self.assertEqual(list(elemdata), [0, 1, 2, 0, 1, 3])
+        self.assertEqual(list(vertdata[24:27]), [5.0, 5.0, 5.0])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            obj.parse('v 0 0 0\nf 1 2 3\n')
+        with self.assertRaises(ValueError):
+            obj.parse('v 0 0 0\nf 1 1\n')
+
+    def test_unindex(self):
+        vertdata, elemdata = obj.parse(QUAD)
+        out = obj.unindex(vertdata, array.array('H', elemdata))
+        self.assertEqual(len(out), 6 * obj.NUM_FLOATS)
+        self.assertEqual(list(out[3 * 8:4 * 8]), list(vertdata[0:8]))
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'quad.obj')
+        with open(self.path, 'w') as f:
+            f.write(QUAD)
+
+    def test_cache(self):
+        vertdata, elemdata = obj.load_arrays(self.path)
+        self.assertEqual(elemdata.typecode, 'H')
+        self.assertTrue(os.path.exists(obj.cache_path(self.path)))
+        with mock.patch.object(obj, 'parse') as parse:
+            self.assertEqual(obj.load_arrays(self.path),
+                             (vertdata, elemdata))
+            # Touched but unchanged
+            os.utime(self.path, ns=(0, 0))
+            self.assertEqual(obj.load_arrays(self.path),
+                             (vertdata, elemdata))
+            parse.assert_not_called()
+
+    def test_stale(self):
+        obj.load_arrays(self.path)
+        with open(self.path, 'a') as f:
+            f.write('f 1/1/1 3/3/1 4/4/1\n')
+        vertdata, elemdata = obj.load_arrays(self.path)
+        self.assertEqual(len(elemdata), 9)
+
+    def test_unindexed(self):
+        with mock.patch.object(obj, 'MAX_INDEXED_VERTS', 3):
+            vertdata, elemdata = obj.load_arrays(self.path)
+            self.assertEqual(len(elemdata), 0)
+            self.assertEqual(len(vertdata), 6 * obj.NUM_FLOATS)
+            self.assertEqual(obj.load_arrays(self.path),
+                             (vertdata, elemdata))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from ngk import particles
+
+
+class TestParticleSystem(unittest.TestCase):
+    def test_emit_step_kill(self):
+        ps = particles.ParticleSystem(8)
+        self.assertEqual(ps.emit(3, 0.0, 0.0, vx=[1, 2, 3], life=[1, 3, 2],
+                                 size=2.0, color=(1, 0, 0, 1)), 3)
+        self.assertEqual(ps.emit(10, 5.0, 5.0, life=0.75), 5)
+        self.assertEqual(ps.count, 8)
+        ps.step(0.5, ay=-2.0)
+        self.assertEqual(ps.count, 8)
+        self.assertAlmostEqual(ps.x[1], 1.0)
+        self.assertAlmostEqual(ps.vy[0], -1.0)
+        self.assertAlmostEqual(ps.y[0], -0.5)
+        # Kills the 5 particles at the end and the first one
+        ps.step(0.5)
+        self.assertEqual(ps.count, 2)
+        self.assertEqual(sorted(ps.vx[:2]), [2.0, 3.0])
+        self.assertEqual(sorted(ps.life[:2]), [1.0, 2.0])
+
+    def test_write_vertdata(self):
+        ps = particles.ParticleSystem(4)
+        ps.emit(2, [0, 10], [0, 20], size=[2, 4], color=(0.5, 0.25, 1, 1))
+        v = ps.write_vertdata()
+        self.assertEqual(len(v), 2 * 4 * particles.NUM_FLOATS)
+        self.assertEqual(list(v[0:8]), [-1, -1, 0, 1, 0.5, 0.25, 1, 1])
+        self.assertEqual(list(v[48:56]), [12, 22, 1, 0, 0.5, 0.25, 1, 1])
+        v.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import unittest
+from ngk import record
+
+
+class FakeWindow:
+    """Window whose bottom-up pixels are rows filled with the row index"""
+
+    _viewportw = 2
+    _viewporth = 3
+
+    def __init__(self):
+        self.frame = 0
+
+    def read_pixels(self, out, x, y, w, h, fmt, flip=True):
+        self.fmt = fmt
+        comp = 3 if fmt == 0x1907 else 4
+        for row in range(h):
+            out[row * w * comp:(row + 1) * w * comp] = \
+                bytes([self.frame * 10 + row]) * (w * comp)
+        return w, h, memoryview(out)
+
+
+class BlockingRecorder(record.FrameRecorder):
+    """Recorder whose worker waits for `go` before writing"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.go = threading.Event()
+
+    def _write_frame(self, index, buf):
+        self.go.wait()
+        return super()._write_frame(index, buf)
+
+
+class TestFrameRecorder(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_rgb_stream(self):
+        win = FakeWindow()
+        with record.FrameRecorder(self.path) as rec:
+            for win.frame in range(3):
+                self.assertTrue(rec.capture(win))
+        self.assertEqual(rec.stats.written, 3)
+        self.assertEqual(rec.stats.bytes_written, 3 * 18)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # Rows are written top-down
+        self.assertEqual(data[:18], bytes([2] * 6 + [1] * 6 + [0] * 6))
+        self.assertEqual(data[36:42], bytes([22] * 6))
+
+    def test_drop(self):
+        win = FakeWindow()
+        rec = BlockingRecorder(self.path, num_buffers=2)
+        results = [rec.capture(win) for i in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        rec.go.set()
+        stats = rec.close()
+        self.assertEqual((stats.captured, stats.dropped, stats.written),
+                         (2, 3, 2))
+
+    def test_decimate(self):
+        win = FakeWindow()
+        rec = BlockingRecorder(self.path, num_buffers=2, policy='DECIMATE')
+        for i in range(8):
+            rec.capture(win)
+        self.assertEqual(rec.decimation, 4)
+        self.assertGreater(rec.stats.skipped, 0)
+        rec.go.set()
+        stats = rec.close()
+        self.assertEqual(stats.offered, 8)
+        self.assertEqual(stats.captured + stats.dropped + stats.skipped, 8)
+
+    @unittest.skipIf(record.numpy is None, 'requires NumPy')
+    def test_yuv(self):
+        win = FakeWindow()
+        win._viewportw = 4
+        win._viewporth = 2
+        with record.FrameRecorder(self.path, 'YUV') as rec:
+            rec.capture(win)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # 8 luma bytes, 2 u bytes, 2 v bytes
+        self.assertEqual(len(data), 12)
+        # Black (row 0) is luma 16, at the bottom
+        self.assertEqual(data[4:8], bytes([16] * 4))
+
+    @unittest.skipIf(record.numpy is None, 'requires NumPy')
+    def test_yuv_odd(self):
+        win = FakeWindow()
+        win.frame = 5
+        win._viewportw = 5
+        win._viewporth = 3
+        with record.FrameRecorder(self.path, 'YUV') as rec:
+            rec.capture(win)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # 15 luma bytes, 3x2 u and v bytes
+        self.assertEqual(len(data), 27)
+        self.assertEqual(rec.stats.bytes_written, 27)
+        # Gray has no chroma, also in the padded last row and column
+        self.assertEqual(data[15:], bytes([128] * 12))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            record.FrameRecorder(self.path, 'GIF')
+        with self.assertRaises(ValueError):
+            record.FrameRecorder(self.path, policy='WAIT')
+
+
+if __name__ == '__main__':
+    unittest.main()
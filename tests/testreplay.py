@@ -0,0 +1,143 @@
+import io
+import unittest
+from ngk import bhv, loop, replay
+from ngk.event import KeyEvent, ButtonEvent, MotionEvent
+
+
+FRAMES = [
+    [KeyEvent('KEYDOWN', 4)],
+    [],
+    [ButtonEvent('MOUSEDOWN', 0, 1, 10, 20),
+     MotionEvent('MOUSEMOVE', 0, 1, 0.1, 2.5, 1 / 3, -0.25),
+     KeyEvent('KEYUP', 4)],
+]
+
+
+class FakeWindow:
+    w = 160
+    h = 120
+    _winw = 320
+    _winh = 240
+
+    def __init__(self):
+        self.frame = -1
+        self.events = []
+        self.quit = False
+        self.back = False
+        self.swap_interval = None
+
+    def before_step(self):
+        self.frame += 1
+        self.events = list(FRAMES[self.frame])
+        self.quit = self.frame == len(FRAMES) - 1
+
+    def after_step(self):
+        pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def record():
+    f = io.BytesIO()
+    clock = FakeClock()
+    rec = replay.InputRecorder(FakeWindow(), f, clock)
+    for i in range(len(FRAMES)):
+        rec.before_step()
+        rec.after_step()
+        clock.t += 0.25
+    rec.close()
+    return f.getvalue()
+
+
+class TestReplay(unittest.TestCase):
+    def test_roundtrip(self):
+        win = replay.ReplayWindow(record())
+        self.assertEqual((win.w, win.h, win._winw, win._winh),
+                         (160, 120, 320, 240))
+        for i, events in enumerate(FRAMES):
+            self.assertFalse(win.quit)
+            win.before_step()
+            self.assertEqual(win.events, events)
+            self.assertEqual(win.clock(), i * 0.25)
+        self.assertTrue(win.quit)
+        win.before_step()
+        self.assertEqual(win.events, [])
+
+    def test_run_interval(self):
+        win = replay.ReplayWindow(record())
+        ticks = []
+
+        def ticker():
+            while True:
+                ticks.append(win.clock())
+                yield
+
+        def root():
+            it = bhv.interval(ticker(), 0.1, clock=win.clock)
+            while True:
+                next(it)
+                yield
+        loop.run(win, root(), rate=0, swap_interval=None,
+                 clock=win.clock, sleep=win.sleep)
+        self.assertEqual(win.frames, 3)
+        # 0.5s of virtual time at 0.1s intervals
+        self.assertEqual(len(ticks), 4)
+
+    def test_record_run(self):
+        class TickingClock(FakeClock):
+            # Live time moves on every read, and while sleeping
+            def __call__(self):
+                self.t += 0.013
+                return self.t
+
+            def sleep(self, t):
+                self.t += t
+
+        def run(win, **kwargs):
+            ticks = []
+
+            def ticker():
+                while True:
+                    ticks.append(win.clock())
+                    yield
+
+            def root():
+                it = bhv.interval(ticker(), 0.05, clock=win.clock)
+                while True:
+                    next(it)
+                    yield
+            loop.run(win, root(), swap_interval=None, clock=win.clock,
+                     **kwargs)
+            return ticks
+        f = io.BytesIO()
+        clock = TickingClock()
+        with replay.InputRecorder(FakeWindow(), f, clock) as rec:
+            recorded = run(rec, rate=0.1, sleep=clock.sleep)
+        win = replay.ReplayWindow(f.getvalue())
+        self.assertEqual(run(win, rate=0, sleep=win.sleep), recorded)
+        self.assertEqual(win.frames, 3)
+        self.assertGreater(len(recorded), 2)
+
+    def test_run_paced(self):
+        def root():
+            while True:
+                yield
+        # Frames were recorded 0.25s apart, a 1s rate must wait
+        win = replay.ReplayWindow(record())
+        with self.assertRaises(ValueError):
+            loop.run(win, root(), rate=1.0, swap_interval=None,
+                     clock=win.clock, sleep=win.sleep)
+
+    def test_bad_log(self):
+        with self.assertRaises(ValueError):
+            replay.ReplayWindow(b'NOPE' + bytes(20))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import math
+import unittest
+from ngk import mat4, quat, scene
+
+
+class TestScene(unittest.TestCase):
+    def assertMatAlmostEqual(self, a, b):
+        for x, y in zip(a, b):
+            self.assertAlmostEqual(x, y, places=5)
+
+    def test_hierarchy(self):
+        s = scene.Scene()
+        root = s.add()
+        child = s.add(root)
+        root.translation = (1, 2, 3)
+        q = quat.create()
+        quat.set_axis_angle(q, (0, 0, 1), math.pi / 2)
+        root.rotation = q
+        child.translation = (1, 0, 0)
+        child.scale = (2, 2, 2)
+        self.assertTrue(s.update())
+        expected = mat4.create()
+        local = mat4.create()
+        mat4.from_rotation_translation_scale(expected, q, (1, 2, 3),
+                                             (1, 1, 1))
+        mat4.from_rotation_translation_scale(local, quat.create(), (1, 0, 0),
+                                             (2, 2, 2))
+        mat4.multiply(expected, expected, local)
+        self.assertMatAlmostEqual(child.world, expected)
+        # Child origin is rotated onto the y axis
+        self.assertMatAlmostEqual(child.world[12:15], (1, 3, 3))
+
+    def test_dirty_subtree_only(self):
+        s = scene.Scene()
+        a = s.add()
+        b = s.add()
+        b_child = s.add(b)
+        s.update()
+        version = s.version
+        self.assertFalse(s.update())
+        self.assertEqual(s.version, version)
+        # Only b's subtree is recomputed
+        s.world[a.index * 16 + 12] = 42
+        b.translation = (0, 5, 0)
+        self.assertTrue(s.update())
+        self.assertEqual(s.world[a.index * 16 + 12], 42)
+        self.assertMatAlmostEqual(b_child.world[12:15], (0, 5, 0))
+
+    def test_reparent_and_remove(self):
+        s = scene.Scene()
+        a = s.add()
+        b = s.add()
+        a.translation = (1, 0, 0)
+        b.translation = (0, 1, 0)
+        b.parent = a
+        s.update()
+        self.assertMatAlmostEqual(b.world[12:15], (1, 1, 0))
+        with self.assertRaises(ValueError):
+            a.parent = b
+        index = b.index
+        s.remove(a)
+        self.assertEqual(s.roots, ())
+        c = s.add()
+        self.assertIn(c.index, (index, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
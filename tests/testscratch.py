@@ -0,0 +1,42 @@
+import unittest
+from ngk import mat4, scratch, vec3
+
+
+class TestArena(unittest.TestCase):
+    def test_slots(self):
+        arena = scratch.Arena(64)
+        a = arena.vec3(1, 2, 3)
+        b = arena.vec3()
+        vec3.scale(b, a, 2)
+        self.assertEqual(list(b), [2, 4, 6])
+        m = arena.mat4()
+        self.assertEqual(list(m), list(mat4.IDENTITY))
+        self.assertEqual(list(arena.quat()), [0, 0, 0, 1])
+        self.assertEqual(arena.used, 26)
+        arena.reset()
+        self.assertEqual(arena.used, 0)
+        self.assertEqual(arena.peak, 26)
+        # Slots are reused after the reset
+        arena.vec3(7, 8, 9)
+        self.assertEqual(list(a), [7, 8, 9])
+
+    def test_grow(self):
+        arena = scratch.Arena(16)
+        slots = [arena.vec4(i, i, i, i) for i in range(10)]
+        self.assertEqual([x[0] for x in slots], list(range(10)))
+        arena.reset()
+        self.assertGreaterEqual(arena.capacity, 40)
+
+    def test_debug(self):
+        with scratch.Arena(64, debug=True) as arena:
+            a = arena.vec3()
+        with self.assertRaises(ValueError):
+            a[0]
+        b = arena.mat4()
+        arena.reset()
+        with self.assertRaises(ValueError):
+            mat4.identity(b)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import array
+import unittest
+from ngk import anim, mat4, skin
+
+
+class FakeTri3Geom:
+    """Tri3Geom vertex layout without GL"""
+
+    num_floats = 8
+
+    def __init__(self, vertdata):
+        self.vertdata = array.array('f', vertdata)
+        self.dirty = []
+
+    def mark_dirty(self, first, count):
+        self.dirty.append((first, count))
+
+
+# Two verts at x=0 and x=2, both with normal +y
+BIND = (0, 0, 0, 0, 1, 0, 0.25, 0.5,
+        2, 0, 0, 0, 1, 0, 0.75, 0.5)
+
+
+class TestSkinVerts(unittest.TestCase):
+    def test_weights(self):
+        bones = mat4.create() + mat4.create()
+        mat4.translate(memoryview(bones)[16:32], mat4.IDENTITY, (0, 10, 0))
+        out = array.array('f', bytes(4 * len(BIND)))
+        # First vert: bone 0 only. Second vert: half of each bone.
+        skin.skin_verts(out, array.array('f', BIND),
+                        array.array('B', (0, 1, 0, 1)),
+                        array.array('f', (1, 0, 0.5, 0.5)), bones,
+                        influences=2)
+        self.assertEqual(list(out[0:8]), list(BIND[0:8]))
+        self.assertEqual(list(out[8:16]), [2, 5, 0, 0, 1, 0, 0.75, 0.5])
+
+    def test_range(self):
+        bones = mat4.create()
+        mat4.translate(bones, mat4.IDENTITY, (1, 0, 0))
+        out = array.array('f', bytes(4 * len(BIND)))
+        skin.skin_verts(out, array.array('f', BIND), array.array('B', (0, 0)),
+                        array.array('f', (1, 1)), bones, influences=1,
+                        first=1)
+        self.assertEqual(list(out[0:8]), [0] * 8)
+        self.assertEqual(list(out[8:11]), [3, 0, 0])
+
+
+class TestSkin(unittest.TestCase):
+    def test_update_pose(self):
+        geom = FakeTri3Geom(BIND)
+        inverse_bind = mat4.create() + mat4.create()
+        # Bone 1 is bound at x=2
+        mat4.translate(memoryview(inverse_bind)[16:32], mat4.IDENTITY,
+                       (-2, 0, 0))
+        s = skin.Skin(geom, array.array('f', BIND),
+                      array.array('B', (0, 1)), array.array('f', (1, 1)),
+                      num_bones=2, influences=1, inverse_bind=inverse_bind)
+        pose = anim.Pose(2)
+        pose.translation[3:6] = array.array('f', (2, 0, 0))
+        # Rotate bone 1 by 90 degrees about z
+        pose.rotation[4:8] = array.array('f', (0, 0, 0.70710678, 0.70710678))
+        s.update_pose(pose, parents=[-1, 0])
+        self.assertEqual(geom.dirty, [(0, 2)])
+        v = geom.vertdata
+        for got, want in zip(v[8:14], (2, 0, 0, -1, 0, 0)):
+            self.assertAlmostEqual(got, want, places=5)
+        # Halfway between bind pose and the rotation
+        s.update_blend(anim.Pose(2), pose, 0.5, parents=[-1, 0])
+        for got, want in zip(v[11:14], (-0.70710678, 0.70710678, 0)):
+            self.assertAlmostEqual(got, want, places=5)
+
+    def test_mismatched_len(self):
+        geom = FakeTri3Geom(BIND)
+        with self.assertRaises(ValueError):
+            skin.Skin(geom, array.array('f', BIND), array.array('B', (0,)),
+                      array.array('f', (1,)), num_bones=1, influences=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
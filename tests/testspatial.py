@@ -0,0 +1,148 @@
+import array
+import random
+import unittest
+from ngk import spatial
+from ngk.event import ButtonEvent, MotionEvent
+try:
+    from ngk import vid
+except ImportError:
+    vid = None
+
+
+def brute_rect(rects, x0, y0, x1, y1):
+    return sorted(k for k, (a, b, c, d) in rects.items()
+                  if a <= x1 and c >= x0 and b <= y1 and d >= y0)
+
+
+def check_random_queries(test, index):
+    """Checks queries of `index` against brute force after random inserts,
+    moves and removes"""
+    rnd = random.Random(0)
+    rects = {}
+    for i in range(300):
+        x = rnd.uniform(-400, 400)
+        y = rnd.uniform(-300, 300)
+        w = rnd.uniform(0, 60)
+        h = rnd.uniform(0, 60)
+        rects[i] = (x, y, x + w, y + h)
+        index.insert(i, *rects[i])
+    # Move and remove some
+    for i in range(0, 300, 3):
+        x0, y0, x1, y1 = rects[i]
+        rects[i] = (x0 + 50, y0 - 20, x1 + 50, y1 - 20)
+        index.insert(i, *rects[i])
+    for i in range(0, 300, 7):
+        del rects[i]
+        index.remove(i)
+    test.assertEqual(len(index), len(rects))
+    for j in range(50):
+        x = rnd.uniform(-450, 450)
+        y = rnd.uniform(-350, 350)
+        q = (x, y, x + rnd.uniform(0, 200), y + rnd.uniform(0, 200))
+        test.assertEqual(sorted(index.query_rect(*q)), brute_rect(rects, *q))
+        test.assertEqual(sorted(index.query_point(x, y)),
+                         brute_rect(rects, x, y, x, y))
+        best = index.nearest(x, y)
+        best_dist = min(spatial.rect_distance(r, x, y)
+                        for r in rects.values())
+        test.assertAlmostEqual(spatial.rect_distance(rects[best], x, y),
+                               best_dist)
+
+
+def check_far_nearest(test, index):
+    index.insert(1, 0, 0, 10, 10)
+    index.insert(2, 20, 0, 30, 10)
+    test.assertEqual(index.nearest(5000, 0), 2)
+    test.assertIsNone(index.nearest(5000, 0, max_dist=100))
+    index.clear()
+    test.assertIsNone(index.nearest(0, 0))
+
+
+class TestGridIndex(unittest.TestCase):
+    def test_random_queries(self):
+        check_random_queries(self, spatial.GridIndex(32))
+
+    def test_far_nearest(self):
+        check_far_nearest(self, spatial.GridIndex(32))
+
+
+class TestQuadTree(unittest.TestCase):
+    def test_random_queries(self):
+        check_random_queries(self, spatial.QuadTree(-400, -300, 400, 300,
+                                                    max_depth=6))
+
+    def test_far_nearest(self):
+        check_far_nearest(self, spatial.QuadTree(-400, -300, 400, 300,
+                                                 max_depth=6))
+
+
+def quad(x0, y0, x1, y1):
+    """Returns vertex data (A, B, C, D with zero UVs) of rect quad"""
+    return (x0, y0, 0, 0, x1, y0, 0, 0, x1, y1, 0, 0, x0, y1, 0, 0)
+
+
+@unittest.skipIf(vid is None, 'requires ngk.vid')
+class TestTrack(unittest.TestCase):
+    def test_track(self):
+        geom = vid.Quad2Geom()
+        a = geom.add_quad2(*quad(0, 0, 10, 10))
+        index = spatial.GridIndex(32)
+        index.track(geom)
+        b = geom.add_quad2(*quad(50, 50, 60, 60))
+        self.assertEqual(sorted(index.query_rect(-100, -100, 100, 100)),
+                         [a, b])
+        geom.del_quad2(a)
+        self.assertEqual(index.query_point(5, 5), [])
+        index.untrack(geom)
+        geom.add_quad2(*quad(0, 0, 10, 10))
+        self.assertEqual(index.query_point(5, 5), [])
+
+    def test_set_vertdata(self):
+        geom = vid.Quad2Geom()
+        geom.add_quad2(*quad(0, 0, 10, 10))
+        index = spatial.QuadTree(-100, -100, 100, 100)
+        index.track(geom)
+        # Replaced quads are indexed, the old ones are gone
+        geom.vertdata = array.array('f', quad(20, 20, 30, 30) +
+                                    (0,) * 16 + quad(-30, -30, -20, -20))
+        self.assertEqual(index.query_point(5, 5), [])
+        self.assertEqual(index.query_point(25, 25), [0])
+        self.assertEqual(index.query_point(-25, -25), [2])
+        self.assertEqual(len(index), 2)
+        geom.clear()
+        self.assertEqual(len(index), 0)
+
+
+class FakeWindow:
+    """Window of 160x120 units in a 400x150 pixel window (letterboxed
+    horizontally)"""
+
+    w = 160
+    h = 120
+    _winw = 400
+    _winh = 150
+    _viewportx = 100
+    _viewporty = 0
+    _viewportw = 200
+    _viewporth = 150
+
+
+class TestEventPos(unittest.TestCase):
+    def test_button(self):
+        win = FakeWindow()
+        for px, py, pos in ((200, 75, (0, 0)), (100, 0, (-80, 60)),
+                            (300, 150, (80, -60))):
+            ev = ButtonEvent('MOUSEDOWN', 0, 1, px, py)
+            self.assertEqual(spatial.event_pos(win, ev), pos)
+
+    def test_motion(self):
+        win = FakeWindow()
+        # MotionEvent positions are scaled by the window size
+        ev = MotionEvent('MOUSEMOVE', 0, 0, 100 / 400 * 160, 0.0, 0, 0)
+        x, y = spatial.event_pos(win, ev)
+        self.assertAlmostEqual(x, -80)
+        self.assertAlmostEqual(y, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,55 +1,93 @@
+import os
+import tempfile
 import unittest
-import os.path
-import stbi
-from ngk import vid
-
-
-root = os.path.dirname(__file__)
-
-
-def mse(i, k):
-    if len(i) != len(k):
-        raise ValueError('Len does not match')
-    return 1 / len(i) * sum(a - b for a, b in zip(i, k))
-
-
-class TestCase(unittest.TestCase):
-    def compareImage(self, name, w, h, comp, img, tolerance=1.0):
-        filename = '{0}-{1}.png'.format(self.id(), name)
-        path = os.path.join(root, 'refimgs')
-        os.makedirs(path, exist_ok=True)
-        path = os.path.join(path, filename)
-        conflictfilename = '{0}-{1}-CONFLICT.png'.format(self.id(), name)
-        conflictpath = os.path.join(root, 'refimgs', conflictfilename)
-        if os.path.exists(path):
-            _w, _h, _comp, src = stbi.load(path, comp)
-            if _w != w or _h != h or _comp != comp:
-                stbi.write_png(conflictpath, w, h, comp, img)
-                self.fail('Reference image dimensions do not match\n'
-                          'Reference: {0}\n'
-                          'Conflict: {1}'.format(path, conflictpath))
-            x = mse(src, img)
-            if x < tolerance:
-                if os.path.exists(conflictpath):
-                    os.remove(conflictpath)
-            else:
-                stbi.write_png(conflictpath, w, h, comp, img)
-                self.fail('compareImage failed ({0} >= {1})\n'
-                          'Reference: {2}\n'
-                          'Conflict: {3}'.format(x, tolerance, path,
-                                                 conflictpath))
-        else:
-            stbi.write_png(path, w, h, comp, img)
-            if os.path.exists(conflictpath):
-                os.remove(conflictpath)
-
-    def compareWin(self, name, win, tolerance=1.0):
-        w, h, out = win.read_pixels()
-        return self.compareImage(name, w, h, 3, out, tolerance)
+from ngk import ktx, vid
+from tests.harness import ImageTestCase as TestCase
 
 
 class TestWindow(TestCase):
-    pass
+    vertsrc = r'''
+    attribute vec2 aPos;
+    attribute vec2 aUV;
+    varying highp vec2 vUV;
+    void main() {
+        gl_Position = vec4(aPos, 0.0, 1.0);
+        vUV = aUV;
+    }
+    '''
+
+    fragsrc = r'''
+    uniform sampler2D uTex;
+    varying highp vec2 vUV;
+    void main() {
+        gl_FragColor = texture2D(uTex, vUV);
+    }
+    '''
+
+    def setUp(self):
+        self.win = vid.Window(self.id(), 160, 120, resizable=False)
+        # 4x4 texels, each drawn as a 40x30 block
+        self.data = bytes(range(4 * 4 * 4))
+        tex = vid.Texture2(4, 4, self.data)
+        geom = vid.Quad2Geom()
+        geom.add_quad2(-1.0, -1.0, 0.0, 1.0,
+                       1.0, -1.0, 1.0, 1.0,
+                       1.0, 1.0, 1.0, 0.0,
+                       -1.0, 1.0, 0.0, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        prog.set_uniform('uTex', tex)
+        self.win.before_step()
+        geom.draw(self.win, prog)
+        self.win.after_step()
+
+    def expected(self, x, y, w, h):
+        """Returns RGB pixels of the rect, rows top-down"""
+        out = bytearray()
+        for py in range(y, y + h):
+            for px in range(x, x + w):
+                i = ((py // 30) * 4 + px // 40) * 4
+                out += self.data[i:i + 3]
+        return bytes(out)
+
+    def test_read_pixels(self):
+        w, h, pixels = self.win.read_pixels()
+        self.assertEqual((w, h), (160, 120))
+        self.assertEqual(bytes(pixels), self.expected(0, 0, 160, 120))
+
+    def test_read_pixels_out(self):
+        out = bytearray(160 * 120 * 3 + 5)
+        w, h, pixels = self.win.read_pixels(out)
+        self.assertIs(pixels.obj, out)
+        self.assertEqual(len(pixels), 160 * 120 * 3)
+        self.assertEqual(bytes(out[:len(pixels)]),
+                         self.expected(0, 0, 160, 120))
+        with self.assertRaises(ValueError):
+            self.win.read_pixels(bytearray(10))
+
+    def test_read_pixels_rect(self):
+        # Rows of 150 bytes are padded by GL, rows of 180 bytes are not
+        for rect in ((30, 20, 50, 45), (30, 20, 60, 45)):
+            w, h, pixels = self.win.read_pixels(None, *rect)
+            self.assertEqual((w, h), rect[2:])
+            self.assertEqual(bytes(pixels), self.expected(*rect))
+        with self.assertRaises(ValueError):
+            self.win.read_pixels(None, 150, 0, 20, 10)
+
+    def test_read_pixels_rgba(self):
+        w, h, pixels = self.win.read_pixels(fmt=vid.GL_RGBA)
+        self.assertEqual(len(pixels), 160 * 120 * 4)
+        # Alpha depends on the framebuffer format
+        rgb = bytes(b for i, b in enumerate(pixels) if i % 4 != 3)
+        self.assertEqual(rgb, self.expected(0, 0, 160, 120))
+
+    def test_read_pixels_no_flip(self):
+        for rect in ((0, 0, 160, 120), (30, 20, 50, 45)):
+            w, h, pixels = self.win.read_pixels(None, *rect, flip=False)
+            rows = self.expected(*rect)
+            stride = w * 3
+            self.assertEqual(bytes(pixels), b''.join(
+                rows[i:i + stride]
+                for i in range(len(rows) - stride, -1, -stride)))
 
 
 class TestBuffer(TestCase):
@@ -57,7 +95,104 @@ class TestBuffer(TestCase):
 
 
 class TestTexture2(TestCase):
-    pass
+    vertsrc = r'''
+    attribute vec2 aPos;
+    attribute vec2 aUV;
+    varying highp vec2 vUV;
+    void main() {
+        gl_Position = vec4(aPos, 0.0, 1.0);
+        vUV = aUV;
+    }
+    '''
+
+    fragsrc = r'''
+    uniform sampler2D uTex;
+    varying highp vec2 vUV;
+    void main() {
+        gl_FragColor = texture2D(uTex, vUV);
+    }
+    '''
+
+    def setUp(self):
+        self.win = vid.Window(self.id(), 160, 120, resizable=False)
+
+    def test_mipmap_npot(self):
+        with self.assertRaises(ValueError):
+            vid.Texture2(3, 4, bytes(3 * 4 * 4), mipmap=True)
+
+    def test_mark_dirty(self):
+        data = bytearray(range(4 * 4 * 4))
+        tex = vid.Texture2(4, 4, data, mipmap=True)
+        geom = vid.Quad2Geom()
+        geom.add_quad2(-1.0, -1.0, 0.0, 1.0,
+                       1.0, -1.0, 1.0, 1.0,
+                       1.0, 1.0, 1.0, 0.0,
+                       -1.0, 1.0, 0.0, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        prog.set_uniform('uTex', tex)
+        self.win.before_step()
+        geom.draw(self.win, prog)
+        self.win.after_step()
+        self.compareWin(0, self.win)
+        # Only the 2x2 rect is uploaded
+        for y in (1, 2):
+            data[y * 16 + 4:y * 16 + 12] = b'\xff' * 8
+        tex.mark_dirty(1, 1, 2, 2)
+        start = self.win.uploaded_bytes
+        self.win.before_step()
+        prog.set_uniform('uTex', tex)
+        geom.draw(self.win, prog)
+        self.win.after_step()
+        self.assertEqual(self.win.uploaded_bytes - start, 2 * 2 * 4)
+        self.compareWin(1, self.win)
+
+    def test_compressed_from_ktx(self):
+        if ktx.GL_ETC1_RGB8_OES not in self.win.group.compressed_formats:
+            self.skipTest('ETC1 is not supported')
+        fd, path = tempfile.mkstemp(suffix='.ktx')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            # One differential mode block of (255, 0, 0), modifier +2
+            ktx.write(f, 4, 4, ktx.GL_ETC1_RGB8_OES,
+                      [b'\xf8\x00\x00\x02\x00\x00\x00\x00'])
+        with ktx.load(path) as k:
+            tex = vid.CompressedTexture2.from_ktx(k)
+        geom = vid.Quad2Geom()
+        geom.add_quad2(-1.0, -1.0, 0.0, 1.0,
+                       1.0, -1.0, 1.0, 1.0,
+                       1.0, 1.0, 1.0, 0.0,
+                       -1.0, 1.0, 0.0, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        prog.set_uniform('uTex', tex)
+        # Uploaded from the closed KTX, and again after eviction
+        for i in range(2):
+            self.win.before_step()
+            geom.draw(self.win, prog)
+            self.win.after_step()
+            self.compareWin(0, self.win)
+            self.win.evict(unused=0)
+        with self.assertRaises(ValueError):
+            tex.mark_dirty(0, 0, 1, 1)
+
+    def test_share_switch(self):
+        win2 = vid.Window(self.id() + '-2', 160, 120, resizable=False,
+                          share=self.win)
+        red = vid.Texture2(1, 1, b'\xff\x00\x00')
+        green = vid.Texture2(1, 1, b'\x00\xff\x00')
+        geom = vid.Quad2Geom()
+        geom.add_quad2(-1.0, -1.0, 0.0, 1.0,
+                       1.0, -1.0, 1.0, 1.0,
+                       1.0, 1.0, 1.0, 0.0,
+                       -1.0, 1.0, 0.0, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        for name, tex in ((0, red), (1, green)):
+            prog.set_uniform('uTex', tex)
+            # The program stays current in both windows
+            for win in (self.win, win2):
+                win.before_step()
+                geom.draw(win, prog)
+                win.after_step()
+                self.compareWin(name, win)
 
 
 class TestTileset(TestCase):
@@ -104,6 +239,47 @@ class TestTri3Geom(TestCase):
         self.win.after_step()
         self.compareWin(0, self.win)
 
+    def test_evict(self):
+        geom = vid.Tri3Geom()
+        geom.add_tri3(-1.0, -1.0, 0.1, 0.0, 0.0, 1.0, 0.0, 1.0,
+                      0.0, -1.0, 0.2, 0.0, 0.0, 1.0, 1.0, 1.0,
+                      -0.5, 1.0, 0.4, 0.0, 0.0, 1.0, 0.5, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        self.win.before_step()
+        geom.draw(self.win, prog)
+        self.win.after_step()
+        self.assertEqual(self.win.gpu_bytes, 3 * 8 * 4)
+        # Bound in the last frame
+        self.assertEqual(self.win.evict(), 0)
+        self.assertEqual(self.win.evict(unused=0), 3 * 8 * 4)
+        self.assertEqual(self.win.gpu_bytes, 0)
+        # Uploaded again
+        self.win.before_step()
+        geom.draw(self.win, prog)
+        self.win.after_step()
+        self.assertEqual(self.win.gpu_bytes, 3 * 8 * 4)
+        self.compareWin(0, self.win)
+
+    def test_share(self):
+        win2 = vid.Window(self.id() + '-2', 160, 120, resizable=False,
+                          share=self.win)
+        self.assertIs(win2.group, self.win.group)
+        geom = vid.Tri3Geom()
+        geom.add_tri3(-1.0, -1.0, 0.1, 0.0, 0.0, 1.0, 0.0, 1.0,
+                      0.0, -1.0, 0.2, 0.0, 0.0, 1.0, 1.0, 1.0,
+                      -0.5, 1.0, 0.4, 0.0, 0.0, 1.0, 0.5, 0.0)
+        prog = vid.Program(self.vertsrc, self.fragsrc)
+        for win in (self.win, win2):
+            win.before_step()
+            geom.draw(win, prog)
+            win.after_step()
+            self.compareWin(0, win)
+        # One group frame
+        self.assertEqual(win2.frame, 1)
+        # Uploaded once for both windows
+        self.assertEqual(win2.gpu_bytes, 3 * 8 * 4)
+        self.assertEqual(win2.uploaded_bytes, 3 * 8 * 4)
+
 
 class TestQuad2Geom(TestCase):
     vertsrc = r'''